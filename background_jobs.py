@@ -0,0 +1,91 @@
+import os
+import asyncio
+from typing import Any, Dict, Optional
+
+from databases import Database
+from services.invoice_service import InvoiceService
+from mailing_service import MailingService
+from job_queue import job_handler, job_queue, QUEUED, RUNNING, DONE, FAILED
+
+# Job kinds
+RENDER_INVOICE = "render_invoice"
+EMAIL_INVOICE = "email_invoice"
+SEND_EMAIL = "send_email"
+
+# Invoice statuses reported by /invoices/{orderid}/status
+PENDING = "pending"
+RENDERING = "rendering"
+SENDING = "sending"
+SENT = "sent"
+# Reported for an invoice found on disk without a job (e.g. rendered through /generate-invoice)
+RENDERED = "rendered"
+
+invoice_service = InvoiceService(output_dir="invoices")
+mailing_service = MailingService()
+
+
+def invoice_ref(orderid: int) -> str:
+    return f"order:{orderid}"
+
+
+async def enqueue_invoice(orderid: int, invoice_number: str, html: str, email: str) -> None:
+    """
+    Queue rendering and mailing of an order's invoice. Call it in the order's transaction.
+    """
+    payload = {"orderid": orderid, "invoice_number": invoice_number, "html": html, "email": email}
+    await job_queue.enqueue(RENDER_INVOICE, payload, ref=invoice_ref(orderid))
+
+
+async def enqueue_email(recipient: str, subject: str, body: str) -> None:
+    await job_queue.enqueue(SEND_EMAIL, {"recipient": recipient, "subject": subject, "body": body})
+
+
+async def _render(payload: Dict[str, Any]) -> str:
+    # wkhtmltopdf blocks; keep it off the event loop
+    return await asyncio.to_thread(invoice_service.generate_invoice, payload["html"], payload["invoice_number"])
+
+
+@job_handler(RENDER_INVOICE, concurrency=2)
+async def render_invoice(payload: Dict[str, Any]) -> Dict[str, Any]:
+    invoice_file = await _render(payload)
+    # The ref makes a repeated run enqueue the email only once
+    await job_queue.enqueue(EMAIL_INVOICE, {**payload, "invoice_file": invoice_file}, ref=invoice_ref(payload["orderid"]))
+    return {"invoice_file": invoice_file}
+
+
+@job_handler(EMAIL_INVOICE, concurrency=4)
+async def email_invoice(payload: Dict[str, Any]) -> None:
+    invoice_file = payload["invoice_file"]
+    if not os.path.isfile(invoice_file):
+        # Rendered by a worker on another host
+        invoice_file = await _render(payload)
+    await asyncio.to_thread(mailing_service.send_invoice_email, payload["email"], invoice_file)
+
+
+@job_handler(SEND_EMAIL, concurrency=4)
+async def send_email(payload: Dict[str, Any]) -> None:
+    await asyncio.to_thread(mailing_service.send_email, payload["recipient"], payload["subject"], payload["body"])
+
+
+async def invoice_status(db: Database, orderid: int) -> Optional[Dict[str, Any]]:
+    """
+    Status of an order's invoice: pending, rendering, sending, sent or failed, with the
+    PDF path once rendered. None if the order has no known invoice.
+    """
+    rows = await db.fetch_all(
+        "SELECT kind, status, last_error FROM jobs WHERE kind = ANY(:kinds) AND ref = :ref",
+        {"kinds": [RENDER_INVOICE, EMAIL_INVOICE], "ref": invoice_ref(orderid)},
+    )
+    jobs = {row["kind"]: row for row in rows}
+    invoice_file = os.path.join(invoice_service.output_dir, f"INV-{orderid}.pdf")
+    render, email = jobs.get(RENDER_INVOICE), jobs.get(EMAIL_INVOICE)
+
+    if render is None:
+        if os.path.isfile(invoice_file):
+            return {"orderid": orderid, "status": RENDERED, "invoice_file": invoice_file, "error": None}
+        return None
+    if render["status"] != DONE or email is None:
+        status = {QUEUED: PENDING, RUNNING: RENDERING, FAILED: FAILED}.get(render["status"], SENDING)
+        return {"orderid": orderid, "status": status, "invoice_file": None, "error": render["last_error"]}
+    status = {QUEUED: SENDING, RUNNING: SENDING, DONE: SENT, FAILED: FAILED}[email["status"]]
+    return {"orderid": orderid, "status": status, "invoice_file": invoice_file, "error": email["last_error"]}
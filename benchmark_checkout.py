@@ -0,0 +1,89 @@
+"""
+Checkout latency for 1, 10 and 100-line orders: the old per-line create_order (SELECT
+stock, UPDATE products and INSERT order_items for every line) against the set-based
+OrderService.create_order.
+
+Runs against the Postgres in DATABASE_URL. Everything happens on one connection inside a
+transaction that is rolled back at the end, on temporary products/orders/order_items
+tables that shadow the real ones, so no data is touched.
+
+Usage: python benchmark_checkout.py [rounds]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from databases import Database
+
+from db import DATABASE_URL
+from order_service import OrderService
+
+LINE_COUNTS = (1, 10, 100)
+PRODUCTS = 1000
+
+SCHEMA = [
+    "CREATE TEMP TABLE products (productid INT PRIMARY KEY, stock INT NOT NULL)",
+    "CREATE TEMP TABLE orders (orderid SERIAL PRIMARY KEY, userid INT, totalamount NUMERIC(10, 2))",
+    "CREATE TEMP TABLE order_items (orderid INT, productid INT, quantity INT, price NUMERIC(10, 2))",
+]
+
+
+async def create_order_per_line(db: Database, order_data):
+    # The create_order loop this benchmark compares against
+    async with db.transaction():
+        result = await db.fetch_one(
+            "INSERT INTO orders (userid, totalamount) VALUES (:userid, :totalamount) RETURNING orderid",
+            {"userid": order_data["userid"], "totalamount": order_data["totalamount"]},
+        )
+        for item in order_data["items"]:
+            stock = await db.fetch_one("SELECT stock FROM products WHERE productid = :productid", {"productid": item["productid"]})
+            if not stock or stock["stock"] < item["quantity"]:
+                raise ValueError(f"Insufficient stock for product ID {item['productid']}")
+            await db.fetch_one("UPDATE products SET stock = stock - :quantity WHERE productid = :productid RETURNING stock",
+                               {"quantity": item["quantity"], "productid": item["productid"]})
+            await db.execute("INSERT INTO order_items (orderid, productid, quantity, price) VALUES (:orderid, :productid, :quantity, :price)",
+                             {"orderid": result["orderid"], "productid": item["productid"], "quantity": item["quantity"], "price": item["price"]})
+
+
+def make_order(lines: int, round_number: int):
+    offset = (round_number * lines) % (PRODUCTS - lines)
+    items = [{"productid": offset + i + 1, "quantity": 1, "price": 9.99} for i in range(lines)]
+    return {"userid": 1, "totalamount": round(9.99 * lines, 2), "items": items}
+
+
+async def median_ms(create, lines: int, rounds: int) -> float:
+    timings = []
+    for round_number in range(rounds):
+        order = make_order(lines, round_number)
+        start = time.perf_counter()
+        await create(order)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+async def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    db = Database(DATABASE_URL, force_rollback=True)
+    await db.connect()
+    try:
+        for statement in SCHEMA:
+            await db.execute(statement)
+        await db.execute(
+            "INSERT INTO products (productid, stock) SELECT i, 1000000 FROM generate_series(1, :count) AS i",
+            {"count": PRODUCTS},
+        )
+        service = OrderService(db)
+
+        print(f"Checkout latency, median of {rounds} orders")
+        print("  lines   per-line loop   set-based")
+        for lines in LINE_COUNTS:
+            before = await median_ms(lambda order: create_order_per_line(db, order), lines, rounds)
+            after = await median_ms(service.create_order, lines, rounds)
+            print(f"  {lines:5d}   {before:10.2f} ms   {after:6.2f} ms  ({before / after:.1f}x)")
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
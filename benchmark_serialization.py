@@ -0,0 +1,86 @@
+"""
+Serialization cost of the full product list, before and after the orjson responses.
+
+"before" is what FastAPI does for a route returning a list of dicts: jsonable_encoder
+followed by JSONResponse.render. "after" is fast_json.dumps. Compression is measured on
+the rendered body at the levels used by CompressionMiddleware.
+
+Usage: python benchmark_serialization.py [products] [rounds]
+"""
+import gzip
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+
+from compression import GZIP_LEVEL, BROTLI_QUALITY, brotli
+from fast_json import dumps
+
+
+def make_products(count: int):
+    created = datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        {
+            "productid": i,
+            "serialnumber": 100000 + i,
+            "productname": f"Product {i}",
+            "productmodel": f"Model-{i % 97}",
+            "description": "A reasonably long product description used to pad the row. " * 2,
+            "distributerinfo": "Distributor Inc.",
+            "warranty": "2 years",
+            "price": Decimal(f"{10 + i % 500}.99"),
+            "cost": Decimal(f"{5 + i % 300}.50"),
+            "stock": i % 40,
+            "categoryid": i % 12 + 1,
+            "soldamount": (i * 7) % 1000,
+            "discountprice": Decimal(f"{8 + i % 400}.49") if i % 5 == 0 else None,
+            "image": f"https://example.com/images/{i}.jpg",
+            "averagerating": Decimal("4.25"),
+            "createdat": created + timedelta(minutes=i),
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def render_default(products):
+    # FastAPI's path for a plain return value: encode to JSON-compatible Python, then json.dumps
+    content = jsonable_encoder([dict(product) for product in products])
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def cpu_ms(fn, rounds: int):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.process_time()
+        result = fn()
+        best = min(best, time.process_time() - start)
+    return best * 1000, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    products = make_products(count)
+
+    before_ms, before = cpu_ms(lambda: render_default(products), rounds)
+    after_ms, after = cpu_ms(lambda: dumps(products), rounds)
+    assert json.loads(before) == json.loads(after), "orjson output differs from the default encoder"
+
+    print(f"{count} products, best of {rounds} rounds (CPU time per request)")
+    print(f"  jsonable_encoder + json.dumps: {before_ms:8.1f} ms  {len(before) / 1e6:6.2f} MB")
+    print(f"  orjson (fast_json.dumps):      {after_ms:8.1f} ms  {len(after) / 1e6:6.2f} MB  ({before_ms / after_ms:.1f}x faster)")
+
+    gzip_ms, gzipped = cpu_ms(lambda: gzip.compress(after, compresslevel=GZIP_LEVEL), rounds)
+    print(f"  gzip level {GZIP_LEVEL}:                  {gzip_ms:8.1f} ms  {len(gzipped) / 1e6:6.2f} MB")
+    if brotli is not None:
+        br_ms, brotlied = cpu_ms(lambda: brotli.compress(after, quality=BROTLI_QUALITY), rounds)
+        print(f"  brotli quality {BROTLI_QUALITY}:              {br_ms:8.1f} ms  {len(brotlied) / 1e6:6.2f} MB")
+    else:
+        print("  brotli: not installed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Checkout throughput on one hot product: orders per second with its stock in the products
+row, and split across 1, 8 and 32 stock stripes, with many checkouts running at once.
+
+Runs against the Postgres in DATABASE_URL, in a scratch schema (stripe_benchmark) with
+its own products, orders, order_items and stock_stripes tables that is dropped at the end,
+so no data is touched.
+
+Usage: python benchmark_stock_stripes.py [seconds] [concurrent checkouts]
+"""
+import asyncio
+import sys
+import time
+
+from databases import Database
+
+from db import DATABASE_URL
+from order_service import OrderService
+from stock_stripes import StockStripes
+
+SCHEMA_NAME = "stripe_benchmark"
+STRIPE_COUNTS = (None, 1, 8, 32)  # None: stock in the products row
+PRODUCTID = 1
+STOCK = 10_000_000
+
+SCHEMA = [
+    f"CREATE TABLE {SCHEMA_NAME}.products (productid INT PRIMARY KEY, stock INT NOT NULL)",
+    f"CREATE TABLE {SCHEMA_NAME}.orders (orderid SERIAL PRIMARY KEY, userid INT, totalamount NUMERIC(10, 2))",
+    f"CREATE TABLE {SCHEMA_NAME}.order_items (orderid INT, productid INT, quantity INT, price NUMERIC(10, 2))",
+    f"""CREATE TABLE {SCHEMA_NAME}.stock_stripes (
+        productid INT NOT NULL, stripe INT NOT NULL, stock INT NOT NULL CHECK (stock >= 0),
+        PRIMARY KEY (productid, stripe)
+    )""",
+]
+
+ORDER = {"userid": 1, "totalamount": 9.99, "items": [{"productid": PRODUCTID, "quantity": 1, "price": 9.99}]}
+
+
+async def reset(db: Database, stripes: StockStripes, stripe_count) -> None:
+    await db.execute(f"TRUNCATE {SCHEMA_NAME}.order_items, {SCHEMA_NAME}.orders, {SCHEMA_NAME}.stock_stripes")
+    await db.execute(f"UPDATE {SCHEMA_NAME}.products SET stock = :stock", {"stock": STOCK})
+    if stripe_count is not None:
+        await stripes.resize(PRODUCTID, stripe_count)
+
+
+async def orders_per_second(service: OrderService, seconds: float, concurrency: int) -> float:
+    deadline = time.perf_counter() + seconds
+    completed = 0
+
+    async def checkout_loop():
+        nonlocal completed
+        while time.perf_counter() < deadline:
+            await service.create_order(ORDER)
+            completed += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(checkout_loop() for _ in range(concurrency)))
+    return completed / (time.perf_counter() - start)
+
+
+async def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+
+    admin = Database(DATABASE_URL)
+    await admin.connect()
+    await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA_NAME} CASCADE")
+    await admin.execute(f"CREATE SCHEMA {SCHEMA_NAME}")
+    # Every connection of the benchmark pool resolves the unqualified table names to the scratch schema
+    db = Database(DATABASE_URL, min_size=concurrency, max_size=concurrency,
+                  server_settings={"search_path": SCHEMA_NAME})
+    try:
+        for statement in SCHEMA:
+            await admin.execute(statement)
+        await admin.execute(f"INSERT INTO {SCHEMA_NAME}.products (productid, stock) VALUES (:productid, 0)", {"productid": PRODUCTID})
+        await db.connect()
+        stripes = StockStripes(db, enabled=True)
+        service = OrderService(db, stripes=stripes)
+
+        print(f"Orders per second on one product, {concurrency} concurrent checkouts, {seconds:g}s each")
+        print("  stock in          orders/s")
+        for stripe_count in STRIPE_COUNTS:
+            await reset(db, stripes, stripe_count)
+            rate = await orders_per_second(service, seconds, concurrency)
+            label = "products row" if stripe_count is None else f"{stripe_count} stripe{'s' if stripe_count > 1 else ''}"
+            print(f"  {label:<16}  {rate:9.0f}")
+    finally:
+        if db.is_connected:
+            await db.disconnect()
+        await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA_NAME} CASCADE")
+        await admin.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
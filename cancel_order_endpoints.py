@@ -3,6 +3,8 @@ from pydantic import BaseModel
 from typing import List, Dict, Optional
 from databases import Database
 from db import database
+from stock_events import notify_stock_changes
+from stock_stripes import stock_stripes
 
 # Pydantic models for requests and responses
 class CancelRequest(BaseModel):
@@ -47,14 +49,22 @@ async def request_cancel_order(cancel_request: CancelRequest):
             order_items = await database.fetch_all(query_get_order_items, {"orderid": cancel_request.orderid})
 
             # Update the stock
+            stock_changes = {}
             for item in order_items:
+                # Striped products get the stock back in one of their stripes
+                striped_stock = await stock_stripes.restore(item["productid"], item["quantity"])
+                if striped_stock is not None:
+                    stock_changes[item["productid"]] = striped_stock
+                    continue
                 query_update_stock = """
-                    UPDATE products SET stock = stock + :quantity WHERE productid = :productid
+                    UPDATE products SET stock = stock + :quantity WHERE productid = :productid RETURNING stock
                 """
-                await database.execute(query_update_stock, {
+                restored = await database.fetch_one(query_update_stock, {
                     "quantity": item["quantity"],
                     "productid": item["productid"]
                 })
+                if restored:
+                    stock_changes[item["productid"]] = restored["stock"]
 
             # Delete items related to the order
             query_delete_items = """
@@ -67,6 +77,7 @@ async def request_cancel_order(cancel_request: CancelRequest):
                 DELETE FROM orders WHERE orderid = :orderid
             """
             await database.execute(query_delete_order, {"orderid": cancel_request.orderid})
+            await notify_stock_changes(database, stock_changes)
 
         return CancelResponse(orderid=cancel_request.orderid, status="Canceled", message="Order has been canceled and stock updated.")
     except Exception as e:
@@ -1,119 +1,120 @@
 from fastapi import FastAPI, HTTPException, APIRouter
 from databases import Database
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Dict, List
 from db import database
+from cart_store import cart_store
+from cart_pricing import cart_pricing
+from reservations import reservations
 
 router = APIRouter()
 
+# Most products accepted by one /cart/set request
+MAX_CART_SET_ITEMS = 200
+
 # Pydantic model for adding to cart
 class AddToCart(BaseModel):
     userid: int
     productid: int
-    quantity: int = 1
+    quantity: int = Field(default=1, gt=0)
+
+class CartQuantity(BaseModel):
+    productid: int
+    quantity: int = Field(ge=0, description="New quantity; 0 removes the product from the cart")
+
+class SetCart(BaseModel):
+    userid: int
+    items: List[CartQuantity] = Field(max_length=MAX_CART_SET_ITEMS)
+
+# Storage (Postgres or in-memory write-behind) is chosen by CART_BACKEND, see cart_store.py
 
 @router.post("/cart/add")
 async def add_to_cart(item: AddToCart):
-    # Step 1: Check if the product exists and has sufficient stock
-    find_product_query = "SELECT * FROM products WHERE productid = :productid"
-    product = await database.fetch_one(query=find_product_query, values={"productid": item.productid})
+    result = await cart_store.add(item.userid, item.productid, item.quantity)
 
-    if not product:
+    if result.stock is None:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    if product["stock"] <= 0:
+    if result.stock <= 0:
         raise HTTPException(status_code=400, detail="Product is out of stock")
 
-    # Step 2: Insert or update the cart
-    existing_cart_query = """
-    SELECT * FROM cart WHERE userid = :userid AND productid = :productid
-    """
-    existing_item = await database.fetch_one(query=existing_cart_query, values={"userid": item.userid, "productid": item.productid})
-
-    if existing_item:
-        update_cart_query = """
-        UPDATE cart SET quantity = quantity + :quantity 
-        WHERE userid = :userid AND productid = :productid
-        """
-        await database.execute(query=update_cart_query, values={"quantity": item.quantity, "userid": item.userid, "productid": item.productid})
-    else:
-        add_to_cart_query = """
-        INSERT INTO cart (userid, productid, quantity)
-        VALUES (:userid, :productid, :quantity)
-        """
-        await database.execute(query=add_to_cart_query, values={"userid": item.userid, "productid": item.productid, "quantity": item.quantity})
+    if result.quantity is None:
+        raise HTTPException(status_code=400, detail="Insufficient stock for this operation")
 
     return {"message": "Item added to cart successfully."}
 
 @router.post("/cart/increase")
 async def increase_cart(userid: int, productid: int):
-    # Check product stock
-    find_product_query = "SELECT stock FROM products WHERE productid = :productid"
-    product = await database.fetch_one(query=find_product_query, values={"productid": productid})
+    result = await cart_store.increase(userid, productid)
 
-    if not product:
+    if result.stock is None:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    cart_query = "SELECT * FROM cart WHERE userid = :userid AND productid = :productid"
-    cart_item = await database.fetch_one(query=cart_query, values={"userid": userid, "productid": productid})
-
-    if not cart_item:
+    if result.previous is None:
         raise HTTPException(status_code=404, detail="Item not found in cart")
 
-    if cart_item["quantity"] + 1 > product["stock"]:
+    if result.quantity is None:
         raise HTTPException(status_code=400, detail="Insufficient stock for this operation")
 
-    update_cart_query = "UPDATE cart SET quantity = quantity + 1 WHERE userid = :userid AND productid = :productid"
-    await database.execute(query=update_cart_query, values={"userid": userid, "productid": productid})
-
     return {"message": "Quantity increased by 1."}
 
 @router.post("/cart/decrease")
 async def decrease_cart(userid: int, productid: int):
-    cart_query = "SELECT * FROM cart WHERE userid = :userid AND productid = :productid"
-    cart_item = await database.fetch_one(query=cart_query, values={"userid": userid, "productid": productid})
+    result = await cart_store.decrease(userid, productid)
 
-    if not cart_item:
+    if result.previous is None:
         raise HTTPException(status_code=404, detail="Item not found in cart")
 
-    if cart_item["quantity"] - 1 <= 0:
+    if result.quantity is None:
         raise HTTPException(status_code=400, detail="Quantity cannot be less than 1")
 
-    update_cart_query = "UPDATE cart SET quantity = quantity - 1 WHERE userid = :userid AND productid = :productid"
-    await database.execute(query=update_cart_query, values={"userid": userid, "productid": productid})
-
     return {"message": "Quantity decreased by 1."}
 
 @router.delete("/cart/remove")
 async def remove_cart_item(userid: int, productid: int):
-    cart_query = "SELECT * FROM cart WHERE userid = :userid AND productid = :productid"
-    cart_item = await database.fetch_one(query=cart_query, values={"userid": userid, "productid": productid})
-
-    if not cart_item:
+    if not await cart_store.remove(userid, productid):
         raise HTTPException(status_code=404, detail="Item not found in cart")
 
-    delete_query = "DELETE FROM cart WHERE userid = :userid AND productid = :productid"
-    await database.execute(query=delete_query, values={"userid": userid, "productid": productid})
-
     return {"message": "Item removed from cart."}
 
+@router.post("/cart/set")
+async def set_cart_quantities(cart: SetCart):
+    """
+    Set the quantity of many cart items at once (a single statement on Postgres).
+
+    Quantities are absolute (0 removes the item). Each item is applied independently and
+    reported as "updated", "removed", "not_found" (unknown product or nothing to remove)
+    or "insufficient_stock" (the cart keeps its previous quantity).
+    """
+    # Last change per product wins; ON CONFLICT cannot touch the same row twice
+    quantities: Dict[int, int] = {}
+    for item in cart.items:
+        quantities[item.productid] = item.quantity
+    if not quantities:
+        return {"message": "Cart updated.", "items": []}
+
+    rows = await cart_store.set_quantities(cart.userid, quantities)
+
+    results = []
+    for row in rows:
+        if row["updated"]:
+            status = "updated"
+        elif row["removed"]:
+            status = "removed"
+        elif row["stock"] is None or row["quantity"] == 0:
+            status = "not_found"
+        else:
+            status = "insufficient_stock"
+        results.append({"productid": row["productid"], "quantity": row["quantity"], "status": status})
+
+    return {"message": "Cart updated.", "items": results}
+
 @router.get("/cart")
 async def get_cart(userid: int):
-    cart_query = """
-    SELECT 
-        c.productid, 
-        c.quantity, 
-        p.productname, 
-        p.stock, 
-        p.price, 
-        p.discountprice, 
-        p.image
-    FROM cart c
-    JOIN products p ON c.productid = p.productid
-    WHERE c.userid = :userid
-    """
-    items = await database.fetch_all(query=cart_query, values={"userid": userid})
+    # Line and cart totals are computed in SQL from current prices (see cart_pricing.py)
+    priced = await cart_pricing.price(userid)
 
-    if not items:
+    if not priced["items"]:
         return {"message": "Cart is empty", "cart": []}
 
     cart_details = [
@@ -124,35 +125,32 @@ async def get_cart(userid: int):
             "stock": item["stock"],
             "price": item["price"],
             "discountprice": item["discountprice"],
-            "total_price": item["quantity"] * (item["discountprice"] or item["price"]),
+            "total_price": item["total_price"],
             "image": item["image"]
         }
-        for item in items
+        for item in priced["items"]
     ]
 
-    total_cart_price = sum(item["total_price"] for item in cart_details)
+    if reservations.enabled:
+        # When each line's stock hold runs out (None: not held, or held via another worker)
+        holds = reservations.holds(userid)
+        for detail in cart_details:
+            hold = holds.get(detail["productid"])
+            detail["reserved_until"] = hold[1] if hold else None
 
     return {
         "cart": cart_details,
-        "total_cart_price": total_cart_price
+        "total_cart_price": priced["total_cart_price"]
     }
 
 @router.delete("/cart/empty")
 async def empty_cart(userid: int):
-    # Fetch all items in the cart for the user
-    cart_query = "SELECT productid, quantity FROM cart WHERE userid = :userid"
-    cart_items = await database.fetch_all(query=cart_query, values={"userid": userid})
+    # Remove all items from the user's cart, returning the productid and quantity of each
+    deleted_items = await cart_store.clear(userid)
 
-    if not cart_items:
+    if not deleted_items:
         raise HTTPException(status_code=404, detail="Cart is already empty or user does not exist")
 
-    # Delete all items from the user's cart
-    delete_query = "DELETE FROM cart WHERE userid = :userid"
-    await database.execute(query=delete_query, values={"userid": userid})
-
-    # Prepare the response with productid and quantity of deleted items
-    deleted_items = [{"productid": item["productid"], "quantity": item["quantity"]} for item in cart_items]
-
     return {
         "message": "Cart has been emptied successfully.",
         "deleted_items": deleted_items
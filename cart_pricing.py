@@ -0,0 +1,166 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from databases import Database
+from db import database
+from catalog_cache import CatalogCache, catalog as default_catalog
+from cart_store import CartStore, cart_store as default_cart_store
+
+# Priced carts kept in memory (least recently used are dropped first)
+PRICED_CART_CACHE_SIZE = 10000
+
+# Line and cart totals from current product prices. The discount price wins when set,
+# the same rule the storefront shows.
+_PRICE_FROM_CART_TABLE = """
+    SELECT
+        c.productid,
+        c.quantity,
+        p.productname,
+        p.stock,
+        p.price,
+        p.discountprice,
+        p.image,
+        COALESCE(p.discountprice, p.price) AS unit_price,
+        c.quantity * COALESCE(p.discountprice, p.price) AS total_price,
+        SUM(c.quantity * COALESCE(p.discountprice, p.price)) OVER () AS total_cart_price
+    FROM cart c
+    JOIN products p ON c.productid = p.productid
+    WHERE c.userid = :userid
+    ORDER BY c.productid
+"""
+
+# Same query over cart lines held in memory (see MemoryCartStore)
+_PRICE_FROM_LINES = """
+    SELECT
+        c.productid,
+        c.quantity,
+        p.productname,
+        p.stock,
+        p.price,
+        p.discountprice,
+        p.image,
+        COALESCE(p.discountprice, p.price) AS unit_price,
+        c.quantity * COALESCE(p.discountprice, p.price) AS total_price,
+        SUM(c.quantity * COALESCE(p.discountprice, p.price)) OVER () AS total_cart_price
+    FROM unnest(CAST(:productids AS int[]), CAST(:quantities AS int[])) AS c(productid, quantity)
+    JOIN products p ON c.productid = p.productid
+    ORDER BY c.productid
+"""
+
+
+class CartPricing:
+    """
+    Prices a user's cart in SQL from current product prices.
+
+    A priced cart is cached under (cart version, catalog price version): any cart change
+    or price and discount change (which go through the catalog) produces a new key, while
+    the stock patches every order sends leave it alone. Stock is not taken from the cache:
+    a cached cart is returned with each line's stock from the catalog snapshot. Carts are
+    only cached when the store can report a version
+    (MemoryCartStore); with the Postgres store other workers may change the cart table,
+    so every call runs the pricing query.
+    """
+
+    def __init__(self, db: Database, store: CartStore = default_cart_store,
+                 catalog: CatalogCache = default_catalog, cache_size: int = PRICED_CART_CACHE_SIZE):
+        self.db = db
+        self.store = store
+        self.catalog = catalog
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, Tuple[Tuple[int, int], Dict[str, Any]]]" = OrderedDict()
+
+    async def _version(self, userid: int) -> Optional[Tuple[int, int]]:
+        cart_version = self.store.version(userid)
+        if cart_version is None or not await self.catalog.ready():
+            return None
+        return cart_version, self.catalog.column_versions["price"]
+
+    async def price(self, userid: int) -> Dict[str, Any]:
+        """
+        Price the user's cart.
+
+        Returns:
+            dict: {"items": [...], "total_cart_price": Decimal}. Each item has productid,
+            productname, quantity, stock, price, discountprice, image, unit_price and total_price.
+            The result may be shared with other callers; do not modify it.
+        """
+        # Read the version before the cart and prices, so a change made meanwhile is
+        # cached under the old version and missed next time
+        version = await self._version(userid)
+        cached = self._cache.get(userid)
+        if version is not None and cached and cached[0] == version:
+            self._cache.move_to_end(userid)
+            return self._with_current_stock(cached[1])
+
+        lines = await self.store.lines(userid)
+        if lines is None:
+            priced = self._priced(await self.db.fetch_all(_PRICE_FROM_CART_TABLE, {"userid": userid}))
+        else:
+            priced = await self.price_lines(lines)
+
+        if version is not None:
+            self._cache[userid] = (version, priced)
+            self._cache.move_to_end(userid)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return priced
+
+    def _with_current_stock(self, priced: Dict[str, Any]) -> Dict[str, Any]:
+        items = []
+        for item in priced["items"]:
+            product = self.catalog.get(item["productid"])
+            items.append({**item, "stock": product["stock"]} if product else item)
+        return {"items": items, "total_cart_price": priced["total_cart_price"]}
+
+    async def price_lines(self, lines: Dict[int, int]) -> Dict[str, Any]:
+        """
+        Price {productid: quantity} lines that are not (or not necessarily) the user's
+        cart, in the same shape as price(). Products that do not exist are left out.
+        """
+        if not lines:
+            return self._priced([])
+        rows = await self.db.fetch_all(_PRICE_FROM_LINES, {"productids": list(lines), "quantities": list(lines.values())})
+        return self._priced(rows)
+
+    @staticmethod
+    def _priced(rows) -> Dict[str, Any]:
+        items: List[Dict[str, Any]] = [dict(row) for row in rows]
+        total = items[0].pop("total_cart_price") if items else 0
+        for item in items:
+            item.pop("total_cart_price", None)
+        return {"items": items, "total_cart_price": total}
+
+    async def order_data(self, userid: int, lines: Optional[Dict[int, int]] = None) -> Dict[str, Any]:
+        """
+        Order payload for OrderService.create_order built from the priced cart, or from
+        `lines` ({productid: quantity}) when given, so the total and unit prices always
+        come from the server rather than the client.
+
+        Raises:
+            ValueError: If the cart is empty or a product does not exist.
+        """
+        priced = await self.price(userid) if lines is None else await self.price_lines(lines)
+        if lines is not None:
+            found = {item["productid"] for item in priced["items"]}
+            for productid in lines:
+                if productid not in found:
+                    raise ValueError(f"Product ID {productid} not found")
+        if not priced["items"]:
+            raise ValueError("Cart is empty")
+        return {
+            "userid": userid,
+            "totalamount": priced["total_cart_price"],
+            "items": [
+                {
+                    "productid": item["productid"],
+                    "productname": item["productname"],
+                    "quantity": item["quantity"],
+                    "price": item["unit_price"],
+                }
+                for item in priced["items"]
+            ],
+        }
+
+
+# Shared pricing component used by the cart and checkout endpoints
+cart_pricing = CartPricing(database)
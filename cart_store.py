@@ -0,0 +1,548 @@
+import os
+import time
+import asyncio
+import itertools
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from databases import Database
+from db import database
+from catalog_cache import CatalogCache, catalog as default_catalog
+from reservations import Reservations, RESERVATIONS_ENABLED, reservations as default_reservations
+
+logger = logging.getLogger(__name__)
+
+# "postgres" reads and writes the cart table on every call. "memory" keeps active carts
+# in this process and writes them back in batches; use it only with a single worker or
+# with requests routed to a worker per user, since each process has its own carts.
+CART_BACKEND = os.getenv("CART_BACKEND", "postgres").lower()
+# Seconds between write-behind flushes of changed carts
+CART_FLUSH_INTERVAL = float(os.getenv("CART_FLUSH_INTERVAL", "2"))
+# Carts untouched for this long are dropped from memory (after they have been flushed)
+CART_IDLE_SECONDS = float(os.getenv("CART_IDLE_SECONDS", "1800"))
+
+# Product columns looked up for cart operations
+CART_PRODUCT_COLUMNS = ("productname", "stock", "price", "discountprice", "image")
+
+
+class CartUpdate(NamedTuple):
+    # Product stock; None if the product does not exist (or was not needed)
+    stock: Optional[int]
+    # Quantity in the cart before the operation; None if the product was not in the cart
+    previous: Optional[int]
+    # Quantity after the operation; None if the operation was rejected
+    quantity: Optional[int]
+
+
+class CartStore(ABC):
+    """
+    Interface shared by the cart backends used by cart_endpoints.py.
+    """
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def flush(self, userids: Optional[Iterable[int]] = None) -> None:
+        """
+        Make pending changes durable in the cart table (all carts, or only `userids`).
+        """
+
+    # `allowance` (per product for set_quantities) is stock held for the user by a
+    # reservation: already taken out of products.stock, but theirs to put in the cart.
+
+    @abstractmethod
+    async def add(self, userid: int, productid: int, quantity: int, allowance: int = 0) -> CartUpdate:
+        """
+        Add `quantity` to the line, creating it if needed, within the product stock.
+        """
+
+    @abstractmethod
+    async def increase(self, userid: int, productid: int, allowance: int = 0) -> CartUpdate:
+        """
+        Add one to an existing line, within the product stock.
+        """
+
+    @abstractmethod
+    async def decrease(self, userid: int, productid: int) -> CartUpdate:
+        """
+        Take one off an existing line; a line is never taken below one.
+        """
+
+    @abstractmethod
+    async def remove(self, userid: int, productid: int) -> bool:
+        """
+        Remove the line. Returns False if there was none.
+        """
+
+    @abstractmethod
+    async def set_quantities(self, userid: int, quantities: Dict[int, int],
+                             allowances: Optional[Dict[int, int]] = None) -> List[Dict[str, Any]]:
+        """
+        Apply absolute quantities (0 removes). Returns one row per product with the
+        requested quantity, the product stock and whether it was updated or removed.
+        """
+
+    @abstractmethod
+    async def clear(self, userid: int) -> List[Dict[str, int]]:
+        """
+        Empty the cart and return the removed {productid, quantity} lines.
+        """
+
+    @abstractmethod
+    async def quantity(self, userid: int, productid: int) -> int:
+        """
+        The quantity of the product in the cart, 0 if it has no line.
+        """
+
+    async def lines(self, userid: int) -> Optional[Dict[int, int]]:
+        """
+        {productid: quantity} for carts held outside Postgres; None when the cart table
+        is the authoritative copy and can be queried directly.
+        """
+        return None
+
+    def version(self, userid: int) -> Optional[int]:
+        """
+        A number that changes whenever the user's cart changes, or None if this store
+        cannot tell (e.g. other workers write the same cart table).
+        """
+        return None
+
+
+class PostgresCartStore(CartStore):
+    """
+    Cart table as the only copy. Each operation is a single statement; the stock check
+    happens in the same statement as the write (the cart row is locked by the UPDATE /
+    ON CONFLICT), so concurrent requests cannot push a quantity past stock.
+    ON CONFLICT relies on the unique index in sql/create_cart_index.sql.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def add(self, userid: int, productid: int, quantity: int, allowance: int = 0) -> CartUpdate:
+        query = """
+        WITH product AS (
+            SELECT stock FROM products WHERE productid = :productid
+        ), upserted AS (
+            INSERT INTO cart (userid, productid, quantity)
+            SELECT CAST(:userid AS int), CAST(:productid AS int), CAST(:quantity AS int) FROM product WHERE stock + :allowance >= :quantity
+            ON CONFLICT (userid, productid) DO UPDATE
+                SET quantity = cart.quantity + EXCLUDED.quantity
+                WHERE cart.quantity + EXCLUDED.quantity <= (SELECT stock FROM products WHERE productid = EXCLUDED.productid) + :allowance
+            RETURNING quantity
+        )
+        SELECT (SELECT stock FROM product) AS stock, (SELECT quantity FROM upserted) AS quantity
+        """
+        row = await self.db.fetch_one(query=query, values={"userid": userid, "productid": productid, "quantity": quantity, "allowance": allowance})
+        if not row:
+            return CartUpdate(None, None, None)
+        # The upsert does not report the previous quantity; it is not needed by callers
+        return CartUpdate(row["stock"], None, row["quantity"])
+
+    async def increase(self, userid: int, productid: int, allowance: int = 0) -> CartUpdate:
+        query = """
+        WITH updated AS (
+            UPDATE cart SET quantity = quantity + 1
+            WHERE userid = :userid AND productid = :productid
+            AND quantity + 1 <= (SELECT stock FROM products WHERE productid = :productid) + :allowance
+            RETURNING quantity
+        )
+        SELECT
+            (SELECT stock FROM products WHERE productid = :productid) AS stock,
+            (SELECT quantity FROM cart WHERE userid = :userid AND productid = :productid) AS quantity,
+            (SELECT quantity FROM updated) AS new_quantity
+        """
+        row = await self.db.fetch_one(query=query, values={"userid": userid, "productid": productid, "allowance": allowance})
+        if not row:
+            return CartUpdate(None, None, None)
+        return CartUpdate(row["stock"], row["quantity"], row["new_quantity"])
+
+    async def decrease(self, userid: int, productid: int) -> CartUpdate:
+        query = """
+        WITH updated AS (
+            UPDATE cart SET quantity = quantity - 1
+            WHERE userid = :userid AND productid = :productid AND quantity > 1
+            RETURNING quantity
+        )
+        SELECT
+            (SELECT quantity FROM cart WHERE userid = :userid AND productid = :productid) AS quantity,
+            (SELECT quantity FROM updated) AS new_quantity
+        """
+        row = await self.db.fetch_one(query=query, values={"userid": userid, "productid": productid})
+        if not row:
+            return CartUpdate(None, None, None)
+        return CartUpdate(None, row["quantity"], row["new_quantity"])
+
+    async def remove(self, userid: int, productid: int) -> bool:
+        query = "DELETE FROM cart WHERE userid = :userid AND productid = :productid RETURNING productid"
+        return await self.db.fetch_one(query=query, values={"userid": userid, "productid": productid}) is not None
+
+    async def set_quantities(self, userid: int, quantities: Dict[int, int],
+                             allowances: Optional[Dict[int, int]] = None) -> List[Dict[str, Any]]:
+        query = """
+        WITH requested AS (
+            SELECT r.productid, r.quantity, r.allowance, p.stock
+            FROM unnest(CAST(:productids AS int[]), CAST(:quantities AS int[]), CAST(:allowances AS int[]))
+                AS r(productid, quantity, allowance)
+            LEFT JOIN products p ON p.productid = r.productid
+        ), removed AS (
+            DELETE FROM cart c
+            USING requested r
+            WHERE c.userid = :userid AND c.productid = r.productid AND r.quantity = 0
+            RETURNING c.productid
+        ), upserted AS (
+            INSERT INTO cart (userid, productid, quantity)
+            SELECT CAST(:userid AS int), productid, quantity FROM requested
+            WHERE quantity > 0 AND quantity <= stock + allowance
+            ON CONFLICT (userid, productid) DO UPDATE SET quantity = EXCLUDED.quantity
+            RETURNING productid, quantity
+        )
+        SELECT
+            r.productid,
+            r.quantity,
+            r.stock,
+            u.productid IS NOT NULL AS updated,
+            d.productid IS NOT NULL AS removed
+        FROM requested r
+        LEFT JOIN upserted u ON u.productid = r.productid
+        LEFT JOIN removed d ON d.productid = r.productid
+        """
+        rows = await self.db.fetch_all(query=query, values={
+            "userid": userid,
+            "productids": list(quantities),
+            "quantities": list(quantities.values()),
+            "allowances": [(allowances or {}).get(productid, 0) for productid in quantities],
+        })
+        return [dict(row) for row in rows]
+
+    async def clear(self, userid: int) -> List[Dict[str, int]]:
+        query = "DELETE FROM cart WHERE userid = :userid RETURNING productid, quantity"
+        rows = await self.db.fetch_all(query=query, values={"userid": userid})
+        return [{"productid": row["productid"], "quantity": row["quantity"]} for row in rows]
+
+    async def quantity(self, userid: int, productid: int) -> int:
+        query = "SELECT quantity FROM cart WHERE userid = :userid AND productid = :productid"
+        row = await self.db.fetch_one(query=query, values={"userid": userid, "productid": productid})
+        return row["quantity"] if row else 0
+
+
+class MemoryCartStore(CartStore):
+    """
+    Active carts held in memory with write-behind to the cart table.
+
+    A cart is loaded from Postgres on first use. Changes only mark it dirty; a background
+    task writes all dirty carts every CART_FLUSH_INTERVAL seconds in one transaction.
+    flush() is also called for the user at checkout and for everyone on shutdown (see
+    the lifespan hook in main.py), so an order never sees a stale cart table.
+
+    Stock is read from the catalog snapshot when it is loaded. Unless reservations are on
+    (ReservingCartStore), a cart does not hold stock; create_order checks it again at
+    checkout.
+    """
+
+    def __init__(self, db: Database, catalog: CatalogCache = default_catalog,
+                 flush_interval: float = CART_FLUSH_INTERVAL, idle_seconds: float = CART_IDLE_SECONDS):
+        self.db = db
+        self.catalog = catalog
+        self.flush_interval = flush_interval
+        self.idle_seconds = idle_seconds
+        self._carts: Dict[int, Dict[int, int]] = {}
+        self._touched: Dict[int, float] = {}
+        self._dirty: set = set()
+        # Versions come from one process-wide counter, so a cart that is evicted and
+        # loaded again never reuses a version it had before
+        self._versions: Dict[int, int] = {}
+        self._version_counter = itertools.count(1)
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    #####################
+    #   LIFECYCLE
+    #####################
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                self._evict_idle()
+            except Exception as e:  # keep flushing on the next tick
+                logger.warning(f"Cart write-behind flush failed: {e}")
+
+    async def flush(self, userids: Optional[Iterable[int]] = None) -> None:
+        async with self._flush_lock:
+            pending = set(self._dirty) if userids is None else self._dirty.intersection(userids)
+            if not pending:
+                return
+            # Copy now: carts may change while the write is in flight and are then dirty again
+            snapshot = {userid: dict(self._carts.get(userid, {})) for userid in pending}
+            self._dirty.difference_update(pending)
+            try:
+                await self._write(snapshot)
+            except Exception:
+                self._dirty.update(pending)
+                raise
+
+    async def _write(self, carts: Dict[int, Dict[int, int]]) -> None:
+        userids, productids, quantities = [], [], []
+        for userid, cart in carts.items():
+            for productid, quantity in cart.items():
+                userids.append(userid)
+                productids.append(productid)
+                quantities.append(quantity)
+        async with self.db.transaction():
+            await self.db.execute(
+                "DELETE FROM cart WHERE userid = ANY(:userids)",
+                {"userids": list(carts)},
+            )
+            if userids:
+                await self.db.execute(
+                    """
+                    INSERT INTO cart (userid, productid, quantity)
+                    SELECT * FROM unnest(CAST(:userids AS int[]), CAST(:productids AS int[]), CAST(:quantities AS int[]))
+                    """,
+                    {"userids": userids, "productids": productids, "quantities": quantities},
+                )
+
+    def _evict_idle(self) -> None:
+        cutoff = time.monotonic() - self.idle_seconds
+        for userid in [userid for userid, touched in self._touched.items() if touched < cutoff]:
+            if userid not in self._dirty:
+                self._carts.pop(userid, None)
+                self._touched.pop(userid, None)
+                self._versions.pop(userid, None)
+
+    #####################
+    #   HELPERS
+    #####################
+
+    async def _cart(self, userid: int) -> Dict[int, int]:
+        self._touched[userid] = time.monotonic()
+        cart = self._carts.get(userid)
+        if cart is None:
+            rows = await self.db.fetch_all(
+                "SELECT productid, quantity FROM cart WHERE userid = :userid",
+                {"userid": userid},
+            )
+            # Another request may have loaded (and changed) the cart while we waited
+            if userid not in self._carts:
+                self._carts[userid] = {row["productid"]: row["quantity"] for row in rows}
+                self._versions[userid] = next(self._version_counter)
+            cart = self._carts[userid]
+        return cart
+
+    def _changed(self, userid: int) -> None:
+        self._dirty.add(userid)
+        self._versions[userid] = next(self._version_counter)
+
+    async def _products(self, productids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        productids = list(productids)
+        if not productids:
+            return {}
+        if await self.catalog.ready():
+            products = {}
+            for productid in productids:
+                product = self.catalog.get(productid)
+                if product:
+                    products[productid] = product
+            return products
+        rows = await self.db.fetch_all(
+            f"SELECT productid, {', '.join(CART_PRODUCT_COLUMNS)} FROM products WHERE productid = ANY(:ids)",
+            {"ids": productids},
+        )
+        return {row["productid"]: dict(row) for row in rows}
+
+    async def _stock(self, productid: int) -> Optional[int]:
+        product = (await self._products([productid])).get(productid)
+        return product["stock"] if product else None
+
+    #####################
+    #   OPERATIONS
+    #####################
+
+    async def add(self, userid: int, productid: int, quantity: int, allowance: int = 0) -> CartUpdate:
+        stock = await self._stock(productid)
+        cart = await self._cart(userid)
+        previous = cart.get(productid)
+        if stock is None or (previous or 0) + quantity > stock + allowance:
+            return CartUpdate(stock, previous, None)
+        cart[productid] = (previous or 0) + quantity
+        self._changed(userid)
+        return CartUpdate(stock, previous, cart[productid])
+
+    async def increase(self, userid: int, productid: int, allowance: int = 0) -> CartUpdate:
+        stock = await self._stock(productid)
+        cart = await self._cart(userid)
+        previous = cart.get(productid)
+        if stock is None or previous is None or previous + 1 > stock + allowance:
+            return CartUpdate(stock, previous, None)
+        cart[productid] = previous + 1
+        self._changed(userid)
+        return CartUpdate(stock, previous, cart[productid])
+
+    async def decrease(self, userid: int, productid: int) -> CartUpdate:
+        cart = await self._cart(userid)
+        previous = cart.get(productid)
+        if previous is None or previous <= 1:
+            return CartUpdate(None, previous, None)
+        cart[productid] = previous - 1
+        self._changed(userid)
+        return CartUpdate(None, previous, cart[productid])
+
+    async def remove(self, userid: int, productid: int) -> bool:
+        cart = await self._cart(userid)
+        if cart.pop(productid, None) is None:
+            return False
+        self._changed(userid)
+        return True
+
+    async def set_quantities(self, userid: int, quantities: Dict[int, int],
+                             allowances: Optional[Dict[int, int]] = None) -> List[Dict[str, Any]]:
+        products = await self._products(quantities)
+        cart = await self._cart(userid)
+        results = []
+        for productid, quantity in quantities.items():
+            stock = products[productid]["stock"] if productid in products else None
+            updated = removed = False
+            if quantity == 0:
+                removed = cart.pop(productid, None) is not None
+            elif stock is not None and quantity <= stock + (allowances or {}).get(productid, 0):
+                cart[productid] = quantity
+                updated = True
+            results.append({"productid": productid, "quantity": quantity, "stock": stock, "updated": updated, "removed": removed})
+        if any(result["updated"] or result["removed"] for result in results):
+            self._changed(userid)
+        return results
+
+    async def clear(self, userid: int) -> List[Dict[str, int]]:
+        cart = await self._cart(userid)
+        removed = [{"productid": productid, "quantity": quantity} for productid, quantity in cart.items()]
+        cart.clear()
+        self._changed(userid)
+        return removed
+
+    async def quantity(self, userid: int, productid: int) -> int:
+        return (await self._cart(userid)).get(productid, 0)
+
+    async def lines(self, userid: int) -> Optional[Dict[int, int]]:
+        return dict(await self._cart(userid))
+
+    def version(self, userid: int) -> Optional[int]:
+        return self._versions.get(userid)
+
+
+class ReservingCartStore(CartStore):
+    """
+    Holds stock for every cart line (see reservations.py) on top of another store.
+
+    Each change first moves stock between products.stock and the user's hold; the cart
+    line is then written by the wrapped store, which may count the held quantity as
+    available (the allowance). A change the cart rejects is handed back to stock.
+    Reported stock is what the user can have: what nobody holds plus their own hold.
+    """
+
+    def __init__(self, inner: CartStore, holds: Reservations = default_reservations):
+        self.inner = inner
+        self.holds = holds
+
+    async def start(self) -> None:
+        await self.inner.start()
+        await self.holds.start()
+
+    async def stop(self) -> None:
+        await self.holds.stop()
+        await self.inner.stop()
+
+    async def flush(self, userids: Optional[Iterable[int]] = None) -> None:
+        await self.inner.flush(userids)
+
+    async def _change(self, userid: int, productid: int, delta: int, change) -> CartUpdate:
+        # The hold follows the cart line, even if it expired or drifted since the last change
+        current = await self.inner.quantity(userid, productid)
+        hold = await self.holds.hold(userid, productid, quantity=current + delta)
+        if hold.quantity is None:
+            return CartUpdate(hold.stock, None, None)
+        result = await change(hold.quantity)
+        if result.quantity is None:
+            await self.holds.hold(userid, productid, quantity=hold.previous)
+        stock = result.stock + hold.quantity if result.stock is not None else None
+        return CartUpdate(stock, result.previous, result.quantity)
+
+    async def add(self, userid: int, productid: int, quantity: int, allowance: int = 0) -> CartUpdate:
+        return await self._change(userid, productid, quantity,
+                                  lambda held: self.inner.add(userid, productid, quantity, allowance=held))
+
+    async def increase(self, userid: int, productid: int, allowance: int = 0) -> CartUpdate:
+        return await self._change(userid, productid, 1,
+                                  lambda held: self.inner.increase(userid, productid, allowance=held))
+
+    async def decrease(self, userid: int, productid: int) -> CartUpdate:
+        result = await self.inner.decrease(userid, productid)
+        if result.quantity is not None:
+            await self.holds.hold(userid, productid, quantity=result.quantity)
+        return result
+
+    async def remove(self, userid: int, productid: int) -> bool:
+        removed = await self.inner.remove(userid, productid)
+        await self.holds.release(userid, [productid])
+        return removed
+
+    async def set_quantities(self, userid: int, quantities: Dict[int, int],
+                             allowances: Optional[Dict[int, int]] = None) -> List[Dict[str, Any]]:
+        held = {productid: await self.holds.hold(userid, productid, quantity=quantity) for productid, quantity in quantities.items()}
+        rows = await self.inner.set_quantities(userid, quantities, {
+            productid: hold.quantity for productid, hold in held.items() if hold.quantity is not None
+        })
+        for row in rows:
+            hold = held[row["productid"]]
+            if hold.quantity is not None and row["quantity"] > 0 and not row["updated"]:
+                await self.holds.hold(userid, row["productid"], quantity=hold.previous)
+        return rows
+
+    async def clear(self, userid: int) -> List[Dict[str, int]]:
+        removed = await self.inner.clear(userid)
+        await self.holds.release(userid, [line["productid"] for line in removed])
+        return removed
+
+    async def quantity(self, userid: int, productid: int) -> int:
+        return await self.inner.quantity(userid, productid)
+
+    async def lines(self, userid: int) -> Optional[Dict[int, int]]:
+        return await self.inner.lines(userid)
+
+    def version(self, userid: int) -> Optional[int]:
+        return self.inner.version(userid)
+
+
+def create_cart_store(backend: str = CART_BACKEND, db: Database = database,
+                      reserve: bool = RESERVATIONS_ENABLED) -> CartStore:
+    if backend == "memory":
+        store = MemoryCartStore(db)
+    elif backend == "postgres":
+        store = PostgresCartStore(db)
+    else:
+        raise ValueError(f"Unknown CART_BACKEND: {backend}")
+    return ReservingCartStore(store) if reserve else store
+
+
+# Shared store used by the cart and checkout endpoints; started and stopped in main.py
+cart_store = create_cart_store()
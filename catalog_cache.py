@@ -0,0 +1,233 @@
+import os
+import time
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from databases import Database
+from db import database
+from pagination import PRODUCT_SORTS, decode_cursor, next_cursor
+
+logger = logging.getLogger(__name__)
+
+# Seconds a snapshot may be served before it is reloaded from Postgres.
+# Writes made through this process patch the snapshot immediately; the bound covers
+# writes made by other workers or directly in the database.
+CATALOG_MAX_STALENESS = float(os.getenv("CATALOG_MAX_STALENESS", "60"))
+CATALOG_CACHE_ENABLED = os.getenv("CATALOG_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Column groups with a version of their own, for caches that only depend on some columns:
+# a stock change from an order should not rebuild the search index or reprice carts
+VERSIONED_COLUMNS = {
+    "text": ("productname", "productmodel"),
+    "price": ("price", "discountprice"),
+    "sales": ("soldamount",),
+}
+
+
+class CatalogCache:
+    """
+    Versioned in-memory snapshot of the products and categories tables.
+
+    The snapshot is loaded at startup (see the lifespan hook in main.py). Every product
+    write bumps `version`, so callers can tell whether anything changed since they last
+    looked; `column_versions` only move when a column of their group (or the set of
+    products) changes. Until the snapshot is loaded, `ready()` returns False and endpoints fall back
+    to querying Postgres directly.
+    """
+
+    def __init__(self, db: Database, max_staleness: float = CATALOG_MAX_STALENESS, enabled: bool = CATALOG_CACHE_ENABLED):
+        self.db = db
+        self.max_staleness = max_staleness
+        self.enabled = enabled
+        self.version = 0
+        self.column_versions = {group: 0 for group in VERSIONED_COLUMNS}
+        self.loaded_at: Optional[float] = None
+        self._products: Dict[int, Dict[str, Any]] = {}
+        self._categories: Dict[int, str] = {}
+        # Sorted views, rebuilt lazily once per version
+        self._sorted: Dict[Tuple[Optional[str], bool], Tuple[int, List[Dict[str, Any]], List[Tuple]]] = {}
+        self._reload_lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def is_stale(self) -> bool:
+        return not self.loaded or time.monotonic() - self.loaded_at > self.max_staleness
+
+    async def load(self) -> None:
+        """
+        (Re)load the snapshot from the database.
+        """
+        product_rows = await self.db.fetch_all("SELECT * FROM products")
+        category_rows = await self.db.fetch_all("SELECT categoryid, name FROM categories")
+
+        products = {row["productid"]: dict(row) for row in product_rows}
+        categories = {row["categoryid"]: row["name"] for row in category_rows}
+
+        # Only a real change counts as a new version, so a periodic reload keeps versions stable
+        if products != self._products or categories != self._categories or not self.loaded:
+            columns = self._changed_columns(products) if self.loaded else None
+            self._products = products
+            self._categories = categories
+            self._bump(columns)
+        self.loaded_at = time.monotonic()
+        logger.info(f"Catalog snapshot loaded: {len(products)} products, version {self.version}")
+
+    async def ready(self) -> bool:
+        """
+        Return True if reads can be served from memory, reloading a stale snapshot first.
+        """
+        if not self.enabled or not self.loaded:
+            return False
+        if self.is_stale():
+            async with self._reload_lock:
+                # Another request may have reloaded while we waited for the lock
+                if self.is_stale():
+                    await self.load()
+        return True
+
+    def _bump(self, columns: Optional[Iterable[str]] = None) -> None:
+        """
+        Start a new version. `columns` are the columns that changed; None means the set
+        of products changed, which moves every column version.
+        """
+        self.version += 1
+        self._sorted.clear()
+        changed = None if columns is None else set(columns)
+        for group, group_columns in VERSIONED_COLUMNS.items():
+            if changed is None or changed.intersection(group_columns):
+                self.column_versions[group] += 1
+
+    def _changed_columns(self, products: Dict[int, Dict[str, Any]]) -> Optional[set]:
+        if products.keys() != self._products.keys():
+            return None
+        changed = set()
+        for productid, product in products.items():
+            current = self._products[productid]
+            if product != current:
+                changed.update(column for column in product if product[column] != current.get(column))
+        return changed
+
+    #####################
+    #   READS
+    #####################
+
+    def get(self, productid: int) -> Optional[Dict[str, Any]]:
+        product = self._products.get(productid)
+        return dict(product) if product else None
+
+    def all(self) -> List[Dict[str, Any]]:
+        return [dict(product) for product in self.sorted_by(None, False)]
+
+    def by_category(self, categoryid: int) -> List[Dict[str, Any]]:
+        return [dict(product) for product in self.sorted_by(None, False) if product["categoryid"] == categoryid]
+
+    def category_name(self, categoryid: int) -> Optional[str]:
+        return self._categories.get(categoryid)
+
+    def sorted_by(self, column: Optional[str], descending: bool) -> List[Dict[str, Any]]:
+        """
+        Products ordered by (column, productid), matching the keyset pagination order.
+        The returned rows are shared; copy them before handing them out.
+        """
+        return self._sorted_view(column, descending)[1]
+
+    def _sorted_view(self, column: Optional[str], descending: bool):
+        key = (column, descending)
+        view = self._sorted.get(key)
+        if view is None or view[0] != self.version:
+            if column:
+                rows = sorted(self._products.values(), key=lambda p: (p[column], p["productid"]), reverse=descending)
+                keys = [(p[column], p["productid"]) for p in rows]
+            else:
+                rows = sorted(self._products.values(), key=lambda p: p["productid"], reverse=descending)
+                keys = [(p["productid"],) for p in rows]
+            if descending:
+                # bisect needs ascending keys; walk the descending list back to front
+                keys = keys[::-1]
+            view = (self.version, rows, keys)
+            self._sorted[key] = view
+        return view
+
+    def product_page(self, sort_key: str, limit: int, cursor: Optional[str]) -> Dict[str, Any]:
+        """
+        In-memory equivalent of pagination.fetch_product_page; cursors are interchangeable.
+        """
+        sort = PRODUCT_SORTS[sort_key]
+        _, rows, keys = self._sorted_view(sort.column, sort.descending)
+        if not cursor:
+            start = 0
+        else:
+            sort_value, productid = decode_cursor(cursor, sort)
+            cursor_key = (sort_value, productid) if sort.column else (productid,)
+            if sort.descending:
+                # Rows after the cursor have smaller keys and sit at the tail of the list
+                start = len(keys) - bisect_left(keys, cursor_key)
+            else:
+                start = bisect_right(keys, cursor_key)
+        page = rows[start:start + limit + 1]
+        return {
+            "products": [dict(product) for product in page[:limit]],
+            "next_cursor": next_cursor(page, limit, sort),
+        }
+
+    #####################
+    #   WRITES
+    #####################
+
+    def upsert(self, product: Dict[str, Any]) -> None:
+        """
+        Store a full product row (e.g. from a RETURNING * clause).
+        """
+        if not self.loaded:
+            return
+        current = self._products.get(product["productid"])
+        self._products[product["productid"]] = dict(product)
+        if current is None:
+            self._bump()
+        else:
+            self._bump(column for column in set(product) | set(current) if product.get(column) != current.get(column))
+
+    def patch(self, productid: int, **fields: Any) -> None:
+        """
+        Update some columns of a cached product in place.
+        """
+        if not self.loaded:
+            return
+        product = self._products.get(productid)
+        # Unchanged values keep the version (and the ETag) as is
+        if product is None or all(product.get(column) == value for column, value in fields.items()):
+            return
+        product.update(fields)
+        self._bump(fields)
+
+    def remove(self, productid: int) -> None:
+        if not self.loaded:
+            return
+        self._products.pop(productid, None)
+        self._bump()
+
+    async def refresh_product(self, productid: int) -> None:
+        """
+        Re-read a single product row after a write that did not return the full row.
+        """
+        if not self.loaded:
+            return
+        row = await self.db.fetch_one("SELECT * FROM products WHERE productid = :productid", {"productid": productid})
+        if row:
+            self.upsert(dict(row))
+        else:
+            self.remove(productid)
+
+    def invalidate(self) -> None:
+        """
+        Force a full reload on the next read (used for bulk writes such as deleting a category).
+        """
+        self.loaded_at = float("-inf") if self.loaded else None
+        self._bump()
+
+
+# Shared snapshot used by all routers
+catalog = CatalogCache(database)
@@ -1,16 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from db import database
+from sql_registry import statements
+from catalog_cache import catalog
+from etags import catalog_not_modified
 from pydantic import BaseModel
-import os
 from typing import List,Optional
 
 router = APIRouter()
 
-# Helper function to load SQL files
-def load_sql_file(filename: str) -> str:
-    file_path = os.path.join("sql", filename)
-    with open(file_path, "r") as file:
-        return file.read()
 
 # Response model for products
 class ProductResponse(BaseModel):
@@ -31,9 +28,16 @@ class ProductResponse(BaseModel):
 
 # Endpoint to get products by category ID
 @router.get("/products/category/{category_id}/", response_model=List[ProductResponse])
-async def get_products_by_category(category_id: int):
-    query = load_sql_file("find_products_by_category.sql")
-    products = await database.fetch_all(query=query, values={"categoryID": category_id})
+async def get_products_by_category(category_id: int, request: Request, response: Response):
+    not_modified = await catalog_not_modified(request, response, catalog)
+    if not_modified:
+        return not_modified
+
+    if await catalog.ready():
+        products = catalog.by_category(category_id)
+    else:
+        query = statements["find_products_by_category"].text
+        products = await database.fetch_all(query=query, values={"categoryID": category_id})
     
     if not products:
         raise HTTPException(status_code=404, detail="No products found for this category")
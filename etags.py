@@ -0,0 +1,82 @@
+import uuid
+from typing import Optional
+from fastapi import Request, Response
+from catalog_cache import CatalogCache, catalog as default_catalog
+
+# Catalog versions restart at 1 in every process, so the ETag also carries a random
+# per-process epoch. Two workers (or a restarted worker) never share a tag by accident.
+PROCESS_EPOCH = uuid.uuid4().hex[:12]
+# Suffixes coded_etag adds for the codings CompressionMiddleware applies
+CODED_SUFFIXES = ("-gzip", "-br")
+
+
+def catalog_etag(catalog: CatalogCache) -> str:
+    return f'"catalog-{PROCESS_EPOCH}-{catalog.version}"'
+
+
+def coded_etag(etag: str, coding: str) -> str:
+    """
+    The tag of a compressed representation: a strong tag gets the content-coding as a
+    suffix ('"catalog-…-gzip"'), since one strong validator may not stand for bodies
+    with different encodings. Weak tags are left as they are.
+    """
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{coding}"'
+
+
+def _base_etag(tag: str) -> str:
+    # Weak comparison (RFC 9110 8.8.3.2), which is what If-None-Match uses, and the
+    # coding suffix added by coded_etag stripped
+    tag = tag[2:] if tag.startswith("W/") else tag
+    for coding in CODED_SUFFIXES:
+        if tag.endswith(f'{coding}"'):
+            return f'{tag[:-len(coding) - 1]}"'
+    return tag
+
+
+def matching_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """
+    The If-None-Match entry that matches `etag` in any of its encodings, or None.
+    """
+    if not if_none_match:
+        return None
+    for candidate in (tag.strip() for tag in if_none_match.split(",")):
+        if candidate == "*":
+            return etag
+        if _base_etag(candidate) == etag:
+            return candidate
+    return None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    return matching_etag(if_none_match, etag) is not None
+
+
+async def catalog_not_modified(
+    request: Request,
+    response: Response,
+    catalog: CatalogCache = default_catalog,
+) -> Optional[Response]:
+    """
+    Tag a catalog read with the snapshot's ETag and answer revalidations.
+
+    Returns a 304 response when the client's If-None-Match already holds the current
+    tag (in any encoding), otherwise None after setting the ETag header on `response`;
+    CompressionMiddleware gives compressed bodies their own tag. Responses are only
+    tagged while they are served from the snapshot; a version number says nothing
+    about rows read straight from Postgres.
+    """
+    if not await catalog.ready():
+        return None
+
+    etag = catalog_etag(catalog)
+    # Clients and caches may store the list but must revalidate before reusing it
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    matched = matching_etag(request.headers.get("if-none-match"), etag)
+    if matched is not None:
+        # A 304 has no body to encode; it carries the tag of the representation the
+        # client holds (e.g. the gzip one)
+        return Response(status_code=304, headers={**headers, "ETag": matched if matched != "*" else etag})
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,223 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from databases import Database
+from fastapi import HTTPException, Response
+from db import database
+from fast_json import dumps
+
+logger = logging.getLogger(__name__)
+
+# Replays kept in memory in front of the idempotency_keys table (least recently used go first)
+IDEMPOTENCY_CACHE_SIZE = 10000
+# How long a key is honoured
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# Seconds between sweeps of expired keys, and keys deleted per sweep statement
+IDEMPOTENCY_SWEEP_INTERVAL = float(os.getenv("IDEMPOTENCY_SWEEP_INTERVAL", "600"))
+IDEMPOTENCY_SWEEP_BATCH = 1000
+# Sweep statements per tick; the rest waits for the next tick
+IDEMPOTENCY_SWEEP_MAX_BATCHES = 20
+MAX_KEY_LENGTH = 255
+# Set on replayed responses, so clients and logs can tell a replay from a first execution
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+_LOOKUP = """
+    SELECT fingerprint, response, created_at
+    FROM idempotency_keys
+    WHERE scope = :scope AND key = :key
+      AND created_at > now() - CAST(:ttl AS double precision) * interval '1 hour'
+"""
+
+# A concurrent request with the same key blocks here until the first one commits, then
+# inserts nothing. An expired row left by an earlier use of the key is taken over.
+_SAVE = """
+    INSERT INTO idempotency_keys (scope, key, fingerprint, response)
+    VALUES (:scope, :key, :fingerprint, CAST(:response AS jsonb))
+    ON CONFLICT (scope, key) DO UPDATE
+    SET fingerprint = EXCLUDED.fingerprint, response = EXCLUDED.response, created_at = now()
+    WHERE idempotency_keys.created_at <= now() - CAST(:ttl AS double precision) * interval '1 hour'
+    RETURNING created_at
+"""
+
+_SWEEP = """
+    WITH expired AS (
+        DELETE FROM idempotency_keys
+        WHERE ctid IN (
+            SELECT ctid FROM idempotency_keys
+            WHERE created_at <= now() - CAST(:ttl AS double precision) * interval '1 hour'
+            LIMIT :batch
+        )
+        RETURNING 1
+    )
+    SELECT count(*) AS swept FROM expired
+"""
+
+
+class _AlreadyCommitted(Exception):
+    """Raised to roll back a duplicate that lost the race to the first request."""
+
+
+def fingerprint(payload: Any) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Runs a request at most once per Idempotency-Key and replays its response for retries.
+
+    The key and the response are saved in the request's own transaction, so a retry never
+    sees a key without the changes it stands for. Two copies racing each other both run;
+    the second one's insert of the key waits for the first to commit, finds the key taken
+    and rolls its own changes back. Only successful responses are stored; a failed request
+    changed nothing and can simply run again.
+
+    A key is honoured for `ttl_hours`; after that it is new again, and expired rows are
+    deleted by a background sweep.
+    """
+
+    def __init__(self, db: Database, cache_size: int = IDEMPOTENCY_CACHE_SIZE,
+                 ttl_hours: int = IDEMPOTENCY_TTL_HOURS, sweep_interval: float = IDEMPOTENCY_SWEEP_INTERVAL):
+        self.db = db
+        self.cache_size = cache_size
+        self.ttl_hours = ttl_hours
+        self.sweep_interval = sweep_interval
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[str, Dict[str, Any], datetime]]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+
+    #####################
+    #   LIFECYCLE
+    #####################
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._sweep_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:  # sweep again on the next tick
+                logger.warning(f"Idempotency key sweep failed: {e}")
+
+    async def sweep(self) -> int:
+        """
+        Delete expired keys. Returns the number of keys deleted.
+        """
+        swept = 0
+        for _ in range(IDEMPOTENCY_SWEEP_MAX_BATCHES):
+            row = await self.db.fetch_one(_SWEEP, {"ttl": self.ttl_hours, "batch": IDEMPOTENCY_SWEEP_BATCH})
+            swept += row["swept"]
+            if row["swept"] < IDEMPOTENCY_SWEEP_BATCH:
+                break
+        if swept:
+            logger.info(f"Deleted {swept} expired idempotency keys")
+        return swept
+
+    #####################
+    #   KEYS
+    #####################
+
+    def _expired(self, created_at: datetime) -> bool:
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return created_at <= datetime.now(timezone.utc) - timedelta(hours=self.ttl_hours)
+
+    def _remember(self, scope: str, key: str, request_fingerprint: str, response: Dict[str, Any],
+                  created_at: datetime) -> None:
+        self._cache[(scope, key)] = (request_fingerprint, response, created_at)
+        self._cache.move_to_end((scope, key))
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def lookup(self, scope: str, key: str, request_fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        The stored response for this key, or None if the key is new.
+
+        Raises:
+            HTTPException: 422 if the key was used for a different request.
+        """
+        cached = self._cache.get((scope, key))
+        if cached is not None and self._expired(cached[2]):
+            del self._cache[(scope, key)]
+            cached = None
+        if cached is None:
+            row = await self.db.fetch_one(_LOOKUP, {"scope": scope, "key": key, "ttl": self.ttl_hours})
+            if row is None:
+                return None
+            response = row["response"]
+            cached = (row["fingerprint"], json.loads(response) if isinstance(response, str) else response, row["created_at"])
+            self._remember(scope, key, *cached)
+        else:
+            self._cache.move_to_end((scope, key))
+
+        if cached[0] != request_fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        return cached[1]
+
+    async def run(self, scope: str, key: Optional[str], payload: Any,
+                  operation: Callable[[], Awaitable[Dict[str, Any]]],
+                  response: Optional[Response] = None) -> Dict[str, Any]:
+        """
+        Run `operation` in a transaction, once per (scope, key).
+
+        Args:
+            scope: The endpoint, so the same key can be used on different endpoints.
+            key: The Idempotency-Key header; without one the operation just runs.
+            payload: What identifies the request (its body); a key reused with a
+                different payload is rejected.
+            operation: Does the work and returns the JSON response body.
+            response: Gets the Idempotent-Replayed header when a response is replayed.
+        """
+        if key is None:
+            return await operation()
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+
+        request_fingerprint = fingerprint(payload)
+        replay = await self.lookup(scope, key, request_fingerprint)
+        if replay is None:
+            try:
+                async with self.db.transaction():
+                    result = await operation()
+                    saved = await self.db.fetch_one(_SAVE, {
+                        "scope": scope,
+                        "key": key,
+                        "fingerprint": request_fingerprint,
+                        # Encoded like the response body, so a replay has the same JSON types
+                        "response": dumps(result).decode(),
+                        "ttl": self.ttl_hours,
+                    })
+                    if saved is None:
+                        raise _AlreadyCommitted()
+                self._remember(scope, key, request_fingerprint, result, saved["created_at"])
+                return result
+            except _AlreadyCommitted:
+                replay = await self.lookup(scope, key, request_fingerprint)
+                if replay is None:
+                    raise HTTPException(status_code=409, detail="Idempotency-Key conflict; retry the request")
+
+        if response is not None:
+            response.headers[REPLAYED_HEADER] = "true"
+        return replay
+
+
+# Shared store used by the order and refund endpoints; swept in the background (started in
+# the lifespan hook in main.py)
+idempotency = IdempotencyStore(database)
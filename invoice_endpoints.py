@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List
 from services.invoice_service import InvoiceService
+from background_jobs import invoice_status
+from db import database
 from datetime import datetime
 
 # Initialize the router and InvoiceService
@@ -46,3 +48,15 @@ async def generate_invoice(request: InvoiceRequest):
         return {"message": "Invoice generated successfully", "file_path": file_path}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/invoices/{orderid}/status")
+async def get_invoice_status(orderid: int):
+    """
+    Status of the invoice rendered and mailed after /create_order_with_invoice:
+    pending, rendering, sending, sent or failed, with the PDF path once rendered.
+    """
+    status = await invoice_status(database, orderid)
+    if status is None:
+        raise HTTPException(status_code=404, detail="No invoice for this order")
+    return status
@@ -0,0 +1,277 @@
+import os
+import json
+import socket
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from databases import Database
+from db import database
+from stock_events import uses_postgres
+
+logger = logging.getLogger(__name__)
+
+# Where the workers run: "app" inside the API process (lifespan hook in main.py), or
+# "external" for a separate `python -m worker` process
+JOB_WORKER = os.getenv("JOB_WORKER", "app")
+# Per-kind concurrency overrides, e.g. "render_invoice=2,send_email=8"
+JOB_CONCURRENCY = os.getenv("JOB_CONCURRENCY", "")
+# Seconds between claim attempts when a kind has nothing due
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# A running job whose worker has not finished it within this many seconds is claimed again
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+# Retry delays: JOB_BACKOFF_BASE * 2^(attempt - 1) seconds, capped at JOB_BACKOFF_MAX
+JOB_BACKOFF_BASE = 5
+JOB_BACKOFF_MAX = 600
+DEFAULT_MAX_ATTEMPTS = 5
+# Seconds to wait on shutdown for running jobs before handing them back to the queue
+JOB_DRAIN_SECONDS = 30
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+_ENQUEUE = """
+    INSERT INTO jobs (kind, ref, payload, max_attempts)
+    VALUES (:kind, :ref, CAST(:payload AS jsonb), :max_attempts)
+    ON CONFLICT (kind, ref) WHERE ref IS NOT NULL DO NOTHING
+    RETURNING id
+"""
+
+# Due jobs of one kind, oldest first. SKIP LOCKED lets every worker claim a disjoint batch
+# without waiting on the others.
+_CLAIM = """
+    UPDATE jobs
+    SET status = 'running', attempts = attempts + 1, locked_at = now(), locked_by = :worker
+    WHERE id IN (
+        SELECT id FROM jobs
+        WHERE kind = :kind
+          AND ((status = 'queued' AND run_at <= now())
+               OR (status = 'running' AND locked_at < now() - CAST(:lease AS double precision) * interval '1 second'))
+        ORDER BY run_at, id
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, kind, ref, payload, attempts, max_attempts
+"""
+
+_COMPLETE = """
+    UPDATE jobs
+    SET status = 'done', result = CAST(:result AS jsonb), last_error = NULL,
+        locked_at = NULL, locked_by = NULL, finished_at = now()
+    WHERE id = :id
+"""
+
+_RETRY = """
+    UPDATE jobs
+    SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+        finished_at = CASE WHEN attempts >= max_attempts THEN now() END,
+        run_at = now() + CAST(:delay AS double precision) * interval '1 second',
+        last_error = :error, locked_at = NULL, locked_by = NULL
+    WHERE id = :id
+    RETURNING status
+"""
+
+# Jobs interrupted by a shutdown go back to the queue; the attempt does not count
+_RELEASE = """
+    UPDATE jobs
+    SET status = 'queued', attempts = GREATEST(attempts - 1, 0), locked_at = NULL, locked_by = NULL
+    WHERE locked_by = :worker AND status = 'running'
+"""
+
+# Job handlers by kind, and the concurrency each kind runs at
+HANDLERS: Dict[str, JobHandler] = {}
+CONCURRENCY: Dict[str, int] = {}
+
+
+def job_handler(kind: str, concurrency: int = 1):
+    """
+    Register an async function as the handler for jobs of `kind`.
+
+    The handler receives the job payload and may return a JSON-serialisable dict, stored
+    as the job result. Raising marks the attempt as failed; the job is retried with
+    backoff until max_attempts. Handlers can run more than once for the same job (a
+    worker may die after the work but before recording it), so they must be idempotent.
+    """
+    def register(handler: JobHandler) -> JobHandler:
+        HANDLERS[kind] = handler
+        CONCURRENCY[kind] = concurrency
+        return handler
+    return register
+
+
+def parse_concurrency(setting: str) -> Dict[str, int]:
+    """
+    Parse "kind=N,kind=N" into {kind: N}.
+    """
+    limits = {}
+    for entry in filter(None, (part.strip() for part in setting.split(","))):
+        kind, _, limit = entry.partition("=")
+        try:
+            limits[kind.strip()] = max(int(limit), 1)
+        except ValueError:
+            raise ValueError(f"Invalid JOB_CONCURRENCY entry: {entry!r}")
+    return limits
+
+
+def backoff_seconds(attempts: int) -> float:
+    return min(JOB_BACKOFF_BASE * 2 ** max(attempts - 1, 0), JOB_BACKOFF_MAX)
+
+
+class JobQueue:
+    """
+    Postgres-backed job queue: the jobs table (sql/create_jobs_table.sql) is the outbox.
+
+    enqueue() runs on the caller's connection, so calling it inside
+    `async with database.transaction()` makes the job part of that transaction.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], ref: Optional[str] = None,
+                      max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Optional[int]:
+        """
+        Add a job.
+
+        Returns:
+            int: The job id, or None if a job with the same kind and ref already exists.
+        """
+        row = await self.db.fetch_one(_ENQUEUE, {
+            "kind": kind,
+            "ref": ref,
+            "payload": json.dumps(payload),
+            "max_attempts": max_attempts,
+        })
+        return row["id"] if row else None
+
+    async def claim(self, kind: str, limit: int, worker: str) -> List[Dict[str, Any]]:
+        rows = await self.db.fetch_all(_CLAIM, {"kind": kind, "limit": limit, "worker": worker, "lease": JOB_LEASE_SECONDS})
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            if isinstance(job["payload"], str):
+                job["payload"] = json.loads(job["payload"])
+            jobs.append(job)
+        return jobs
+
+    async def complete(self, job_id: int, result: Optional[Dict[str, Any]] = None) -> None:
+        await self.db.execute(_COMPLETE, {"id": job_id, "result": json.dumps(result) if result is not None else None})
+
+    async def retry(self, job: Dict[str, Any], error: str) -> str:
+        """
+        Record a failed attempt. Returns the new status: queued (retry later) or failed.
+        """
+        row = await self.db.fetch_one(_RETRY, {"id": job["id"], "error": error[:2000], "delay": backoff_seconds(job["attempts"])})
+        return row["status"] if row else FAILED
+
+    async def release(self, worker: str) -> None:
+        await self.db.execute(_RELEASE, {"worker": worker})
+
+
+class JobWorker:
+    """
+    Runs registered job handlers, one claim loop per kind.
+
+    Each loop claims at most as many jobs as it has free slots, so no more than the kind's
+    concurrency run at once in this process. The same worker runs inside the app or on
+    its own (worker.py); any number of them can share the queue.
+    """
+
+    def __init__(self, queue: JobQueue, poll_interval: float = JOB_POLL_INTERVAL,
+                 concurrency: Optional[Dict[str, int]] = None):
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self.concurrency_overrides = concurrency if concurrency is not None else parse_concurrency(JOB_CONCURRENCY)
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._loops: List[asyncio.Task] = []
+        self._running: Set[asyncio.Task] = set()
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return bool(self._loops)
+
+    def concurrency(self, kind: str) -> int:
+        return self.concurrency_overrides.get(kind, CONCURRENCY.get(kind, 1))
+
+    async def start(self) -> None:
+        if not uses_postgres(self.queue.db):
+            logger.info("The job queue needs Postgres; background workers disabled")
+            return
+        self._stopping = False
+        loop = asyncio.get_running_loop()
+        self._loops = [loop.create_task(self._claim_loop(kind)) for kind in HANDLERS]
+        logger.info(f"Job worker {self.name} started for: "
+                    + ", ".join(f"{kind} x{self.concurrency(kind)}" for kind in HANDLERS))
+
+    async def stop(self, timeout: float = JOB_DRAIN_SECONDS) -> None:
+        """
+        Stop claiming, give running jobs `timeout` seconds, then hand the rest back.
+        """
+        if not self._loops:
+            return
+        self._stopping = True
+        for task in self._loops:
+            task.cancel()
+        await asyncio.gather(*self._loops, return_exceptions=True)
+        self._loops = []
+        if self._running:
+            await asyncio.wait(set(self._running), timeout=timeout)
+            for task in set(self._running):
+                task.cancel()
+        await self.queue.release(self.name)
+
+    async def _claim_loop(self, kind: str) -> None:
+        running: Set[asyncio.Task] = set()
+        while not self._stopping:
+            free = self.concurrency(kind) - len(running)
+            jobs = []
+            if free > 0:
+                try:
+                    jobs = await self.queue.claim(kind, free, self.name)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Claiming {kind} jobs failed: {e}")
+            for job in jobs:
+                task = asyncio.get_running_loop().create_task(self.run_job(job))
+                for tasks in (running, self._running):
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if jobs and len(jobs) == free:
+                # Full batch: there may be more due; claim again as soon as a slot frees up
+                await asyncio.wait(set(running), return_when=asyncio.FIRST_COMPLETED)
+            else:
+                await asyncio.sleep(self.poll_interval)
+
+    async def run_job(self, job: Dict[str, Any]) -> None:
+        handler = HANDLERS[job["kind"]]
+        try:
+            if job["attempts"] > job["max_attempts"]:
+                raise RuntimeError("Attempts exhausted (lease expired on the last attempt)")
+            result = await handler(job["payload"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e)
+            result = None
+        else:
+            error = None
+
+        try:
+            if error is None:
+                await self.queue.complete(job["id"], result)
+            else:
+                status = await self.queue.retry(job, error)
+                logger.warning(f"Job {job['id']} ({job['kind']}) attempt {job['attempts']} failed, now {status}: {error}")
+        except Exception as e:
+            # The job stays running and is claimed again once its lease expires
+            logger.warning(f"Could not record the outcome of job {job['id']} ({job['kind']}): {e}")
+
+# Shared queue and in-app worker; the worker is started in the lifespan hook in main.py
+job_queue = JobQueue(database)
+job_worker = JobWorker(job_queue)
@@ -2,9 +2,20 @@ import os
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from db import database
+from sql_registry import statements, prepared_statements_enabled
+from catalog_cache import catalog
+from product_autocomplete import autocomplete_index
+from stock_events import stock_listener
+from cart_store import cart_store
+from stock_stripes import stock_stripes
+from idempotency import idempotency
+from job_queue import job_worker, JOB_WORKER
+import background_jobs  # Registers the job handlers
 from fastapi.middleware.cors import CORSMiddleware
+from compression import CompressionMiddleware
 
 
+from product_query_endpoints import router as product_query_router
 from stock_endpoints import router as stock_router  # Import the router
 from user_endpoints import router as user_router  # Import the router
 from rating_endpoints import router as rating_router
@@ -29,8 +40,27 @@ async def lifespan(app: FastAPI):
     # Startup logic
     if not database.is_connected:
         await database.connect()
+    statements.load()
+    if prepared_statements_enabled():
+        await statements.prepare(database)
+    if catalog.enabled:
+        await catalog.load()
+    await autocomplete_index.load(database, catalog)
+    await autocomplete_index.start(database, catalog)
+    await stock_listener.start()
+    await cart_store.start()
+    await stock_stripes.start()
+    await idempotency.start()
+    if JOB_WORKER == "app":
+        await job_worker.start()
     yield  # This yields control to the application during its lifespan
     # Shutdown logic
+    await cart_store.stop()  # Writes back carts still held in memory
+    await stock_stripes.stop()
+    await autocomplete_index.stop()
+    await idempotency.stop()
+    await job_worker.stop()  # Running jobs get a grace period, the rest go back to the queue
+    await stock_listener.stop()
     if database.is_connected:
         await database.disconnect()
 
@@ -44,7 +74,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip or brotli for large responses, depending on the client's Accept-Encoding
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
 
+# Fixed /products/<name> routes go before the /products/{productID} catch-all routes
+app.include_router(product_query_router)
 app.include_router(stock_router)
 app.include_router(user_router)
 app.include_router(rating_router)
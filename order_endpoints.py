@@ -1,20 +1,28 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Header, Query, Response
+from typing import List, Optional
 from pydantic import BaseModel
 from db import database  # Import the Database instance
 from order_service import OrderService
+from fast_json import json_response
+from cart_store import cart_store
+from cart_pricing import cart_pricing
+from idempotency import idempotency
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from datetime import datetime
 
 # Pydantic Models for request validation
 class OrderItemRequest(BaseModel):
     productid: int
     quantity: int
-    price: float
+    # Ignored: orders are priced on the server
+    price: Optional[float] = None
 
 class OrderRequest(BaseModel):
     userid: int
-    totalamount: float
-    items: List[OrderItemRequest]
+    # Without items the order is placed for the user's cart. Either way it is priced on
+    # the server; a total sent by the client is ignored.
+    totalamount: Optional[float] = None
+    items: Optional[List[OrderItemRequest]] = None
 
 # Pydantic Models for response
 class OrderItemResponse(BaseModel):
@@ -34,13 +42,29 @@ class OrderResponse(BaseModel):
 
 router = APIRouter()
 
+async def checkout_data(order_data) -> dict:
+    """
+    Order payload for OrderService.create_order: the priced cart when the request has no
+    items, otherwise the requested quantities at current product prices. Prices and
+    totals sent by the client are never used.
+    """
+    if order_data.items is None:
+        return await cart_pricing.order_data(order_data.userid)
+    lines = {}
+    for item in order_data.items:
+        lines[item.productid] = lines.get(item.productid, 0) + item.quantity
+    return await cart_pricing.order_data(order_data.userid, lines)
+
 @router.post("/create_order")
-async def create_order(order_data: OrderRequest):
+async def create_order(order_data: OrderRequest, response: Response, idempotency_key: Optional[str] = Header(None)):
     """
     Endpoint to create an order.
 
     Args:
-        order_data (OrderRequest): Data for the order, including user ID, total amount, and items.
+        order_data (OrderRequest): Data for the order. When items are omitted, the user's
+            cart is ordered. Unit prices and the total come from current product prices.
+        idempotency_key (str, optional): Idempotency-Key header. A retry with the same key
+            and body gets the first response back instead of placing another order.
 
     Returns:
         dict: Confirmation message with the created order ID.
@@ -49,21 +73,37 @@ async def create_order(order_data: OrderRequest):
         HTTPException: For stock issues or database errors.
     """
     order_service = OrderService(database)
+
+    async def place_order():
+        return await order_service.create_order(await checkout_data(order_data))
+
     try:
-        response = await order_service.create_order(order_data.dict())
-        return response
+        # The cart table must be durable and current when an order is placed
+        await cart_store.flush([order_data.userid])
+        return await idempotency.run("create_order", idempotency_key, order_data.model_dump(), place_order, response)
+    except HTTPException:
+        raise
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/orders/{userid}", response_model=List[OrderResponse])
-async def get_orders_for_user(userid: int):
+async def get_orders_for_user(
+    userid: int,
+    status: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
     """
     Endpoint to fetch all orders for a specific user with product details, including images and order status.
 
     Args:
         userid (int): The user ID to fetch orders for.
+        status (str, optional): Only orders in this status.
+        limit (int, optional): Page size; with limit or cursor one keyset page is
+            returned as {"orders": [...], "next_cursor": ...}, newest orders first.
+        cursor (str, optional): next_cursor of the previous page.
 
     Returns:
         List[OrderResponse]: List of orders with product details.
@@ -73,9 +113,14 @@ async def get_orders_for_user(userid: int):
     """
     order_service = OrderService(database)
     try:
-        orders = await order_service.get_orders_for_user(userid)
+        if limit is not None or cursor is not None:
+            return json_response(await order_service.get_order_page(userid, limit or DEFAULT_PAGE_SIZE, cursor, status))
+        orders = await order_service.get_orders_for_user(userid, status)
         if not orders:
             raise HTTPException(status_code=404, detail="No orders found for the user")
-        return orders
+        # Rendered with orjson; response_model still documents the shape
+        return json_response(orders)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,14 +1,72 @@
+import json
 from sqlalchemy.exc import SQLAlchemyError
 from databases import Database
 from models import Order, OrderItem, Product
-from typing import Dict
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
+from stock_events import notify_stock_changes
+from reservations import Reservations, reservations as default_reservations
+from stock_stripes import StockStripes, stock_stripes as default_stock_stripes
+from pagination import ORDER_HISTORY_SORT, keyset_clause, next_cursor
+
+# Takes the ordered quantities out of stock in one statement (negative quantities return
+# stock). The locked CTE takes the row locks in productid order before the UPDATE touches
+# any row; rows without enough stock are left alone and missing from RETURNING.
+_TAKE_STOCK = """
+    WITH wanted AS (
+        SELECT * FROM unnest(CAST(:productids AS int[]), CAST(:quantities AS int[])) AS w(productid, quantity)
+    ),
+    locked AS (
+        SELECT p.productid
+        FROM products p
+        JOIN wanted w ON p.productid = w.productid
+        ORDER BY p.productid
+        FOR UPDATE OF p
+    )
+    UPDATE products p
+    SET stock = p.stock - w.quantity
+    FROM wanted w
+    WHERE p.productid = w.productid
+      AND p.productid IN (SELECT productid FROM locked)
+      AND p.stock >= w.quantity
+    RETURNING p.productid, p.stock
+"""
+
+_INSERT_ORDER_ITEMS = """
+    INSERT INTO order_items (orderid, productid, quantity, price)
+    SELECT CAST(:orderid AS int), i.productid, i.quantity, i.price
+    FROM unnest(CAST(:productids AS int[]), CAST(:quantities AS int[]), CAST(:prices AS numeric[]))
+        AS i(productid, quantity, price)
+"""
 
 class OrderService:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, holds: Reservations = default_reservations,
+                 stripes: StockStripes = default_stock_stripes):
         self.db = db
+        self.holds = holds
+        self.stripes = stripes
 
     async def create_order(self, order_data: Dict) -> Dict:
+        """
+        Create an order and take its items out of stock.
+
+        The work is a fixed number of statements whatever the number of lines: the order
+        row, one guarded stock UPDATE for all products and one INSERT for all order items.
+        Product rows are locked in productid order, so concurrent checkouts of overlapping
+        carts cannot deadlock. With reservations on, the user's holds are used up first
+        and only the difference to the ordered quantities touches products; an order of
+        exactly what was held locks no product rows at all. Striped products (see
+        stock_stripes.py) are taken from their stripes, before any product row is locked.
+
+        Raises:
+            ValueError: If a product does not exist or has too little stock.
+        """
+        # Lines for the same product are checked against the stock together
+        quantities: Dict[int, int] = {}
+        for item in order_data["items"]:
+            quantities[item["productid"]] = quantities.get(item["productid"], 0) + item["quantity"]
+        productids = sorted(quantities)
+
         try:
             async with self.db.transaction():
                 # Insert the order
@@ -25,74 +83,115 @@ class OrderService:
                     raise KeyError("'orderid' key missing from result")
                 orderid = result["orderid"]
 
-                # Process items
-                for item in order_data["items"]:
-                    stock_query = "SELECT stock FROM products WHERE productid = :productid"
-                    stock_result = await self.db.fetch_one(stock_query, {"productid": item["productid"]})
-                    if not stock_result or stock_result["stock"] < item["quantity"]:
-                        raise ValueError(f"Insufficient stock for product ID {item['productid']}")
+                # Held stock already left products.stock; take (or give back) only the rest
+                held = await self.holds.consume(order_data["userid"], productids) if self.holds.enabled else {}
+                deltas = {productid: quantities[productid] - held.get(productid, 0) for productid in productids}
+                changed = [productid for productid in productids if deltas[productid] != 0]
 
-                    await self.db.execute("UPDATE products SET stock = stock - :quantity WHERE productid = :productid", {"quantity": item["quantity"], "productid": item["productid"]})
+                striped = await self.stripes.striped(changed) if changed and self.stripes.enabled else set()
+                stock_changes = await self.stripes.take({productid: deltas[productid] for productid in striped}) if striped else {}
+                changed = [productid for productid in changed if productid not in striped]
 
-                    await self.db.execute("INSERT INTO order_items (orderid, productid, quantity, price) VALUES (:orderid, :productid, :quantity, :price)", {
-                        "orderid": orderid,
-                        "productid": item["productid"],
-                        "quantity": item["quantity"],
-                        "price": item["price"]
-                    })
+                # Products that are missing or short are not updated; the transaction rolls back
+                updated = await self.db.fetch_all(_TAKE_STOCK, {
+                    "productids": changed,
+                    "quantities": [deltas[productid] for productid in changed],
+                }) if changed else []
+                stock_changes.update({row["productid"]: row["stock"] for row in updated})
+                for productid in changed:
+                    if productid not in stock_changes:
+                        raise ValueError(f"Insufficient stock for product ID {productid}")
 
+                await self.db.execute(_INSERT_ORDER_ITEMS, {
+                    "orderid": orderid,
+                    "productids": [item["productid"] for item in order_data["items"]],
+                    "quantities": [item["quantity"] for item in order_data["items"]],
+                    "prices": [item["price"] for item in order_data["items"]],
+                })
+
+                # Delivered to stock listeners only if the order commits
+                await notify_stock_changes(self.db, stock_changes)
                 return {"orderid": orderid, "message": "Order created successfully"}
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Order creation error: {str(e)}")
-    async def get_orders_for_user(self, userid: int):
+
+    async def get_orders_for_user(self, userid: int, status: Optional[str] = None) -> List[Dict]:
         """
         Fetch all orders for a specific user along with product details, including images and order status.
 
         Args:
             userid (int): The user ID to fetch orders for.
+            status (str, optional): Only orders in this status.
 
         Returns:
-            List[dict]: A list of orders with product details.
+            List[dict]: A list of orders with product details, newest first.
         """
-        try:
-            query = """
-                SELECT
-                    o.orderid,
-                    o.userid,
-                    o.totalamount,
-                    o.status,
-                    o.orderdate,
-                    oi.productid,
-                    p.productname,
-                    p.image,
-                    oi.quantity,
-                    oi.price
+        return await self._fetch_orders(userid, status)
+
+    async def get_order_page(self, userid: int, limit: int, cursor: Optional[str] = None,
+                             status: Optional[str] = None) -> Dict:
+        """
+        Fetch one keyset page of a user's orders, newest first.
+
+        Returns:
+            dict: {"orders": [...], "next_cursor": str or None}
+        """
+        orders = await self._fetch_orders(userid, status, limit + 1, cursor)
+        return {
+            "orders": orders[:limit],
+            "next_cursor": next_cursor(orders, limit, ORDER_HISTORY_SORT, id_column="orderid"),
+        }
+
+    async def _fetch_orders(self, userid: int, status: Optional[str], limit: Optional[int] = None,
+                            cursor: Optional[str] = None) -> List[Dict]:
+        # One row per order: the page of orders is picked from the (userid, orderdate)
+        # index first, then each order's items are built into a JSON array
+        condition, order_by, values = keyset_clause(ORDER_HISTORY_SORT, cursor, alias="o", id_column="orderid")
+        filters = ["o.userid = :userid"]
+        if status is not None:
+            filters.append("o.status = :status")
+            values["status"] = status
+        if condition:
+            filters.append(condition)
+        values["userid"] = userid
+        page = ""
+        if limit is not None:
+            page = "LIMIT :limit"
+            values["limit"] = limit
+        query = f"""
+            SELECT o.orderid, o.userid, o.totalamount, o.status, o.orderdate, i.items
+            FROM (
+                SELECT o.orderid, o.userid, o.totalamount, o.status, o.orderdate
                 FROM orders o
-                JOIN order_items oi ON o.orderid = oi.orderid
+                WHERE {" AND ".join(filters)}
+                ORDER BY {order_by}
+                {page}
+            ) o
+            CROSS JOIN LATERAL (
+                SELECT COALESCE(json_agg(json_build_object(
+                    'productid', oi.productid,
+                    'productname', p.productname,
+                    'image', p.image,
+                    'quantity', oi.quantity,
+                    'price', oi.price
+                ) ORDER BY oi.productid), '[]') AS items
+                FROM order_items oi
                 JOIN products p ON oi.productid = p.productid
-                WHERE o.userid = :userid
-            """
-            rows = await self.db.fetch_all(query, {"userid": userid})
-            
-            orders = {}
-            for row in rows:
-                orderid = row["orderid"]
-                if orderid not in orders:
-                    orders[orderid] = {
-                        "orderid": orderid,
-                        "userid": row["userid"],
-                        "totalamount": row["totalamount"],
-                        "status": row["status"],
-                        "orderdate": row["orderdate"],
-                        "items": []
-                    }
-                orders[orderid]["items"].append({
-                    "productid": row["productid"],
-                    "productname": row["productname"],
-                    "image": row["image"],
-                    "quantity": row["quantity"],
-                    "price": row["price"]
-                })
-            return list(orders.values())
+                WHERE oi.orderid = o.orderid
+            ) i
+            ORDER BY {order_by}
+        """
+        try:
+            rows = await self.db.fetch_all(query, values)
         except SQLAlchemyError as e:
             raise Exception(f"Database error while fetching orders: {str(e)}")
+        orders = []
+        for row in rows:
+            order = dict(row)
+            # asyncpg hands json columns over as text
+            if isinstance(order["items"], str):
+                order["items"] = json.loads(order["items"])
+            orders.append(order)
+        return orders
@@ -0,0 +1,146 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class KeysetSort(NamedTuple):
+    # Sort column; None means the listing is ordered by productid alone
+    column: Optional[str]
+    descending: bool
+    # Converts the cursor's sort value back into the column's Python type
+    parse: Callable[[Any], Any]
+
+
+# Whitelisted sort orders. productid is always the tie-breaker so every row has a unique position.
+PRODUCT_SORTS: Dict[str, KeysetSort] = {
+    "id": KeysetSort(None, False, int),
+    "price_asc": KeysetSort("price", False, Decimal),
+    "price_desc": KeysetSort("price", True, Decimal),
+    "popularity_asc": KeysetSort("soldamount", False, int),
+    "popularity_desc": KeysetSort("soldamount", True, int),
+}
+
+
+def parse_date(value: str) -> date:
+    """
+    Parse an ISO date or timestamp, as encoded by encode_cursor, back into the same type.
+    """
+    if len(value) == 10:
+        return date.fromisoformat(value)
+    return datetime.fromisoformat(value)
+
+
+# Order history, newest first; orderid breaks ties between orders placed at the same time.
+# orderdate is a DATE in some databases and a TIMESTAMP in others; both round-trip.
+ORDER_HISTORY_SORT = KeysetSort("orderdate", True, parse_date)
+# Orders waiting to be shipped, oldest first
+PROCESSING_ORDERS_SORT = KeysetSort("orderdate", False, parse_date)
+
+
+def encode_cursor(sort_value: Any, productid: int) -> str:
+    """
+    Build an opaque cursor pointing just past the row with (sort_value, productid).
+    """
+    if isinstance(sort_value, Decimal):
+        sort_value = str(sort_value)
+    elif isinstance(sort_value, date):  # datetime too
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_value, productid], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: KeysetSort) -> Tuple[Any, int]:
+    """
+    Decode a cursor produced by encode_cursor for the given sort order.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, productid = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return sort.parse(sort_value), int(productid)
+    except (ValueError, TypeError, InvalidOperation):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_clause(sort: KeysetSort, cursor: Optional[str], alias: str = "",
+                  id_column: str = "productid") -> Tuple[str, str, Dict[str, Any]]:
+    """
+    Return the (WHERE condition, ORDER BY list, values) for one keyset page.
+
+    The condition is empty on the first page. Both columns are compared as a row so the
+    (column, id_column) index can seek straight to the cursor position.
+    """
+    prefix = f"{alias}." if alias else ""
+    direction = "DESC" if sort.descending else "ASC"
+    operator = "<" if sort.descending else ">"
+
+    if sort.column:
+        order_by = f"{prefix}{sort.column} {direction}, {prefix}{id_column} {direction}"
+    else:
+        order_by = f"{prefix}{id_column} {direction}"
+
+    if not cursor:
+        return "", order_by, {}
+
+    sort_value, row_id = decode_cursor(cursor, sort)
+    if sort.column:
+        condition = f"({prefix}{sort.column}, {prefix}{id_column}) {operator} (:cursor_value, :cursor_id)"
+        return condition, order_by, {"cursor_value": sort_value, "cursor_id": row_id}
+    return f"{prefix}{id_column} {operator} :cursor_id", order_by, {"cursor_id": row_id}
+
+
+def next_cursor(rows: List[Any], limit: int, sort: KeysetSort, id_column: str = "productid") -> Optional[str]:
+    """
+    Rows are fetched with LIMIT limit + 1; an extra row means there is another page.
+    """
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    sort_value = last[sort.column] if sort.column else last[id_column]
+    return encode_cursor(sort_value, last[id_column])
+
+
+async def fetch_product_page(
+    database,
+    sort_key: str,
+    limit: int,
+    cursor: Optional[str],
+    fields: Optional[Tuple[str, ...]] = None,
+) -> Dict[str, Any]:
+    """
+    Fetch one keyset page of products in the given sort order.
+
+    `fields` narrows the selected columns (see product_fields.parse_fields); the sort
+    column is always selected because the next cursor is built from it.
+
+    Returns:
+        dict: {"products": [...], "next_cursor": str or None}
+    """
+    sort = PRODUCT_SORTS[sort_key]
+    condition, order_by, values = keyset_clause(sort, cursor)
+    where = f"WHERE {condition}" if condition else ""
+    columns = "*"
+    if fields is not None:
+        columns = ", ".join(fields if sort.column is None or sort.column in fields else fields + (sort.column,))
+    query = f"""
+        SELECT {columns}
+        FROM products
+        {where}
+        ORDER BY {order_by}
+        LIMIT :limit
+    """
+    values["limit"] = limit + 1
+    rows = await database.fetch_all(query=query, values=values)
+    return {
+        "products": [dict(row) for row in rows[:limit]],
+        "next_cursor": next_cursor(rows, limit, sort),
+    }
@@ -0,0 +1,170 @@
+import os
+import re
+import heapq
+import asyncio
+import logging
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from databases import Database
+from catalog_cache import CatalogCache
+
+logger = logging.getLogger(__name__)
+
+# Seconds between refreshes of the best-selling order, from the catalog snapshot or,
+# when it is disabled, from the products table
+AUTOCOMPLETE_RANKING_INTERVAL = float(os.getenv("AUTOCOMPLETE_RANKING_INTERVAL", "30"))
+
+
+def prefix_keys(text: str) -> List[str]:
+    """
+    Every lower-cased word-start suffix of `text`, so "Samsung Galaxy S23" can be
+    found by typing "sam", "gal" or "s2".
+    """
+    words = re.findall(r"\w+", text.lower())
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex:
+    """
+    Sorted list of (key, productid) pairs over productname and productmodel.
+
+    A prefix lookup is a bisect into the list followed by a walk over the matching range,
+    so suggestions are served from memory without touching the database. The
+    best-selling ranking is refreshed in the background (see refresh_ranking).
+    """
+
+    def __init__(self, ranking_interval: float = AUTOCOMPLETE_RANKING_INTERVAL):
+        self.built = False
+        self.ranking_interval = ranking_interval
+        self._entries: List[Tuple[str, int]] = []
+        self._products: Dict[int, Dict[str, Any]] = {}
+        # Catalog sales version the ranking was taken from
+        self._sales_version: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def build(self, products: Iterable[Dict[str, Any]]) -> None:
+        entries = []
+        suggestions = {}
+        for product in products:
+            suggestion = self._suggestion(product)
+            suggestions[suggestion["productid"]] = suggestion
+            entries.extend((key, suggestion["productid"]) for key in self._keys(suggestion))
+        entries.sort()
+        self._entries = entries
+        self._products = suggestions
+        self.built = True
+
+    async def load(self, db: Database, catalog: CatalogCache) -> None:
+        """
+        Build the index at startup from the catalog snapshot, or from Postgres when the
+        snapshot is disabled.
+        """
+        if catalog.loaded:
+            products = catalog.sorted_by(None, False)
+        else:
+            products = await db.fetch_all("SELECT productid, productname, productmodel, soldamount FROM products")
+        self.build(products)
+        self._sales_version = catalog.column_versions["sales"] if catalog.loaded else None
+        logger.info(f"Autocomplete index built: {len(self._entries)} keys")
+
+    async def start(self, db: Database, catalog: CatalogCache) -> None:
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._ranking_loop(db, catalog))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _ranking_loop(self, db: Database, catalog: CatalogCache) -> None:
+        while True:
+            await asyncio.sleep(self.ranking_interval)
+            try:
+                await self.refresh_ranking(db, catalog)
+            except Exception as e:  # refresh again on the next tick
+                logger.warning(f"Autocomplete ranking refresh failed: {e}")
+
+    async def refresh_ranking(self, db: Database, catalog: CatalogCache) -> None:
+        """
+        Bring the soldamount used for ranking up to date: from the catalog snapshot when
+        it is loaded and its sales version moved, otherwise from Postgres. Only the
+        ranking changes; the prefix keys stay as they are. Runs every `ranking_interval`
+        seconds once started, never on a request.
+        """
+        if not self.built:
+            return
+        if catalog.loaded:
+            if self._sales_version == catalog.column_versions["sales"]:
+                return
+            self._sales_version = catalog.column_versions["sales"]
+            products = catalog.sorted_by(None, False)
+        else:
+            products = await db.fetch_all("SELECT productid, soldamount FROM products")
+        for product in products:
+            suggestion = self._products.get(product["productid"])
+            if suggestion is not None:
+                suggestion["soldamount"] = product["soldamount"] or 0
+
+    @staticmethod
+    def _suggestion(product: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "productid": product["productid"],
+            "productname": product["productname"],
+            "productmodel": product["productmodel"],
+            "soldamount": product.get("soldamount") or 0,
+        }
+
+    @staticmethod
+    def _keys(suggestion: Dict[str, Any]) -> set:
+        return set(prefix_keys(suggestion["productname"])) | set(prefix_keys(suggestion["productmodel"]))
+
+    def add(self, product: Dict[str, Any]) -> None:
+        if not self.built:
+            return
+        self.remove(product["productid"])
+        suggestion = self._suggestion(product)
+        self._products[suggestion["productid"]] = suggestion
+        for key in self._keys(suggestion):
+            insort(self._entries, (key, suggestion["productid"]))
+
+    def remove(self, productid: int) -> None:
+        if not self.built:
+            return
+        suggestion = self._products.pop(productid, None)
+        if suggestion is None:
+            return
+        for key in self._keys(suggestion):
+            position = bisect_left(self._entries, (key, productid))
+            if position < len(self._entries) and self._entries[position] == (key, productid):
+                del self._entries[position]
+
+    def suggest(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        Up to `limit` products with a name or model word starting with `prefix`,
+        best-selling first.
+        """
+        prefix = " ".join(re.findall(r"\w+", prefix.lower()))
+        if not prefix:
+            return []
+
+        matches = set()
+        position = bisect_left(self._entries, (prefix,))
+        while position < len(self._entries) and self._entries[position][0].startswith(prefix):
+            matches.add(self._entries[position][1])
+            position += 1
+
+        best = heapq.nlargest(
+            limit,
+            (self._products[productid] for productid in matches),
+            key=lambda s: (s["soldamount"], -s["productid"]),
+        )
+        return [dict(suggestion) for suggestion in best]
+
+
+# Shared index, built and kept ranked from the lifespan hook in main.py
+autocomplete_index = PrefixIndex()
@@ -1,8 +1,16 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from db import database
-from pydantic import BaseModel
-import os
-from typing import Optional
+from sql_registry import statements
+from pagination import fetch_product_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from catalog_cache import catalog
+from product_autocomplete import autocomplete_index
+from etags import catalog_not_modified
+from fast_json import json_response
+from streaming import wants_ndjson, stream_query, stream_rows
+from product_fields import parse_fields, product_statement, project, project_all
+from product_search import search_products, fuzzy_search_products, NAME_WEIGHT, DESCRIPTION_WEIGHT
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 
     
 class DiscountRequest(BaseModel):
@@ -10,11 +18,10 @@ class DiscountRequest(BaseModel):
 
 router = APIRouter()
 
-# Helper function to load SQL files
-def load_sql_file(filename: str) -> str:
-    file_path = os.path.join("sql", filename)
-    with open(file_path, "r") as file:
-        return file.read()
+# Most product IDs accepted by one POST /products/batch request
+MAX_BATCH_SIZE = 500
+
+FIELDS_DESCRIPTION = "Comma-separated product columns to return, e.g. productid,productname,price,image"
 
 
 # Pydantic model for adding a product
@@ -33,51 +40,142 @@ class ProductCreate(BaseModel):
     discountprice: Optional[float]  # Optional field for discount
     image: str
 
+class ProductBatchRequest(BaseModel):
+    productids: List[int] = Field(max_length=MAX_BATCH_SIZE)
+
+# Fetch many products in one request (carts, wishlists, order history).
+# Products come back in the order requested; unknown IDs are left out.
+@router.post("/products/batch")
+async def get_products_batch(
+    batch: ProductBatchRequest,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
+):
+    columns = parse_fields(fields)
+    productids = list(dict.fromkeys(batch.productids))
+    found = {}
+
+    if await catalog.ready():
+        for productid in productids:
+            product = catalog.get(productid)
+            if product:
+                found[productid] = project(product, columns)
+
+    # Snapshot misses (or everything, without a snapshot) in a single query
+    missing = [productid for productid in productids if productid not in found]
+    if missing:
+        query = product_statement("get_products_by_ids", columns)
+        rows = await database.fetch_all(query=query, values={"ids": missing})
+        found.update((row["productid"], row) for row in rows)
+
+    return json_response([found[productid] for productid in productids if productid in found])
+
+# Ranked full-text search over name, model and description, or typo-tolerant
+# similarity search on name and model with mode=fuzzy.
+# Declared before /products/{product_id}/ so "search" is not parsed as a product ID.
+@router.get("/products/search/")
+async def search_products_endpoint(
+    q: str,
+    mode: Literal["fulltext", "fuzzy"] = "fulltext",
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0)
+):
+    if mode == "fuzzy":
+        products = await fuzzy_search_products(database, q, limit=offset + limit)
+        return products[offset:]
+    return await search_products(database, q, limit=limit, offset=offset)
+
 # Get product by ID
 @router.get("/products/{product_id}/")
 async def get_product_by_id(product_id: int):
-    query = load_sql_file("get_product_by_id.sql")
+    if await catalog.ready():
+        product = catalog.get(product_id)
+        if product:
+            return product
+
+    query = statements["get_product_by_id"].text
     product = await database.fetch_one(query=query, values={"productID": product_id})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return dict(product)
 
-# Search products by name (partial match)
+# Search products by name or model (word-prefix match on the full-text index)
 @router.get("/products/search/name/")
-async def search_products_by_name(productName: str):
-    query = load_sql_file("search_product_by_name.sql")
-    products = await database.fetch_all(query=query, values={"productName": productName})
-    return [dict(product) for product in products]
+async def search_products_by_name(
+    productName: str,
+    mode: Literal["fulltext", "fuzzy"] = "fulltext",
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
+):
+    columns = parse_fields(fields)
+    if mode == "fuzzy":
+        # Top `limit` most similar names, so misspellings still find the product
+        products = await fuzzy_search_products(database, productName, limit=limit, fields=columns)
+        return [{key: value for key, value in product.items() if key != "similarity"} for product in products]
+    products = await search_products(database, productName, weights=NAME_WEIGHT, fields=columns)
+    return [{key: value for key, value in product.items() if key != "rank"} for product in products]
 
-# Search products by description (partial match)
+# Search products by description (word-prefix match on the full-text index)
 @router.get("/products/search/description/")
 async def search_products_by_description(description: str):
-    query = load_sql_file("search_product_by_description.sql")
-    products = await database.fetch_all(query=query, values={"description": description})
-    return [dict(product) for product in products]
+    products = await search_products(database, description, weights=DESCRIPTION_WEIGHT)
+    return [{key: value for key, value in product.items() if key != "rank"} for product in products]
 
-# Get all products
+# Get all products (one keyset page ordered by productid when limit or cursor is given).
+# With Accept: application/x-ndjson the full list is streamed one product per line.
 @router.get("/products/")
-async def get_all_products():
-    query = load_sql_file("get_all_products.sql")
+async def get_all_products(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
+):
+    columns = parse_fields(fields)
+
+    if wants_ndjson(request) and limit is None and cursor is None:
+        # Not tagged: the ETag describes the JSON representation
+        if await catalog.ready():
+            return stream_rows(catalog.sorted_by(None, False), transform=lambda product: project(product, columns))
+        return stream_query(database, product_statement("get_all_products", columns))
+
+    not_modified = await catalog_not_modified(request, response, catalog)
+    if not_modified:
+        return not_modified
+
+    if limit is not None or cursor is not None:
+        if await catalog.ready():
+            page = catalog.product_page("id", limit or DEFAULT_PAGE_SIZE, cursor)
+            page["products"] = project_all(page["products"], columns)
+            return json_response(page, response)
+        return json_response(await fetch_product_page(database, "id", limit or DEFAULT_PAGE_SIZE, cursor, columns))
+
+    if await catalog.ready():
+        # Serialized straight from the shared snapshot rows; rendering does not modify them
+        return json_response(project_all(catalog.sorted_by(None, False), columns), response)
+
+    query = product_statement("get_all_products", columns)
     products = await database.fetch_all(query=query)
-    return [dict(product) for product in products]
+    return json_response(products)
 
 # Add a new product
 @router.post("/products/")
 async def add_product(product: ProductCreate):
-    query = load_sql_file("add_product.sql")
+    query = statements["add_product"].text
     values = product.dict()
     new_product = await database.fetch_one(query=query, values=values)
+    catalog.upsert(dict(new_product))
+    autocomplete_index.add(dict(new_product))
     return dict(new_product)
 
 # Remove a product
 @router.delete("/products/{product_id}/")
 async def remove_product(product_id: int):
-    query = load_sql_file("remove_product.sql")
+    query = statements["remove_product"].text
     product = await database.fetch_one(query=query, values={"productID": product_id})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    catalog.remove(product_id)
+    autocomplete_index.remove(product_id)
     return {"message": "Product removed successfully", "product": dict(product)}
 
 # Add a discount to a product
@@ -88,17 +186,19 @@ async def add_discount(product_id: int, discount: DiscountRequest):
     if discountPrice <= 0:
         raise HTTPException(status_code=400, detail="Discount price must be greater than 0")
 
-    query = load_sql_file("add_discount.sql")
+    query = statements["add_discount"].text
     product = await database.fetch_one(query=query, values={"productID": product_id, "discountPrice": discountPrice})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    catalog.upsert(dict(product))
     return {"message": "Discount added successfully", "product": dict(product)}
 
 # Remove a discount from a product
 @router.put("/products/{product_id}/discount/remove/")
 async def remove_discount(product_id: int):
-    query = load_sql_file("remove_discount.sql")
+    query = statements["remove_discount"].text
     product = await database.fetch_one(query=query, values={"productID": product_id})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    catalog.upsert(dict(product))
     return {"message": "Discount removed successfully", "product": dict(product)}
\ No newline at end of file
@@ -0,0 +1,88 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sql_registry import statements
+
+# Columns of the products table a client may request with fields=, in table order.
+# productid is always returned so rows can be identified and paginated.
+PRODUCT_FIELDS: Tuple[str, ...] = (
+    "productid",
+    "serialnumber",
+    "productname",
+    "productmodel",
+    "description",
+    "distributerinfo",
+    "warranty",
+    "price",
+    "cost",
+    "stock",
+    "categoryid",
+    "soldamount",
+    "discountprice",
+    "image",
+    "averagerating",
+)
+
+# The SELECT * / SELECT p.* that a column list replaces in a product statement
+_SELECT_STAR = re.compile(r"SELECT\s+(\w+\.)?\*", re.IGNORECASE)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Validate a comma-separated fields= value against PRODUCT_FIELDS.
+
+    The result is in table order, so "price,productname" and "productname,price" share
+    one cached statement variant.
+
+    Returns:
+        Optional[Tuple[str, ...]]: The selected columns, or None for all columns.
+
+    Raises:
+        HTTPException: 400 if a field is not a product column.
+    """
+    if fields is None or not fields.strip():
+        return None
+    requested = {field.strip().lower() for field in fields.split(",") if field.strip()}
+    unknown = requested.difference(PRODUCT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    requested.add("productid")
+    return tuple(field for field in PRODUCT_FIELDS if field in requested)
+
+
+def select_list(fields: Iterable[str], alias: str = "") -> str:
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(f"{prefix}{field}" for field in fields)
+
+
+@lru_cache(maxsize=256)
+def product_statement(name: str, fields: Optional[Tuple[str, ...]]) -> str:
+    """
+    Text of a registered product statement with its SELECT * narrowed to `fields`.
+
+    Variants are cached per (statement, fields), and because fields are canonical the
+    number of distinct query texts stays small enough for asyncpg's statement cache.
+    """
+    text = statements[name].text
+    if fields is None:
+        return text
+    match = _SELECT_STAR.search(text)
+    if match is None:
+        raise ValueError(f"Statement {name} has no SELECT * to narrow")
+    alias = (match.group(1) or "").rstrip(".")
+    return f"{text[:match.start()]}SELECT {select_list(fields, alias)}{text[match.end():]}"
+
+
+def project(product: Dict[str, Any], fields: Optional[Tuple[str, ...]]) -> Dict[str, Any]:
+    """
+    Narrow an in-memory product row to `fields` (a copy, or the row itself for all columns).
+    """
+    if fields is None:
+        return product
+    return {field: product[field] for field in fields}
+
+
+def project_all(products: Iterable[Dict[str, Any]], fields: Optional[Tuple[str, ...]]) -> List[Dict[str, Any]]:
+    return [project(product, fields) for product in products]
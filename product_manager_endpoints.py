@@ -8,8 +8,16 @@ from pydantic import BaseModel
 from invoice_endpoints import InvoiceRequest
 from product_endpoints import ProductCreate
 from db import database
-from datetime import datetime
+from sql_registry import statements
+from catalog_cache import catalog
+from product_autocomplete import autocomplete_index
+from fast_json import json_response
+from pagination import PROCESSING_ORDERS_SORT, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_clause, next_cursor
+from stock_events import notify_stock_changes
+from stock_stripes import stock_stripes, DEFAULT_STRIPES, MAX_STRIPES
+from datetime import datetime, timedelta
 import os
+import json
 from typing import Literal
 from datetime import date
 
@@ -19,6 +27,10 @@ class DeliveryCreate(BaseModel):
 class DeliveryUpdate(BaseModel):
     status: str
 
+class BulkStatusUpdate(BaseModel):
+    orderids: List[int]
+    status: Literal['in-transit', 'delivered']
+
 class DeliveryRead(BaseModel):
     deliveryid: int
     orderid: int
@@ -31,11 +43,6 @@ class DeliveryRead(BaseModel):
     orderdate: date  # Added to include `orderdate`
     price: float  # Added to include `price`
     
-# Helper function to load SQL files
-def load_sql_file(filename: str) -> str:
-    file_path = os.path.join("sql", filename)
-    with open(file_path, "r") as file:
-        return file.read()
 
 manager_router = APIRouter(
     prefix="/productmanagerpanel",
@@ -89,6 +96,9 @@ async def add_product(
     if not new_product:
         raise HTTPException(status_code=400, detail="Failed to add product")
 
+    # RETURNING only has some columns; re-read the full row for the catalog snapshot
+    await catalog.refresh_product(new_product["productid"])
+    autocomplete_index.add(dict(new_product))
     return dict(new_product)
 
 
@@ -98,13 +108,15 @@ async def remove_product(
     current_user_id: int = Depends(product_manager_required),
 
 ):
-    query = load_sql_file("find_product.sql")
+    query = statements["find_product"].text
     row = await database.fetch_one(query, {"productID": product_id})
     if not row:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    delete_query = load_sql_file("remove_product.sql")
+    delete_query = statements["remove_product"].text
     await database.execute(delete_query, {"productID": product_id})
+    catalog.remove(product_id)
+    autocomplete_index.remove(product_id)
     return {"detail": "Product removed successfully"}
 
 @manager_router.patch("/products/{productid}/stock")
@@ -115,7 +127,7 @@ async def update_product_stock(
  
 ):
     # check product
-    query = load_sql_file("find_product.sql")
+    query = statements["find_product"].text
     product_row = await database.fetch_one(query, {"productID": productid})
     if not product_row:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -125,9 +137,33 @@ async def update_product_stock(
         SET stock = :stock
         WHERE productid = :productid
     """
-    await database.execute(update_query, {"stock": stock, "productid": productid})
+    async with database.transaction():
+        await database.execute(update_query, {"stock": stock, "productid": productid})
+        # A striped product's stock lives in its stripes
+        await stock_stripes.set_stock(productid, stock)
+    catalog.patch(productid, stock=stock)
+    await notify_stock_changes(database, {productid: stock})
     return {"detail": "Stock updated successfully", "new_stock": stock}
 
+@manager_router.patch("/products/{productid}/stock/stripes")
+async def update_product_stock_stripes(
+    productid: int,
+    stripes: int = Query(DEFAULT_STRIPES, ge=0, le=MAX_STRIPES),
+    #current_user_id: int = Depends(product_manager_required),
+):
+    """
+    Split a hot product's stock across `stripes` counters so concurrent orders do not
+    queue on its row; 0 turns striping off again.
+    """
+    if not stock_stripes.enabled:
+        raise HTTPException(status_code=400, detail="Striped stock is not enabled")
+    stock = await stock_stripes.resize(productid, stripes)
+    if stock is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    catalog.patch(productid, stock=stock)
+    await notify_stock_changes(database, {productid: stock})
+    return {"detail": "Stock stripes updated successfully", "stripes": stripes, "stock": stock}
+
 #####################
 #   DELIVERIES
 #####################
@@ -135,7 +171,7 @@ async def update_product_stock(
 @manager_router.get("/deliveries")
 async def view_deliveries(
 ):
-    query = load_sql_file("get_all_deliveries.sql")
+    query = statements["get_all_deliveries"].text
     rows = await database.fetch_all(query)
     deliveries = [dict(row) for row in rows]
     return {"deliveries": deliveries}
@@ -177,6 +213,74 @@ async def update_order_status(
 
     return {"detail": f"Order and associated deliveries marked as {status}"}
 
+# Status an order must be in to move to each target status
+ALLOWED_TRANSITIONS = {
+    "in-transit": {"processing"},
+    "delivered": {"in-transit"},
+}
+# Most orders accepted by one bulk status update
+MAX_BULK_ORDERS = 1000
+
+@manager_router.patch("/orders/status")
+async def update_order_statuses(update: BulkStatusUpdate):
+    """
+    Move many orders, and their deliveries, to 'in-transit' or 'delivered' at once.
+
+    Orders are checked against ALLOWED_TRANSITIONS; the valid ones are updated together in
+    one transaction. Each order gets an outcome: 'updated', 'unchanged' (already in the
+    status), 'invalid_transition' or 'not_found'.
+    """
+    orderids = list(dict.fromkeys(update.orderids))
+    if not orderids:
+        raise HTTPException(status_code=400, detail="No orders given")
+    if len(orderids) > MAX_BULK_ORDERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_ORDERS} orders can be updated at once")
+
+    async with database.transaction():
+        # Locked in orderid order so concurrent bulk updates cannot deadlock, and so no
+        # order changes status between the check and the update
+        lock_query = """
+            SELECT orderid, status
+            FROM orders
+            WHERE orderid = ANY(:orderids)
+            ORDER BY orderid
+            FOR UPDATE
+        """
+        rows = await database.fetch_all(lock_query, {"orderids": orderids})
+        current = {row["orderid"]: row["status"] for row in rows}
+
+        results = []
+        updated = []
+        for orderid in orderids:
+            previous = current.get(orderid)
+            if previous is None:
+                outcome = "not_found"
+            elif previous == update.status:
+                outcome = "unchanged"
+            elif previous not in ALLOWED_TRANSITIONS[update.status]:
+                outcome = "invalid_transition"
+            else:
+                outcome = "updated"
+                updated.append(orderid)
+            results.append({"orderid": orderid, "outcome": outcome, "previous_status": previous})
+
+        if updated:
+            update_orders_query = """
+                UPDATE orders
+                SET status = :status
+                WHERE orderid = ANY(:orderids)
+            """
+            await database.execute(update_orders_query, {"orderids": updated, "status": update.status})
+
+            update_deliveries_query = """
+                UPDATE deliveries
+                SET status = :status
+                WHERE orderid = ANY(:orderids)
+            """
+            await database.execute(update_deliveries_query, {"orderids": updated, "status": update.status})
+
+    return {"status": update.status, "updated": len(updated), "results": results}
+
 @manager_router.post("/deliveries/create", response_model=List[DeliveryRead])
 async def create_delivery(
     delivery_data: DeliveryCreate
@@ -186,7 +290,7 @@ async def create_delivery(
     """
 
     # Load the SQL script
-    insert_query = load_sql_file("add_delivery.sql")
+    insert_query = statements["add_delivery"].text
 
     # Execute the query and fetch all newly inserted rows
     try:
@@ -201,50 +305,78 @@ async def create_delivery(
     return [DeliveryRead(**dict(row)) for row in new_rows]
 
 @manager_router.get("/orders/processing")
-async def get_processing_orders():
-    """
-    Retrieve all orders with the status of 'processing', including their items.
+async def get_processing_orders(
+    userid: Optional[int] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
     """
+    Retrieve all orders with the status of 'processing', including their items, oldest first.
 
-    # Query to get all orders with status 'processing'
-    orders_query = """
-        SELECT *
-        FROM orders
-        WHERE status = 'processing';
+    Optionally only one user's orders, or orders placed between from_date and to_date
+    (inclusive). With limit or cursor one keyset page is returned as
+    {"orders": [...], "next_cursor": ...}.
     """
-
-    # Query to get items for a specific order
-    items_query = """
-        SELECT productid, quantity
-        FROM order_items
-        WHERE orderid = :orderid;
+    paged = limit is not None or cursor is not None
+    page_size = limit or DEFAULT_PAGE_SIZE
+    condition, order_by, values = keyset_clause(PROCESSING_ORDERS_SORT, cursor, alias="o", id_column="orderid")
+
+    # The status condition matches the partial index on processing orders
+    filters = ["o.status = 'processing'"]
+    if userid is not None:
+        filters.append("o.userid = :userid")
+        values["userid"] = userid
+    if from_date is not None:
+        filters.append("o.orderdate >= :from_date")
+        values["from_date"] = from_date
+    if to_date is not None:
+        filters.append("o.orderdate < :to_date")
+        values["to_date"] = to_date + timedelta(days=1)
+    if condition:
+        filters.append(condition)
+    page = ""
+    if paged:
+        page = "LIMIT :limit"
+        values["limit"] = page_size + 1
+
+    # One query for the orders and all their items
+    query = f"""
+        SELECT o.orderid, o.userid, o.totalamount, o.orderdate, o.status, i.items
+        FROM (
+            SELECT o.orderid, o.userid, o.totalamount, o.orderdate, o.status
+            FROM orders o
+            WHERE {" AND ".join(filters)}
+            ORDER BY {order_by}
+            {page}
+        ) o
+        CROSS JOIN LATERAL (
+            SELECT COALESCE(json_agg(json_build_object(
+                'productid', oi.productid,
+                'quantity', oi.quantity
+            ) ORDER BY oi.productid), '[]') AS items
+            FROM order_items oi
+            WHERE oi.orderid = o.orderid
+        ) i
+        ORDER BY {order_by}
     """
+    rows = await database.fetch_all(query, values)
 
-    # Fetch all orders with status 'processing'
-    orders = await database.fetch_all(orders_query)
-
-    # Add items to each order
     results = []
-    for order in orders:
-        items = await database.fetch_all(items_query, {"orderid": order["orderid"]})
-        results.append({
-            "orderid": order["orderid"],
-            "userid": order["userid"],
-            "totalamount": order["totalamount"],
-            "orderdate": order["orderdate"],
-            "status": order["status"],
-            "items": [
-                {
-                    "productid": item["productid"],
-                    "quantity": item["quantity"]
-                } for item in items
-            ]
+    for row in rows:
+        order = dict(row)
+        # asyncpg hands json columns over as text
+        if isinstance(order["items"], str):
+            order["items"] = json.loads(order["items"])
+        results.append(order)
+
+    if paged:
+        return json_response({
+            "orders": results[:page_size],
+            "next_cursor": next_cursor(results, page_size, PROCESSING_ORDERS_SORT, id_column="orderid"),
         })
-
-    return results
-
-
-
+    return json_response(results)
 
 
 #####################
@@ -315,7 +447,6 @@ async def list_invoices(
     return filtered_invoices
 
 
-
 @manager_router.get("/invoices/{filename}", response_class=FileResponse)
 async def get_invoice(
     filename: str
@@ -378,6 +509,20 @@ async def fetch_products():
     """
     Fetch all products with their category names.
     """
+    if await catalog.ready():
+        return json_response([
+            {
+                "productid": product["productid"],
+                "productname": product["productname"],
+                "price": product["price"],
+                "stock": product["stock"],
+                "categoryname": catalog.category_name(product["categoryid"]),
+            }
+            for product in catalog.sorted_by(None, False)
+            # Same rows as the inner join below: skip products without a category
+            if catalog.category_name(product["categoryid"]) is not None
+        ])
+
     query = """
         SELECT 
             p.productid, 
@@ -395,16 +540,8 @@ async def fetch_products():
             p.productid ASC
     """
     products = await database.fetch_all(query=query)
-    return [
-        {
-            "productid": row["productid"],
-            "productname": row["productname"],
-            "price": row["price"],
-            "stock": row["stock"],
-            "categoryname": row["categoryname"],  # Now using the correct column name
-        }
-        for row in products
-    ]
+    # The selected columns are already the response shape
+    return json_response(products)
 @manager_router.post("/categories")
 async def add_category(name: str):
     """
@@ -414,6 +551,7 @@ async def add_category(name: str):
     new_category = await database.fetch_one(query=query, values={"name": name})
     if not new_category:
         raise HTTPException(status_code=400, detail="Failed to create category")
+    catalog.invalidate()
     return {"categoryid": new_category["categoryid"], "name": new_category["name"]}
 
 @manager_router.delete("/categories/{categoryid}")
@@ -428,12 +566,15 @@ async def delete_category(categoryid: int):
         raise HTTPException(status_code=404, detail="Category not found")
 
     # Delete all products in the category
-    delete_products_query = "DELETE FROM products WHERE categoryid = :categoryid"
-    await database.execute(query=delete_products_query, values={"categoryid": categoryid})
+    delete_products_query = "DELETE FROM products WHERE categoryid = :categoryid RETURNING productid"
+    deleted_products = await database.fetch_all(query=delete_products_query, values={"categoryid": categoryid})
+    for product in deleted_products:
+        autocomplete_index.remove(product["productid"])
 
     # Delete the category
     delete_category_query = "DELETE FROM categories WHERE categoryid = :categoryid"
     await database.execute(query=delete_category_query, values={"categoryid": categoryid})
+    catalog.invalidate()
 
     return {"detail": f"Category {categoryid} and its associated products have been deleted"}
 
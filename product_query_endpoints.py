@@ -0,0 +1,133 @@
+import json
+from decimal import Decimal
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from db import database
+from pagination import PRODUCT_SORTS, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_clause, next_cursor
+from product_autocomplete import autocomplete_index
+
+router = APIRouter()
+
+
+def build_product_query(
+    category: Optional[int],
+    min_price: Optional[float],
+    max_price: Optional[float],
+    min_rating: Optional[float],
+    in_stock: bool,
+    sort_key: str,
+    limit: int,
+    cursor: Optional[str],
+):
+    """
+    Compile the filters into one statement returning a keyset page of products and
+    per-category facet counts as two JSON columns.
+
+    Facets ignore the category filter so the storefront can show how many matches
+    every other category has.
+    """
+    sort = PRODUCT_SORTS[sort_key]
+    filters = []
+    values = {}
+
+    if min_price is not None:
+        filters.append("COALESCE(p.discountprice, p.price) >= :min_price")
+        values["min_price"] = min_price
+    if max_price is not None:
+        filters.append("COALESCE(p.discountprice, p.price) <= :max_price")
+        values["max_price"] = max_price
+    if min_rating is not None:
+        filters.append("p.averagerating >= :min_rating")
+        values["min_rating"] = min_rating
+    if in_stock:
+        filters.append("p.stock > 0")
+
+    page_filters = []
+    if category is not None:
+        page_filters.append("p.categoryid = :category")
+        values["category"] = category
+    condition, order_by, cursor_values = keyset_clause(sort, cursor, alias="p")
+    if condition:
+        page_filters.append(condition)
+    values.update(cursor_values)
+    values["limit"] = limit + 1
+
+    base_where = " AND ".join(filters) or "TRUE"
+    page_where = " AND ".join(page_filters) or "TRUE"
+
+    query = f"""
+        WITH filtered AS NOT MATERIALIZED (
+            SELECT p.*
+            FROM products p
+            WHERE {base_where}
+        ),
+        page AS (
+            SELECT p.*
+            FROM filtered p
+            WHERE {page_where}
+            ORDER BY {order_by}
+            LIMIT :limit
+        ),
+        facets AS (
+            SELECT p.categoryid, c.name, COUNT(*) AS count
+            FROM filtered p
+            LEFT JOIN categories c ON c.categoryid = p.categoryid
+            GROUP BY p.categoryid, c.name
+        )
+        SELECT
+            (SELECT COALESCE(json_agg(p ORDER BY {order_by}), '[]') FROM page p)::text AS products,
+            (SELECT COALESCE(json_agg(f ORDER BY f.categoryid), '[]') FROM facets f)::text AS facets
+    """
+    return query, values
+
+
+@router.get("/products/query")
+async def query_products(
+    category: Optional[int] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    in_stock: bool = False,
+    sort: str = "id",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """
+    Filter, sort and paginate products in a single query.
+
+    Price filters use discountprice when a discount is set. Sort keys are the same as
+    the keyset-paginated sort routes: id, price_asc, price_desc, popularity_asc, popularity_desc.
+
+    Returns:
+        dict: {"products": [...], "next_cursor": str or None, "facets": [{"categoryid", "name", "count"}]}
+    """
+    if sort not in PRODUCT_SORTS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort key. Must be one of: {', '.join(PRODUCT_SORTS)}")
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=400, detail="min_price cannot be greater than max_price")
+
+    query, values = build_product_query(category, min_price, max_price, min_rating, in_stock, sort, limit, cursor)
+    row = await database.fetch_one(query=query, values=values)
+
+    # Parse numerics as Decimal so price cursors round-trip exactly
+    products = json.loads(row["products"], parse_float=Decimal)
+    facets = json.loads(row["facets"], parse_float=Decimal)
+    return {
+        "products": products[:limit],
+        "next_cursor": next_cursor(products, limit, PRODUCT_SORTS[sort]),
+        "facets": facets,
+    }
+
+
+@router.get("/products/autocomplete")
+async def autocomplete_products(
+    q: str,
+    limit: int = Query(8, ge=1, le=50)
+):
+    """
+    Name/model suggestions for the search box, best-selling first.
+    Served entirely from the in-memory prefix index.
+    """
+    if not autocomplete_index.built:
+        raise HTTPException(status_code=503, detail="Autocomplete index is not ready")
+    return autocomplete_index.suggest(q, limit)
@@ -0,0 +1,157 @@
+import os
+import re
+import heapq
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from databases import Database
+from catalog_cache import catalog
+from product_fields import product_statement, project
+
+# Weight labels used by product_search_vector() in sql/create_product_search_index.sql
+NAME_WEIGHT = "A"
+DESCRIPTION_WEIGHT = "B"
+
+# "postgres" uses pg_trgm (sql/create_product_trigram_index.sql); "memory" uses the
+# TrigramIndex below over the catalog snapshot, for databases without the extension.
+FUZZY_SEARCH_BACKEND = os.getenv("FUZZY_SEARCH_BACKEND", "postgres").lower()
+# Same default as pg_trgm.similarity_threshold, used by the % operator
+SIMILARITY_THRESHOLD = 0.3
+
+
+def to_prefix_tsquery(text: str, weights: str = "") -> Optional[str]:
+    """
+    Turn free text into a to_tsquery() expression that matches every word as a prefix,
+    so partially typed words ("sams gal") still match ("Samsung Galaxy").
+
+    Only word characters are kept, which also makes the expression safe to pass to
+    to_tsquery(). Returns None when the text contains no words.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    return " & ".join(f"{word}:*{weights}" for word in words)
+
+
+async def search_products(
+    db: Database,
+    text: str,
+    weights: str = "",
+    limit: Optional[int] = None,
+    offset: int = 0,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Ranked full-text search over productname, productmodel and description.
+
+    Args:
+        text (str): Free-text query.
+        weights (str): Restrict matches to these weight labels (e.g. NAME_WEIGHT); empty means all fields.
+        limit (Optional[int]): Maximum rows to return; None returns every match.
+        offset (int): Rows to skip.
+        fields (Optional[Tuple[str, ...]]): Product columns to select (see product_fields.parse_fields); None selects all.
+
+    Returns:
+        List[dict]: Product rows ordered by relevance, each with a `rank` value.
+    """
+    tsquery = to_prefix_tsquery(text, weights)
+    if tsquery is None:
+        return []
+    query = product_statement("search_products", fields)
+    rows = await db.fetch_all(query=query, values={"tsquery": tsquery, "limit": limit, "offset": offset})
+    return [dict(row) for row in rows]
+
+
+#####################
+#   FUZZY SEARCH
+#####################
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Trigrams of a string, extracted the way pg_trgm does it: lower-cased alphanumeric
+    words, each padded with two leading spaces and one trailing space.
+    """
+    grams: Set[str] = set()
+    for word in re.findall(r"[^\W_]+", text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """
+    Inverted index from trigram to product IDs over productname + productmodel.
+
+    A lookup only touches the posting lists of the query's trigrams, so it never scans
+    the whole catalog. Scores match pg_trgm's similarity(): shared / (query + document - shared).
+    """
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.version: Optional[int] = None
+        self._postings: Dict[str, List[int]] = {}
+        self._sizes: Dict[int, int] = {}
+
+    def build(self, products: Iterable[Dict[str, Any]], version: Optional[int] = None) -> None:
+        postings: Dict[str, List[int]] = {}
+        sizes: Dict[int, int] = {}
+        for product in products:
+            grams = trigrams(f"{product['productname']} {product['productmodel']}")
+            sizes[product["productid"]] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(product["productid"])
+        self._postings = postings
+        self._sizes = sizes
+        self.version = version
+
+    def search(self, text: str, limit: int) -> List[Tuple[float, int]]:
+        """
+        Return up to `limit` (similarity, productid) pairs, best match first.
+        """
+        query = trigrams(text)
+        if not query:
+            return []
+        shared = Counter()
+        for gram in query:
+            shared.update(self._postings.get(gram, ()))
+
+        scored = []
+        for productid, count in shared.items():
+            similarity = count / (len(query) + self._sizes[productid] - count)
+            if similarity >= self.threshold:
+                scored.append((similarity, productid))
+        # Highest similarity first, lowest productid on ties (same order as the SQL query)
+        return heapq.nlargest(limit, scored, key=lambda pair: (pair[0], -pair[1]))
+
+
+# Index over the catalog snapshot, rebuilt when product names or models change (stock
+# and price patches leave it alone)
+trigram_index = TrigramIndex()
+
+
+async def fuzzy_search_products(
+    db: Database,
+    text: str,
+    limit: int = 10,
+    fields: Optional[Tuple[str, ...]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Top-k products whose name and model are most similar to `text`, tolerating typos
+    ("Samsng Galxy" finds "Samsung Galaxy").
+
+    Returns:
+        List[dict]: Product rows ordered by similarity, each with a `similarity` value.
+    """
+    if FUZZY_SEARCH_BACKEND == "memory" and await catalog.ready():
+        if trigram_index.version != catalog.column_versions["text"]:
+            trigram_index.build(catalog.sorted_by(None, False), catalog.column_versions["text"])
+        results = []
+        for similarity, productid in trigram_index.search(text, limit):
+            product = project(catalog.get(productid), fields)
+            product["similarity"] = similarity
+            results.append(product)
+        return results
+
+    query = product_statement("fuzzy_search_products", fields)
+    rows = await db.fetch_all(query=query, values={"q": text, "limit": limit})
+    return [dict(row) for row in rows]
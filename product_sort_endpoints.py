@@ -1,39 +1,68 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from db import database
-import os
+from sql_registry import statements
+from pagination import fetch_product_page, PRODUCT_SORTS, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from catalog_cache import catalog
+from etags import catalog_not_modified
+from typing import Optional
 
 router = APIRouter()
 
-# Helper function to load SQL files
-def load_sql_file(filename: str) -> str:
-    file_path = os.path.join("sql", filename)
-    with open(file_path, "r") as file:
-        return file.read()
+
+# Shared handler: the whole sorted table by default, one keyset page when limit or cursor is given
+async def sorted_products(request: Request, response: Response, sql_name: str, sort_key: str, limit: Optional[int], cursor: Optional[str]):
+    not_modified = await catalog_not_modified(request, response, catalog)
+    if not_modified:
+        return not_modified
+
+    if await catalog.ready():
+        if limit is None and cursor is None:
+            sort = PRODUCT_SORTS[sort_key]
+            return [dict(product) for product in catalog.sorted_by(sort.column, sort.descending)]
+        return catalog.product_page(sort_key, limit or DEFAULT_PAGE_SIZE, cursor)
+
+    if limit is None and cursor is None:
+        query = statements[sql_name].text
+        products = await database.fetch_all(query=query)
+        return [dict(product) for product in products]
+    return await fetch_product_page(database, sort_key, limit or DEFAULT_PAGE_SIZE, cursor)
 
 # Endpoint to get products sorted by price in ascending order
 @router.get("/products/sort/price/asc/")
-async def sort_products_by_price_asc():
-    query = load_sql_file("sort_price_asc.sql")
-    products = await database.fetch_all(query=query)
-    return [dict(product) for product in products]
+async def sort_products_by_price_asc(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    return await sorted_products(request, response, "sort_price_asc", "price_asc", limit, cursor)
 
 # Endpoint to get products sorted by price in descending order
 @router.get("/products/sort/price/desc/")
-async def sort_products_by_price_desc():
-    query = load_sql_file("sort_price_desc.sql")
-    products = await database.fetch_all(query=query)
-    return [dict(product) for product in products]
+async def sort_products_by_price_desc(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    return await sorted_products(request, response, "sort_price_desc", "price_desc", limit, cursor)
 
 # Endpoint to get products sorted by popularity (soldAmount) in ascending order
 @router.get("/products/sort/popularity/asc/")
-async def sort_products_by_popularity_asc():
-    query = load_sql_file("sort_popularity_asc.sql")
-    products = await database.fetch_all(query=query)
-    return [dict(product) for product in products]
+async def sort_products_by_popularity_asc(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    return await sorted_products(request, response, "sort_popularity_asc", "popularity_asc", limit, cursor)
 
 # Endpoint to get products sorted by popularity (soldAmount) in descending order
 @router.get("/products/sort/popularity/desc/")
-async def sort_products_by_popularity_desc():
-    query = load_sql_file("sort_popularity_desc.sql")
-    products = await database.fetch_all(query=query)
-    return [dict(product) for product in products]
+async def sort_products_by_popularity_desc(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    return await sorted_products(request, response, "sort_popularity_desc", "popularity_desc", limit, cursor)
@@ -3,16 +3,11 @@ from fastapi import APIRouter, HTTPException
 from fastapi.responses import JSONResponse
 from typing import Optional
 from db import database
-import os
+from sql_registry import statements
 from typing import List
 
 router = APIRouter()
 
-# Helper function to load SQL files
-def load_sql_file(filename: str) -> str:
-    file_path = os.path.join("sql", filename)
-    with open(file_path, "r") as file:
-        return file.read()
 
 class ReviewCreate(BaseModel):
     userid: int
@@ -33,7 +28,7 @@ class ReviewResponse(BaseModel):
 @router.post("/reviews/", response_model=ReviewResponse)
 async def create_review(review: ReviewCreate):
     # Load the SQL query from the file
-    create_review_query = load_sql_file("create_review.sql")
+    create_review_query = statements["create_review"].text
     
     values = {
         "userid": review.userid,
@@ -52,17 +47,15 @@ async def create_review(review: ReviewCreate):
 # Endpoint to retrieve all reviews for a specific product
 @router.get("/products/{productid}/reviews/", response_model=List[ReviewResponse])
 async def get_reviews_for_product(productid: int):
-    query = load_sql_file("get_reviews_for_product.sql")  # Updated SQL file
+    query = statements["get_reviews_for_product"].text  # Updated SQL file
     reviews = await database.fetch_all(query=query, values={"productid": productid})
     return [ReviewResponse(**review) for review in reviews]
 
 
-
-
 @router.put("/reviews/{reviewid}/approve/")
 async def approve_review(reviewid: int):
     # Load the SQL query from the file
-    approve_review_query = load_sql_file("approve_rating.sql")
+    approve_review_query = statements["approve_rating"].text
 
     # Execute the query to approve the rating
     review_record = await database.fetch_one(query=approve_review_query, values={"reviewid": reviewid})
@@ -79,7 +72,7 @@ async def get_average_rating(productid: int):
     Get the average rating for a specific product.
     """
     # Load the SQL query from the file
-    average_rating_query = load_sql_file("average_rating.sql")
+    average_rating_query = statements["average_rating"].text
     
     # Execute the query to calculate the average rating
     result = await database.fetch_one(query=average_rating_query, values={"productid": productid})
@@ -95,7 +88,7 @@ async def get_not_approved_reviews():
     Fetch all reviews that are not approved.
     """
     # Load the SQL query from the file
-    not_approved_reviews_query = load_sql_file("get_not_approved_reviews.sql")
+    not_approved_reviews_query = statements["get_not_approved_reviews"].text
 
     # Execute the query to fetch all not-approved reviews
     reviews = await database.fetch_all(query=not_approved_reviews_query)
@@ -108,7 +101,7 @@ async def delete_review(reviewid: int):
     Delete a review by its ID.
     """
     # Load the SQL query from the file
-    delete_review_query = load_sql_file("delete_review.sql")
+    delete_review_query = statements["delete_review"].text
     
     # Execute the query to delete the review
     result = await database.execute(query=delete_review_query, values={"reviewid": reviewid})
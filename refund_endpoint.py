@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, Response
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from databases import Database
 from db import database
 from refund_process import RefundService
+from idempotency import idempotency
 
 # Pydantic models for requests and responses
 class RefundRequest(BaseModel):
@@ -71,17 +72,21 @@ async def get_refundable_products(orderid: int):
 @router.post("/refund/request")
 async def request_refund(
     refund_request: RefundRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
 ):
     """
     Customer requests a refund for selected products.
 
     Args:
         refund_request (RefundRequest): Contains order ID and selected products for refund.
+        idempotency_key (str, optional): Idempotency-Key header. A retry with the same key
+            and body is answered without inserting the requests again.
 
     Raises:
         HTTPException: If validation fails.
     """
-    try:
+    async def submit_request():
         # Insert the refund request into a "refund_requests" table for manager approval
         async with database.transaction():
             for product in refund_request.products:
@@ -95,6 +100,11 @@ async def request_refund(
                     "quantity": product["quantity"]
                 })
         return {"message": "Refund request submitted and pending manager approval."}
+
+    try:
+        return await idempotency.run("refund_request", idempotency_key, refund_request.model_dump(), submit_request, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
@@ -2,10 +2,13 @@ from databases import Database
 from sqlalchemy.exc import SQLAlchemyError
 from typing import Dict, List
 from datetime import datetime, timedelta
+from stock_events import notify_stock_changes
+from stock_stripes import StockStripes, stock_stripes as default_stock_stripes
 
 class RefundService:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, stripes: StockStripes = default_stock_stripes):
         self.db = db
+        self.stripes = stripes
 
     async def validate_order_for_refund(self, orderid: int) -> Dict:
         """
@@ -75,6 +78,7 @@ class RefundService:
             async with self.db.transaction():
                 # Calculate the total refund amount for the selected products
                 total_refunded_amount = 0.0
+                stock_changes = {}
 
                 for item in product_quantities:
                     productid = item["productid"]
@@ -97,16 +101,23 @@ class RefundService:
                     product_price = product_data["price"]
                     total_refunded_amount += float(product_price) * quantity
 
-                    # Restore stock for refunded items
-                    restore_stock_query = """
-                        UPDATE products
-                        SET stock = stock + :quantity
-                        WHERE productid = :productid
-                    """
-                    await self.db.execute(restore_stock_query, {
-                        "quantity": quantity,
-                        "productid": productid
-                    })
+                    # Restore stock for refunded items, into a stripe for striped products
+                    striped_stock = await self.stripes.restore(productid, quantity)
+                    if striped_stock is not None:
+                        stock_changes[productid] = striped_stock
+                    else:
+                        restore_stock_query = """
+                            UPDATE products
+                            SET stock = stock + :quantity
+                            WHERE productid = :productid
+                            RETURNING stock
+                        """
+                        restored = await self.db.fetch_one(restore_stock_query, {
+                            "quantity": quantity,
+                            "productid": productid
+                        })
+                        if restored:
+                            stock_changes[productid] = restored["stock"]
 
                     # Update order items for refunded quantities
                     update_order_item_query = """
@@ -161,6 +172,7 @@ class RefundService:
                     "orderid": orderid,
                     "refunded_productids": refunded_productids
                 })
+                await notify_stock_changes(self.db, stock_changes)
                 return total_refunded_amount
 
         except SQLAlchemyError as e:
@@ -0,0 +1,257 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from databases import Database
+from db import database
+from stock_events import notify_stock_changes
+
+logger = logging.getLogger(__name__)
+
+# Hold stock for cart items (see ReservingCartStore in cart_store.py). With holds on,
+# products.stock is the stock nobody holds, which is what shoppers see.
+RESERVATIONS_ENABLED = os.getenv("CART_RESERVATIONS", "false").lower() in ("1", "true", "yes")
+# How long a hold lasts after the cart line last changed
+RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+# Seconds between sweeps of expired holds, and holds returned per sweep statement
+RESERVATION_SWEEP_INTERVAL = float(os.getenv("RESERVATION_SWEEP_INTERVAL", "30"))
+RESERVATION_SWEEP_BATCH = 1000
+# Sweep statements per tick; the rest waits for the next tick
+RESERVATION_SWEEP_MAX_BATCHES = 20
+
+# The hold row must exist before it can be locked, so two changes to the same hold
+# queue up behind each other instead of both taking stock
+_ENSURE_HOLD = """
+    INSERT INTO reservations (userid, productid, quantity, expires_at)
+    VALUES (:userid, :productid, 0, now())
+    ON CONFLICT (userid, productid) DO NOTHING
+"""
+
+# Moves the difference between the new and the held quantity between products.stock and
+# the hold, guarded by the stock. Expired holds not yet swept still hold their stock.
+_CHANGE_HOLD = """
+    WITH current AS (
+        SELECT quantity FROM reservations
+        WHERE userid = :userid AND productid = :productid
+        FOR UPDATE
+    ), wanted AS (
+        SELECT
+            GREATEST(COALESCE(CAST(:target AS int), quantity + CAST(:delta AS int)), 0) AS quantity,
+            quantity AS previous
+        FROM current
+    ), taken AS (
+        UPDATE products p
+        SET stock = p.stock - (w.quantity - w.previous)
+        FROM wanted w
+        WHERE p.productid = :productid AND w.quantity <> w.previous AND p.stock >= w.quantity - w.previous
+        RETURNING p.stock
+    ), held AS (
+        -- An unchanged quantity only renews the hold and leaves the product row alone
+        UPDATE reservations r
+        SET quantity = w.quantity, expires_at = now() + CAST(:ttl AS double precision) * interval '1 second'
+        FROM wanted w
+        WHERE r.userid = :userid AND r.productid = :productid
+          AND (w.quantity = w.previous OR EXISTS (SELECT 1 FROM taken))
+        RETURNING r.quantity, r.expires_at
+    )
+    SELECT
+        COALESCE((SELECT stock FROM taken), (SELECT stock FROM products WHERE productid = :productid)) AS stock,
+        (SELECT previous FROM wanted) AS previous,
+        (SELECT quantity FROM held) AS quantity,
+        (SELECT expires_at FROM held) AS expires_at
+"""
+
+# Returns expired holds to stock in batches. Product rows are locked in productid order,
+# like checkout does, so the two cannot deadlock.
+_SWEEP = """
+    WITH expired AS (
+        DELETE FROM reservations
+        WHERE (userid, productid) IN (
+            SELECT userid, productid FROM reservations
+            WHERE expires_at < now()
+            ORDER BY expires_at
+            LIMIT :batch
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING productid, quantity
+    ), returned AS (
+        SELECT productid, SUM(quantity) AS quantity FROM expired GROUP BY productid
+    ), locked AS (
+        SELECT p.productid
+        FROM products p
+        JOIN returned r ON p.productid = r.productid
+        WHERE r.quantity > 0
+        ORDER BY p.productid
+        FOR UPDATE OF p
+    ), updated AS (
+        UPDATE products p
+        SET stock = p.stock + r.quantity
+        FROM returned r
+        WHERE p.productid = r.productid AND p.productid IN (SELECT productid FROM locked)
+        RETURNING p.productid, p.stock
+    )
+    -- Always one row at least, carrying the number of holds removed
+    SELECT u.productid, u.stock, (SELECT count(*) FROM expired) AS swept
+    FROM (SELECT 1) AS one
+    LEFT JOIN updated u ON true
+"""
+
+_CONSUME = """
+    DELETE FROM reservations
+    WHERE userid = :userid AND productid = ANY(:productids)
+    RETURNING productid, quantity
+"""
+
+
+class Hold(NamedTuple):
+    # Stock nobody holds after the change (before it, if it was rejected); None if the
+    # product does not exist
+    stock: Optional[int]
+    # Quantity held before the change
+    previous: int
+    # Quantity held after the change; None if there was not enough stock
+    quantity: Optional[int]
+
+
+class Reservations:
+    """
+    Stock holds for cart lines, kept in the reservations table.
+
+    Holding takes the quantity out of products.stock right away, in one short statement
+    per cart change. Checkout then turns the user's holds into order lines by deleting
+    them; only the difference between what was held and what is ordered still goes
+    through products, so buyers of a hot product no longer queue on its row at checkout.
+    Holds expire RESERVATION_TTL_SECONDS after the last change and are returned to stock
+    by a background sweep.
+
+    An in-memory index of the holds made through this process gives the cart view their
+    expiry times without a query.
+    """
+
+    def __init__(self, db: Database, enabled: bool = RESERVATIONS_ENABLED,
+                 ttl: int = RESERVATION_TTL_SECONDS, sweep_interval: float = RESERVATION_SWEEP_INTERVAL):
+        self.db = db
+        self.enabled = enabled
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._index: Dict[int, Dict[int, Tuple[int, datetime]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    #####################
+    #   LIFECYCLE
+    #####################
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._sweep_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:  # sweep again on the next tick
+                logger.warning(f"Reservation sweep failed: {e}")
+
+    #####################
+    #   HOLDS
+    #####################
+
+    async def hold(self, userid: int, productid: int, quantity: Optional[int] = None, delta: int = 0) -> Hold:
+        """
+        Set the hold to `quantity`, or change it by `delta`, taking or returning the
+        difference from products.stock. Also renews the hold's expiry.
+        """
+        async with self.db.transaction():
+            await self.db.execute(_ENSURE_HOLD, {"userid": userid, "productid": productid})
+            row = await self.db.fetch_one(_CHANGE_HOLD, {
+                "userid": userid,
+                "productid": productid,
+                "target": quantity,
+                "delta": delta,
+                "ttl": self.ttl,
+            })
+            if row["quantity"] is not None and row["quantity"] != row["previous"]:
+                await notify_stock_changes(self.db, {productid: row["stock"]})
+        if row["quantity"] is not None:
+            self._remember(userid, productid, row["quantity"], row["expires_at"])
+        return Hold(row["stock"], row["previous"] or 0, row["quantity"])
+
+    async def release(self, userid: int, productids: Iterable[int]) -> None:
+        for productid in productids:
+            await self.hold(userid, productid, quantity=0)
+
+    async def consume(self, userid: int, productids: Iterable[int]) -> Dict[int, int]:
+        """
+        Remove the user's holds on `productids` and return {productid: quantity held}.
+        Call it in the checkout transaction: the held stock becomes the order's.
+        """
+        rows = await self.db.fetch_all(_CONSUME, {"userid": userid, "productids": list(productids)})
+        held = {row["productid"]: row["quantity"] for row in rows}
+        for productid in held:
+            self._forget(userid, productid)
+        return held
+
+    async def sweep(self) -> int:
+        """
+        Return expired holds to stock. Returns the number of holds removed.
+        """
+        swept = 0
+        for _ in range(RESERVATION_SWEEP_MAX_BATCHES):
+            async with self.db.transaction():
+                rows = await self.db.fetch_all(_SWEEP, {"batch": RESERVATION_SWEEP_BATCH})
+                await notify_stock_changes(self.db, {row["productid"]: row["stock"] for row in rows if row["productid"] is not None})
+            batch = rows[0]["swept"]
+            swept += batch
+            if batch < RESERVATION_SWEEP_BATCH:
+                break
+        self._drop_expired()
+        if swept:
+            logger.info(f"Returned {swept} expired stock holds")
+        return swept
+
+    #####################
+    #   INDEX
+    #####################
+
+    def _remember(self, userid: int, productid: int, quantity: int, expires_at: datetime) -> None:
+        if quantity:
+            self._index.setdefault(userid, {})[productid] = (quantity, expires_at)
+        else:
+            self._forget(userid, productid)
+
+    def _forget(self, userid: int, productid: int) -> None:
+        holds = self._index.get(userid)
+        if holds is not None:
+            holds.pop(productid, None)
+            if not holds:
+                del self._index[userid]
+
+    def _drop_expired(self) -> None:
+        now = datetime.now(timezone.utc)
+        for userid in list(self._index):
+            for productid, (_, expires_at) in list(self._index[userid].items()):
+                if expires_at <= now:
+                    self._forget(userid, productid)
+
+    def holds(self, userid: int) -> Dict[int, Tuple[int, datetime]]:
+        """
+        {productid: (quantity, expires_at)} for the user's holds made through this process.
+        """
+        return dict(self._index.get(userid, {}))
+
+
+# Shared reservations, used by the cart store and checkout; swept in the background
+# (started in the lifespan hook in main.py)
+reservations = Reservations(database)
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException,Query
+from fastapi import APIRouter, HTTPException,Query, Request
 from pydantic import BaseModel, Field
 from typing import List,Dict,Any
 from db import database
-from mailing_service import MailingService
+from catalog_cache import catalog
+from streaming import wants_ndjson, stream_query
+from background_jobs import enqueue_email
 from datetime import datetime
 import os
 from fastapi.responses import FileResponse
@@ -11,9 +13,8 @@ from refund_endpoint import RefundRequest, RefundDecision ,RefundResponse
 from matplotlib import pyplot as plt
 from fastapi.responses import FileResponse
 
-# Initialize router and mailing service
+# Initialize router
 router = APIRouter()
-mailing_service = MailingService()
 
 # Pydantic models for request validation
 class PriceUpdate(BaseModel):
@@ -59,6 +60,7 @@ async def set_price(update: PriceUpdate):
         """
         values = {"productid": update.productid, "new_price": update.new_price, "new_cost": new_cost}
         await database.execute(query, values)
+        await catalog.refresh_product(update.productid)
 
         return {"message": "Price and cost updated successfully", "new_price": update.new_price, "new_cost": new_cost}
     except Exception as e:
@@ -89,6 +91,7 @@ async def set_discounts_and_notify(updates: List[DiscountUpdate]):
                 await database.execute(update_query, {"productid": update.productid, "discount_price": calculated_discount_price})
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+            await catalog.refresh_product(update.productid)
 
         product_ids = [update.productid for update in updates]
         if not product_ids:
@@ -122,13 +125,15 @@ async def set_cost(update: CostUpdate):
     query = "UPDATE products SET cost = :new_cost WHERE productid = :productid"
     values = {"productid": update.productid, "new_cost": update.new_cost}
     await database.execute(query, values)
+    await catalog.refresh_product(update.productid)
     return {"message": "Cost updated successfully"}
 
 # Get profit/loss report considering discount
 @router.get("/profit_loss_report", response_model=List[ProfitLossReport])
-async def get_profit_loss_report():
+async def get_profit_loss_report(request: Request):
     """
     Calculates profit or loss for each product, considering discounts if applicable.
+    Streams one product per line with Accept: application/x-ndjson.
     """
     query = """
         SELECT 
@@ -141,6 +146,8 @@ async def get_profit_loss_report():
         FROM products
         GROUP BY productid
     """
+    if wants_ndjson(request):
+        return stream_query(database, query)
     rows = await database.fetch_all(query)
     return [{"productid": row["productid"], "profit_loss": row["profit_loss"]} for row in rows]
 
@@ -255,15 +262,18 @@ async def generate_profit_loss_chart_image(
 
 
 @router.get("/refunds/pending", response_model=List[Dict[str, int]])
-async def view_pending_refunds():
+async def view_pending_refunds(request: Request):
     """
     View all pending refund requests.
+    Streams one request per line with Accept: application/x-ndjson.
     """
     try:
         query = """
             SELECT orderid, productid, quantity
             FROM refund_requests
         """
+        if wants_ndjson(request):
+            return stream_query(database, query)
         refunds = await database.fetch_all(query)
         return [dict(refund) for refund in refunds]
     except Exception as e:
@@ -314,10 +324,7 @@ async def manager_decision(decision: RefundDecision):
             # Convert to a list of dictionaries
             product_quantities = [dict(product) for product in product_quantities]
 
-            # Process the refund
-            refunded_amount = await refund_service.process_refund(decision.orderid, product_quantities)
-
-            # Notify the customer via email
+            # Look up the customer to notify before touching the refund
             user_info = await database.fetch_one(
                 "SELECT name, email FROM users WHERE userid = (SELECT userid FROM orders WHERE orderid = :orderid)",
                 {"orderid": decision.orderid},
@@ -325,105 +332,111 @@ async def manager_decision(decision: RefundDecision):
             if not user_info:
                 raise HTTPException(status_code=404, detail="User not found")
 
-            email_subject = f"Refund Processed for Order #{decision.orderid}"
-
-            email_body = f"""
-            <html>
-            <head>
-                <style>
-                    body {{
-                        font-family: Arial, sans-serif;
-                        line-height: 1.6;
-                        background-color: #f9f9f9;
-                        margin: 0;
-                        padding: 20px;
-                    }}
-                    .container {{
-                        max-width: 600px;
-                        margin: 20px auto;
-                        padding: 20px;
-                        background-color: #ffffff;
-                        border: 1px solid #ddd;
-                        border-radius: 8px;
-                        box-shadow: 0 4px 8px rgba(0, 0, 0, 0.1);
-                    }}
-                    .header {{
-                        text-align: center;
-                        margin-bottom: 20px;
-                    }}
-                    .header h1 {{
-                        font-size: 24px;
-                        color: #4CAF50;
-                    }}
-                    .content p {{
-                        margin: 10px 0;
-                        color: #555;
-                    }}
-                    .content ul {{
-                        padding-left: 20px;
-                    }}
-                    .content ul li {{
-                        margin-bottom: 10px;
-                    }}
-                    .footer {{
-                        text-align: center;
-                        margin-top: 20px;
-                        font-size: 12px;
-                        color: #999;
-                    }}
-                    .button {{
-                        display: inline-block;
-                        padding: 10px 20px;
-                        margin: 20px 0;
-                        color: #ffffff;
-                        background-color: #4CAF50;
-                        text-decoration: none;
-                        border-radius: 5px;
-                    }}
-                    .button:hover {{
-                        background-color: #45a049;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <!-- Header Section -->
-                    <div class="header">
-                        <h1>Refund Confirmation</h1>
+            # The email job commits or rolls back with the refund (see job_queue.py)
+            async with database.transaction():
+                # Process the refund
+                refunded_amount = await refund_service.process_refund(decision.orderid, product_quantities)
+
+                email_subject = f"Refund Processed for Order #{decision.orderid}"
+
+                email_body = f"""
+                <html>
+                <head>
+                    <style>
+                        body {{
+                            font-family: Arial, sans-serif;
+                            line-height: 1.6;
+                            background-color: #f9f9f9;
+                            margin: 0;
+                            padding: 20px;
+                        }}
+                        .container {{
+                            max-width: 600px;
+                            margin: 20px auto;
+                            padding: 20px;
+                            background-color: #ffffff;
+                            border: 1px solid #ddd;
+                            border-radius: 8px;
+                            box-shadow: 0 4px 8px rgba(0, 0, 0, 0.1);
+                        }}
+                        .header {{
+                            text-align: center;
+                            margin-bottom: 20px;
+                        }}
+                        .header h1 {{
+                            font-size: 24px;
+                            color: #4CAF50;
+                        }}
+                        .content p {{
+                            margin: 10px 0;
+                            color: #555;
+                        }}
+                        .content ul {{
+                            padding-left: 20px;
+                        }}
+                        .content ul li {{
+                            margin-bottom: 10px;
+                        }}
+                        .footer {{
+                            text-align: center;
+                            margin-top: 20px;
+                            font-size: 12px;
+                            color: #999;
+                        }}
+                        .button {{
+                            display: inline-block;
+                            padding: 10px 20px;
+                            margin: 20px 0;
+                            color: #ffffff;
+                            background-color: #4CAF50;
+                            text-decoration: none;
+                            border-radius: 5px;
+                        }}
+                        .button:hover {{
+                            background-color: #45a049;
+                        }}
+                    </style>
+                </head>
+                <body>
+                    <div class="container">
+                        <!-- Header Section -->
+                        <div class="header">
+                            <h1>Refund Confirmation</h1>
+                        </div>
+
+                        <!-- Content Section -->
+                        <div class="content">
+                            <p>Dear <strong>{user_info['name']}</strong>,</p>
+
+                            <p>We are pleased to inform you that your refund request for <strong>Order #{decision.orderid}</strong> has been successfully approved. Below are the details of your refund:</p>
+
+                            <ul>
+                                <li><strong>Order Number:</strong> #{decision.orderid}</li>
+                                <li><strong>Refunded Amount:</strong> ${refunded_amount:.2f}</li>
+                                <li><strong>Refund Processed Date:</strong> {datetime.now().strftime('%Y-%m-%d')}</li>
+                            </ul>
+
+                            <p>The refunded amount has been credited to the original payment method you used at the time of purchase. Please allow 3–5 business days for the amount to reflect in your account, depending on your financial institution's processing time.</p>
+
+                            <p>If you have any questions regarding your refund, feel free to contact our support team. We are always happy to assist you!</p>
+
+                            <!-- Call to Action Button -->
+                            <a href="https://yourstore.example.com/support" class="button">Contact Support</a>
+                        </div>
+
+                        <!-- Footer Section -->
+                        <div class="footer">
+                            <p>Thank you for shopping with us!</p>
+                            <p><em>Your Store Team</em></p>
+                            <p>For more information, visit our <a href="https://yourstore.example.com">website</a>.</p>
+                        </div>
                     </div>
+                </body>
+                </html>
+                """
 
-                    <!-- Content Section -->
-                    <div class="content">
-                        <p>Dear <strong>{user_info['name']}</strong>,</p>
-
-                        <p>We are pleased to inform you that your refund request for <strong>Order #{decision.orderid}</strong> has been successfully approved. Below are the details of your refund:</p>
-
-                        <ul>
-                            <li><strong>Order Number:</strong> #{decision.orderid}</li>
-                            <li><strong>Refunded Amount:</strong> ${refunded_amount:.2f}</li>
-                            <li><strong>Refund Processed Date:</strong> {datetime.now().strftime('%Y-%m-%d')}</li>
-                        </ul>
-
-                        <p>The refunded amount has been credited to the original payment method you used at the time of purchase. Please allow 3–5 business days for the amount to reflect in your account, depending on your financial institution's processing time.</p>
-
-                        <p>If you have any questions regarding your refund, feel free to contact our support team. We are always happy to assist you!</p>
-
-                        <!-- Call to Action Button -->
-                        <a href="https://yourstore.example.com/support" class="button">Contact Support</a>
-                    </div>
-
-                    <!-- Footer Section -->
-                    <div class="footer">
-                        <p>Thank you for shopping with us!</p>
-                        <p><em>Your Store Team</em></p>
-                        <p>For more information, visit our <a href="https://yourstore.example.com">website</a>.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-
-            mailing_service.send_email(user_info["email"], email_subject, email_body)
+                # Sent by a background worker (see background_jobs.py)
+                await enqueue_email(user_info["email"], email_subject, email_body)
 
             return RefundResponse(
                 orderid=decision.orderid,
@@ -431,10 +444,7 @@ async def manager_decision(decision: RefundDecision):
                 status="Refunded",
             )
         else:
-            # Deny refund logic
-            await refund_service.deny_refund(decision.orderid)
-
-            # Notify the customer about the denial
+            # Look up the customer to notify about the denial
             user_info = await database.fetch_one(
                 "SELECT name, email FROM users WHERE userid = (SELECT userid FROM orders WHERE orderid = :orderid)",
                 {"orderid": decision.orderid},
@@ -442,100 +452,106 @@ async def manager_decision(decision: RefundDecision):
             if not user_info:
                 raise HTTPException(status_code=404, detail="User not found")
 
-            email_subject = f"Refund Processed for Order {decision.orderid}"
-            email_body = f"""
-            <!DOCTYPE html>
-            <html lang="en">
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>Refund Processed</title>
-                <style>
-                    body {{
-                        font-family: Arial, sans-serif;
-                        margin: 0;
-                        padding: 20px;
-                        background-color: #f9f9f9;
-                        color: #333;
-                    }}
-                    .container {{
-                        max-width: 600px;
-                        margin: 20px auto;
-                        background: #ffffff;
-                        padding: 20px;
-                        border-radius: 8px;
-                        box-shadow: 0 4px 8px rgba(0, 0, 0, 0.1);
-                    }}
-                    .header {{
-                        text-align: center;
-                        padding: 10px 0;
-                        border-bottom: 2px solid #4CAF50;
-                    }}
-                    .header h1 {{
-                        margin: 0;
-                        font-size: 24px;
-                        color: #4CAF50;
-                    }}
-                    .content {{
-                        margin: 20px 0;
-                    }}
-                    .content p {{
-                        margin: 8px 0;
-                        line-height: 1.6;
-                    }}
-                    .table {{
-                        width: 100%;
-                        border-collapse: collapse;
-                        margin: 20px 0;
-                    }}
-                    .table th, .table td {{
-                        border: 1px solid #ddd;
-                        padding: 10px;
-                        text-align: left;
-                    }}
-                    .table th {{
-                        background-color: #f2f2f2;
-                    }}
-                    .footer {{
-                        text-align: center;
-                        margin-top: 20px;
-                        font-size: 14px;
-                        color: #777;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>Refund Confirmation</h1>
+            # The email job commits or rolls back with the refund (see job_queue.py)
+            async with database.transaction():
+                # Deny refund logic
+                await refund_service.deny_refund(decision.orderid)
+
+                email_subject = f"Refund Processed for Order {decision.orderid}"
+                email_body = f"""
+                <!DOCTYPE html>
+                <html lang="en">
+                <head>
+                    <meta charset="UTF-8">
+                    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+                    <title>Refund Processed</title>
+                    <style>
+                        body {{
+                            font-family: Arial, sans-serif;
+                            margin: 0;
+                            padding: 20px;
+                            background-color: #f9f9f9;
+                            color: #333;
+                        }}
+                        .container {{
+                            max-width: 600px;
+                            margin: 20px auto;
+                            background: #ffffff;
+                            padding: 20px;
+                            border-radius: 8px;
+                            box-shadow: 0 4px 8px rgba(0, 0, 0, 0.1);
+                        }}
+                        .header {{
+                            text-align: center;
+                            padding: 10px 0;
+                            border-bottom: 2px solid #4CAF50;
+                        }}
+                        .header h1 {{
+                            margin: 0;
+                            font-size: 24px;
+                            color: #4CAF50;
+                        }}
+                        .content {{
+                            margin: 20px 0;
+                        }}
+                        .content p {{
+                            margin: 8px 0;
+                            line-height: 1.6;
+                        }}
+                        .table {{
+                            width: 100%;
+                            border-collapse: collapse;
+                            margin: 20px 0;
+                        }}
+                        .table th, .table td {{
+                            border: 1px solid #ddd;
+                            padding: 10px;
+                            text-align: left;
+                        }}
+                        .table th {{
+                            background-color: #f2f2f2;
+                        }}
+                        .footer {{
+                            text-align: center;
+                            margin-top: 20px;
+                            font-size: 14px;
+                            color: #777;
+                        }}
+                    </style>
+                </head>
+                <body>
+                    <div class="container">
+                        <div class="header">
+                            <h1>Refund Confirmation</h1>
+                        </div>
+                        <div class="content">
+                            <p>Dear <strong>{user_name}</strong>,</p>
+                            <p>Your refund request for <strong>Order #{decision.orderid}</strong> has been successfully processed. Here are the details of the refund:</p>
+                            <table class="table">
+                                <thead>
+                                    <tr>
+                                        <th>Item</th>
+                                        <th>Quantity</th>
+                                        <th>Refunded Price</th>
+                                    </tr>
+                                </thead>
+                                <tbody>
+                                    {''.join(f"<tr><td>{product['productname']}</td><td>{product['quantity']}</td><td>${product['price']:.2f}</td></tr>" for product in products)}
+                                </tbody>
+                            </table>
+                            <p><strong>Total Refunded Amount:</strong> ${refunded_amount:.2f}</p>
+                            <p>Refunded to your account: <strong>{email}</strong></p>
+                        </div>
+                        <div class="footer">
+                            <p>Thank you for shopping with us!</p>
+                            <p><em>Your Store Team</em></p>
+                        </div>
                     </div>
-                    <div class="content">
-                        <p>Dear <strong>{user_name}</strong>,</p>
-                        <p>Your refund request for <strong>Order #{decision.orderid}</strong> has been successfully processed. Here are the details of the refund:</p>
-                        <table class="table">
-                            <thead>
-                                <tr>
-                                    <th>Item</th>
-                                    <th>Quantity</th>
-                                    <th>Refunded Price</th>
-                                </tr>
-                            </thead>
-                            <tbody>
-                                {''.join(f"<tr><td>{product['productname']}</td><td>{product['quantity']}</td><td>${product['price']:.2f}</td></tr>" for product in products)}
-                            </tbody>
-                        </table>
-                        <p><strong>Total Refunded Amount:</strong> ${refunded_amount:.2f}</p>
-                        <p>Refunded to your account: <strong>{email}</strong></p>
-                    </div>
-                    <div class="footer">
-                        <p>Thank you for shopping with us!</p>
-                        <p><em>Your Store Team</em></p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            mailing_service.send_email(user_info["email"], email_subject, email_body)
+                </body>
+                </html>
+                """
+                # Sent by a background worker (see background_jobs.py)
+                await enqueue_email(user_info["email"], email_subject, email_body)
 
             return RefundResponse(
                 orderid=decision.orderid,
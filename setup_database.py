@@ -20,6 +20,12 @@ async def setup_database() -> None:
     conn: Connection = await asyncpg.connect(DATABASE_URL)  # Ensure `conn` is of type Connection
     
     await run_sql_file('sql/create_card_table.sql', conn)
+    await run_sql_file('sql/create_cart_index.sql', conn)
+    await run_sql_file('sql/create_order_indexes.sql', conn)
+    await run_sql_file('sql/create_jobs_table.sql', conn)
+    await run_sql_file('sql/create_idempotency_keys_table.sql', conn)
+    await run_sql_file('sql/create_reservations_table.sql', conn)
+    await run_sql_file('sql/create_stock_stripes_table.sql', conn)
     await run_sql_file('sql/insert_sample_data.sql', conn)
     await conn.close()  # Close the database connection
 
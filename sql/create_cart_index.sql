@@ -0,0 +1,19 @@
+-- One cart row per (user, product), required by the ON CONFLICT upserts in cart_endpoints.py.
+-- Merge any duplicate rows left by the old check-then-insert code before creating the index.
+WITH merged AS (
+    SELECT MIN(id) AS id, userid, productid, SUM(quantity) AS quantity
+    FROM cart
+    GROUP BY userid, productid
+    HAVING COUNT(*) > 1
+), kept AS (
+    UPDATE cart c
+    SET quantity = m.quantity
+    FROM merged m
+    WHERE c.id = m.id
+    RETURNING c.id, c.userid, c.productid
+)
+DELETE FROM cart c
+USING kept k
+WHERE c.userid = k.userid AND c.productid = k.productid AND c.id <> k.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS cart_userid_productid_key ON cart (userid, productid);
@@ -0,0 +1,15 @@
+-- Responses of requests sent with an Idempotency-Key header (see idempotency.py). A row is
+-- written in the same transaction as the request's own changes, so it exists if and only
+-- if they committed.
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    scope       TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    response    JSONB NOT NULL,
+    created_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (scope, key)
+);
+
+-- Keys are honoured for IDEMPOTENCY_TTL_HOURS; IdempotencyStore.sweep() deletes older rows
+-- in batches, and a request reusing an expired key overwrites its row
+CREATE INDEX IF NOT EXISTS idempotency_keys_created_at_idx ON idempotency_keys (created_at);
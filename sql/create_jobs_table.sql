@@ -0,0 +1,26 @@
+-- Background jobs (see job_queue.py). Jobs are inserted in the same transaction as the
+-- change they follow up on, so a job exists if and only if that change committed.
+CREATE TABLE IF NOT EXISTS jobs (
+    id           BIGSERIAL PRIMARY KEY,
+    kind         TEXT NOT NULL,
+    -- Optional business key, e.g. order:42; at most one job per (kind, ref)
+    ref          TEXT,
+    payload      JSONB NOT NULL DEFAULT '{}',
+    status       TEXT NOT NULL DEFAULT 'queued'
+                 CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    attempts     INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    run_at       TIMESTAMPTZ NOT NULL DEFAULT now(),
+    locked_at    TIMESTAMPTZ,
+    locked_by    TEXT,
+    last_error   TEXT,
+    result       JSONB,
+    created_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+    finished_at  TIMESTAMPTZ
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_kind_ref_key ON jobs (kind, ref) WHERE ref IS NOT NULL;
+
+-- Claim scans: due jobs per kind, and running jobs whose worker went away
+CREATE INDEX IF NOT EXISTS jobs_queued_idx ON jobs (kind, run_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS jobs_running_idx ON jobs (kind, locked_at) WHERE status = 'running';
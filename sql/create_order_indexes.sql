@@ -0,0 +1,10 @@
+-- Backs the order history (OrderService.get_orders_for_user / get_order_page): a user's
+-- orders newest first, keyset-paginated on (orderdate, orderid). Scanned backwards for DESC.
+CREATE INDEX IF NOT EXISTS idx_orders_userid_orderdate
+    ON orders (userid, orderdate, orderid);
+
+-- Backs the product manager's processing-orders view: only orders still waiting to ship,
+-- oldest first, so the index stays small however many orders have been delivered.
+CREATE INDEX IF NOT EXISTS idx_orders_processing_orderdate
+    ON orders (orderdate, orderid)
+    WHERE status = 'processing';
@@ -0,0 +1,18 @@
+-- Indexes backing keyset pagination on the product listing and sort endpoints.
+-- A btree on (sortkey, productID) serves both ASC and DESC (scanned backwards).
+CREATE INDEX IF NOT EXISTS idx_products_price_productid
+    ON products (price, productID);
+
+CREATE INDEX IF NOT EXISTS idx_products_soldamount_productid
+    ON products (soldamount, productID);
+
+-- Indexes for the faceted /products/query endpoint: category + sort order,
+-- and the effective price (discountPrice when set) used by price-range filters.
+CREATE INDEX IF NOT EXISTS idx_products_category_price
+    ON products (categoryID, price, productID);
+
+CREATE INDEX IF NOT EXISTS idx_products_category_soldamount
+    ON products (categoryID, soldamount, productID);
+
+CREATE INDEX IF NOT EXISTS idx_products_effective_price
+    ON products ((COALESCE(discountPrice, price)));
@@ -0,0 +1,12 @@
+-- Full-text search document for products.
+-- productName/productModel are weighted 'A' and description 'B', so a query can
+-- target a single field with a weight label (e.g. 'mouse:*A').
+CREATE OR REPLACE FUNCTION product_search_vector(name TEXT, model TEXT, description TEXT)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('english', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(model, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE INDEX IF NOT EXISTS idx_products_search_vector
+    ON products USING GIN (product_search_vector(productName, productModel, description));
@@ -0,0 +1,5 @@
+-- Trigram index for typo-tolerant product name lookup (similarity search).
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_products_name_trgm
+    ON products USING GIN ((productName || ' ' || productModel) gin_trgm_ops);
@@ -0,0 +1,12 @@
+-- Stock held for carts (see reservations.py). A hold's quantity has already been taken
+-- out of products.stock; checkout turns it into order lines, the sweeper returns it
+-- once expired.
+CREATE TABLE IF NOT EXISTS reservations (
+    userid     INT NOT NULL,
+    productid  INT NOT NULL,
+    quantity   INT NOT NULL DEFAULT 0 CHECK (quantity >= 0),
+    expires_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (userid, productid)
+);
+
+CREATE INDEX IF NOT EXISTS reservations_expires_at_idx ON reservations (expires_at);
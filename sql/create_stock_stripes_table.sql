@@ -0,0 +1,8 @@
+-- Stock of hot products split across buckets (see stock_stripes.py). While a product has
+-- rows here they hold its stock, and products.stock is a copy rolled up from their sum.
+CREATE TABLE IF NOT EXISTS stock_stripes (
+    productid INT NOT NULL,
+    stripe    INT NOT NULL,
+    stock     INT NOT NULL DEFAULT 0 CHECK (stock >= 0),
+    PRIMARY KEY (productid, stripe)
+);
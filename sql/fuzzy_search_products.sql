@@ -0,0 +1,6 @@
+SELECT p.*,
+       similarity(p.productName || ' ' || p.productModel, :q) AS similarity
+FROM products p
+WHERE (p.productName || ' ' || p.productModel) % :q
+ORDER BY similarity DESC, p.productID
+LIMIT :limit;
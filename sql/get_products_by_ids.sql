@@ -0,0 +1,3 @@
+SELECT *
+FROM products
+WHERE productID = ANY(:ids);
@@ -1,3 +0,0 @@
-SELECT * 
-FROM products
-WHERE description ILIKE '%' || :description || '%';
\ No newline at end of file
@@ -1,3 +0,0 @@
-SELECT * 
-FROM products
-WHERE productName ILIKE '%' || :productName || '%';
\ No newline at end of file
@@ -0,0 +1,6 @@
+SELECT p.*,
+       ts_rank(product_search_vector(p.productName, p.productModel, p.description), query) AS rank
+FROM products p, to_tsquery('english', :tsquery) query
+WHERE product_search_vector(p.productName, p.productModel, p.description) @@ query
+ORDER BY rank DESC, p.productID
+LIMIT :limit OFFSET :offset;
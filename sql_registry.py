@@ -0,0 +1,142 @@
+import os
+import re
+import logging
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, Mapping, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+SQL_DIR = "sql"
+
+# Statements starting with one of these keywords are plain DML and can be prepared.
+# Everything else (CREATE TABLE, triggers, seed scripts, ...) is only loaded.
+DML_KEYWORDS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+@dataclass(frozen=True)
+class SqlStatement:
+    """
+    An immutable, validated SQL statement loaded from the sql/ folder.
+    """
+    name: str
+    text: str
+    params: FrozenSet[str]
+
+    @property
+    def is_dml(self) -> bool:
+        # Skip leading "-- comment" lines before looking at the first keyword
+        lines = [line for line in self.text.splitlines() if not line.strip().startswith("--")]
+        body = " ".join(lines).strip().upper()
+        return body.startswith(DML_KEYWORDS)
+
+    def __str__(self) -> str:
+        return self.text
+
+
+class SqlRegistry:
+    """
+    Loads every *.sql file once and hands out SqlStatement objects by name.
+
+    Endpoints used to open and read their SQL file on every request; the registry
+    does that a single time at startup (see the lifespan hook in main.py).
+    """
+
+    def __init__(self, directory: str = SQL_DIR):
+        self.directory = directory
+        self._statements: Mapping[str, SqlStatement] = MappingProxyType({})
+        self._loaded = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self) -> None:
+        """
+        Read and validate all SQL files in the directory.
+
+        Raises:
+            ValueError: If a file is empty or cannot be parsed into a statement.
+        """
+        statements: Dict[str, SqlStatement] = {}
+        for file_name in sorted(os.listdir(self.directory)):
+            if not file_name.endswith(".sql"):
+                continue
+            name = file_name[: -len(".sql")]
+            with open(os.path.join(self.directory, file_name), "r") as file:
+                sql = file.read()
+            statements[name] = self._validate(name, sql)
+
+        self._statements = MappingProxyType(statements)
+        self._loaded = True
+        logger.info(f"Loaded {len(statements)} SQL statements from {self.directory}/")
+
+    @staticmethod
+    def _validate(name: str, sql: str) -> SqlStatement:
+        if not sql.strip():
+            raise ValueError(f"SQL file '{name}.sql' is empty")
+        try:
+            # Same bind-parameter parser the databases package uses for :name params
+            params = frozenset(text(sql).compile().params)
+        except Exception as e:
+            raise ValueError(f"SQL file '{name}.sql' could not be parsed: {str(e)}")
+        return SqlStatement(name=name, text=sql, params=params)
+
+    def get(self, name: str) -> SqlStatement:
+        """
+        Return the statement for `name` (file name with or without the .sql suffix).
+        """
+        if not self._loaded:
+            # Fallback for code paths that run without the app lifespan (scripts, tests)
+            self.load()
+        if name.endswith(".sql"):
+            name = name[: -len(".sql")]
+        try:
+            return self._statements[name]
+        except KeyError:
+            raise KeyError(f"Unknown SQL statement: {name}")
+
+    def __getitem__(self, name: str) -> SqlStatement:
+        return self.get(name)
+
+    def __iter__(self):
+        return iter(self._statements.values())
+
+    async def prepare(self, database, names: Optional[Iterable[str]] = None) -> int:
+        """
+        Prepared-statement mode: prepare every DML statement on an asyncpg connection.
+
+        asyncpg already keeps a per-connection cache of prepared statements keyed by
+        query text, so this mainly makes a schema mismatch fail at startup instead of
+        on the first request that hits the broken statement.
+
+        Returns:
+            int: Number of statements prepared.
+        """
+        selected = [self.get(name) for name in names] if names else [s for s in self if s.is_dml]
+        prepared = 0
+        async with database.connection() as connection:
+            raw_connection = connection.raw_connection
+            for statement in selected:
+                compiled = text(statement.text).compile()
+                # Mirror the positional $n numbering the databases backend uses
+                mapping = {key: f"${i}" for i, key in enumerate(sorted(compiled.params), start=1)}
+                query = re.sub(r"(?<![:\w]):(\w+)", lambda m: mapping.get(m.group(1), m.group(0)), statement.text)
+                try:
+                    await raw_connection.prepare(query)
+                except Exception as e:
+                    logger.warning(f"SQL statement '{statement.name}' failed to prepare: {str(e)}")
+                    continue
+                prepared += 1
+        logger.info(f"Prepared {prepared} SQL statements")
+        return prepared
+
+
+def prepared_statements_enabled() -> bool:
+    return os.getenv("SQL_PREPARED_STATEMENTS", "false").lower() in ("1", "true", "yes")
+
+
+# Shared registry instance used by all routers
+statements = SqlRegistry()
@@ -1,7 +1,19 @@
-from fastapi import FastAPI, HTTPException,APIRouter
+import json
+from fastapi import FastAPI, HTTPException,APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from databases import Database
+from typing import Dict, List
 from db import database
+from sql_registry import statements
+from catalog_cache import catalog
+from stock_events import stock_listener
+from stock_stripes import stock_stripes
+
+# Most products accepted by one availability request or stream subscription
+MAX_STOCK_PRODUCTS = 500
+# Seconds between keep-alive comments on an idle stock stream
+STREAM_HEARTBEAT = 15
 
 # Create APIRouter instance for user-related endpoints
 router = APIRouter()
@@ -18,16 +30,11 @@ class Product(BaseModel):
     stock: int
     categoryid: int
 
-# Load SQL from file function
-def load_sql_file(filename: str) -> str:
-    with open(filename, 'r') as file:
-        return file.read()
-
 
 #API endpoint to get information about the selected products' stock.
 @router.get("/products/{productID}")
 async def get_stock(productID: int):
-    sql_query = load_sql_file('sql/find_product.sql')
+    sql_query = statements["find_product"].text
     product = await database.fetch_one(query=sql_query, values={"productID": productID})
     if product:
         product = Product(**dict(product))
@@ -39,4 +46,74 @@ async def get_stock(productID: int):
         return message
     else:
         raise HTTPException(status_code=400, detail="Selected product cannot be found.")
-        
\ No newline at end of file
+
+
+async def stock_levels(productids: List[int]) -> Dict[int, int]:
+    """
+    Current stock for each known product ID, from the catalog snapshot when it is loaded
+    (kept current by stock notifications), otherwise from products and the stock stripes.
+    """
+    if await catalog.ready():
+        levels = {}
+        for productid in productids:
+            product = catalog.get(productid)
+            if product:
+                levels[productid] = product["stock"]
+        return levels
+    query = "SELECT productid, stock FROM products WHERE productid = ANY(:ids)"
+    rows = await database.fetch_all(query=query, values={"ids": list(productids)})
+    levels = {row["productid"]: row["stock"] for row in rows}
+    # products.stock of a striped product trails its stripes by up to a rollup interval
+    if stock_stripes.enabled:
+        levels.update(await stock_stripes.totals(levels))
+    return levels
+
+
+def stock_entries(levels: Dict[int, int], productids: List[int]) -> List[Dict]:
+    return [
+        {"productid": productid, "stock": levels[productid], "available": levels[productid] > 0}
+        for productid in productids
+        if productid in levels
+    ]
+
+
+#API endpoint to get the stock of many products at once (e.g. a product grid or cart).
+@router.get("/stock")
+async def get_stock_levels(productids: List[int] = Query(..., max_length=MAX_STOCK_PRODUCTS)):
+    productids = list(dict.fromkeys(productids))
+    return stock_entries(await stock_levels(productids), productids)
+
+
+#Server-Sent Events stream of stock changes for the subscribed products.
+#The first event holds the current levels; later events only the products that changed.
+@router.get("/stock/stream")
+async def stream_stock_levels(request: Request, productids: List[int] = Query(..., max_length=MAX_STOCK_PRODUCTS)):
+    if not stock_listener.running:
+        raise HTTPException(status_code=503, detail="Live stock updates are not available.")
+    productids = list(dict.fromkeys(productids))
+    # Subscribe before reading the current levels so no change falls in between
+    subscription = stock_listener.subscribe(productids)
+
+    async def events(levels):
+        try:
+            yield f"event: stock\ndata: {json.dumps(stock_entries(levels, productids))}\n\n"
+            while not await request.is_disconnected():
+                changes = await subscription.next(timeout=STREAM_HEARTBEAT)
+                if changes:
+                    yield f"event: stock\ndata: {json.dumps(stock_entries(changes, list(changes)))}\n\n"
+                else:
+                    yield ": keep-alive\n\n"
+        finally:
+            stock_listener.unsubscribe(subscription)
+
+    # Until the stream starts, its finally block cannot clean up the subscription
+    try:
+        levels = await stock_levels(productids)
+        return StreamingResponse(
+            events(levels),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    except BaseException:
+        stock_listener.unsubscribe(subscription)
+        raise
@@ -0,0 +1,154 @@
+import json
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Set
+
+import asyncpg
+from databases import Database
+from db import database
+from catalog_cache import CatalogCache, catalog as default_catalog
+
+logger = logging.getLogger(__name__)
+
+STOCK_CHANNEL = "stock_changed"
+# pg_notify payloads are limited to 8000 bytes; a {"productid":stock} entry is ~15 bytes
+NOTIFY_BATCH = 200
+# Seconds between attempts to re-open a dropped LISTEN connection
+RECONNECT_DELAY = 5
+
+
+def uses_postgres(db: Database) -> bool:
+    return db.url.dialect == "postgresql"
+
+
+async def notify_stock_changes(db: Database, changes: Dict[int, int]) -> None:
+    """
+    Publish new stock levels ({productid: stock}) on the stock_changed channel.
+
+    Call this inside the transaction that changed the stock: Postgres only delivers the
+    notification if that transaction commits. A no-op on other databases.
+    """
+    if not changes or not uses_postgres(db):
+        return
+    items = list(changes.items())
+    for start in range(0, len(items), NOTIFY_BATCH):
+        payload = json.dumps({str(productid): stock for productid, stock in items[start:start + NOTIFY_BATCH]}, separators=(",", ":"))
+        await db.execute("SELECT pg_notify(:channel, :payload)", {"channel": STOCK_CHANNEL, "payload": payload})
+
+
+class StockSubscription:
+    """
+    Stock changes for a set of products, waiting to be sent to one client.
+
+    Only the latest level per product is kept, so a slow client never builds up a backlog.
+    """
+
+    def __init__(self, productids: Iterable[int]):
+        self.productids = set(productids)
+        self._pending: Dict[int, int] = {}
+        self._event = asyncio.Event()
+
+    def push(self, productid: int, stock: int) -> None:
+        self._pending[productid] = stock
+        self._event.set()
+
+    async def next(self, timeout: float) -> Dict[int, int]:
+        """
+        Wait up to `timeout` seconds for changes; returns {} if nothing changed.
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        self._event.clear()
+        changes, self._pending = self._pending, {}
+        return changes
+
+
+class StockListener:
+    """
+    LISTENs on stock_changed over a dedicated connection and fans changes out to
+    subscriptions. Notifications also patch the catalog snapshot, so stock changes made
+    by other workers show up without waiting for the staleness bound.
+    """
+
+    def __init__(self, db: Database, catalog: CatalogCache = default_catalog):
+        self.db = db
+        self.catalog = catalog
+        self._connection: Optional[asyncpg.Connection] = None
+        self._subscriptions: Dict[int, Set[StockSubscription]] = {}
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._connection is not None and not self._connection.is_closed()
+
+    async def start(self) -> None:
+        if not uses_postgres(self.db):
+            logger.info("Stock notifications need Postgres; live stock stream disabled")
+            return
+        self._stopping = False
+        self._connection = await asyncpg.connect(str(self.db.url.replace(driver="")))
+        self._connection.add_termination_listener(self._on_terminated)
+        await self._connection.add_listener(STOCK_CHANNEL, self._on_notify)
+        logger.info(f"Listening for stock changes on {STOCK_CHANNEL}")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._connection and not self._connection.is_closed():
+            await self._connection.close()
+        self._connection = None
+
+    def subscribe(self, productids: Iterable[int]) -> StockSubscription:
+        subscription = StockSubscription(productids)
+        for productid in subscription.productids:
+            self._subscriptions.setdefault(productid, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: StockSubscription) -> None:
+        for productid in subscription.productids:
+            subscribers = self._subscriptions.get(productid)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[productid]
+
+    def publish(self, changes: Dict[int, int]) -> None:
+        for productid, stock in changes.items():
+            self.catalog.patch(productid, stock=stock)
+            for subscription in self._subscriptions.get(productid, ()):
+                subscription.push(productid, stock)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            changes = {int(productid): stock for productid, stock in json.loads(payload).items()}
+        except (ValueError, AttributeError):
+            logger.warning(f"Ignoring malformed {STOCK_CHANNEL} payload: {payload!r}")
+            return
+        self.publish(changes)
+
+    def _on_terminated(self, connection) -> None:
+        if self._stopping:
+            return
+        logger.warning("Stock listener connection lost; reconnecting")
+        self._reconnect_task = asyncio.get_event_loop().create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(RECONNECT_DELAY)
+            try:
+                await self.start()
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning(f"Stock listener reconnect failed: {e}")
+                continue
+            # Changes made while disconnected were missed; reload the snapshot on next read
+            self.catalog.invalidate()
+            return
+
+
+# Shared listener, started in the lifespan hook in main.py
+stock_listener = StockListener(database)
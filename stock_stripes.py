@@ -0,0 +1,291 @@
+import os
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Set
+
+from databases import Database
+from db import database
+from reservations import RESERVATIONS_ENABLED
+from stock_events import notify_stock_changes
+
+logger = logging.getLogger(__name__)
+
+# Split the stock of flagged products across several rows (see StockStripes). Holds take
+# stock from products.stock at cart time, so the two modes do not mix: with
+# CART_RESERVATIONS on, stripes stay off.
+STOCK_STRIPES_ENABLED = (
+    os.getenv("STOCK_STRIPES", "false").lower() in ("1", "true", "yes") and not RESERVATIONS_ENABLED
+)
+# Stripes given to a product when the product manager does not say how many
+DEFAULT_STRIPES = int(os.getenv("STOCK_STRIPES_DEFAULT", "8"))
+MAX_STRIPES = 64
+# Seconds between copies of the stripe totals into products.stock
+STOCK_STRIPE_ROLLUP_INTERVAL = float(os.getenv("STOCK_STRIPE_ROLLUP_INTERVAL", "5"))
+
+_STRIPED = """
+    SELECT productid FROM stock_stripes
+    WHERE productid = ANY(:productids) AND stripe = 0
+"""
+
+_TOTALS = """
+    SELECT productid, SUM(stock) AS stock
+    FROM stock_stripes
+    WHERE productid = ANY(:productids)
+    GROUP BY productid
+"""
+
+# Takes the quantity from one random stripe that has enough. Stripes other checkouts are
+# holding are skipped rather than waited for. The total is read from the statement's
+# snapshot, before the stripe changed.
+_TAKE_FROM_STRIPE = """
+    WITH pick AS (
+        SELECT stripe FROM stock_stripes
+        WHERE productid = :productid AND stock >= CAST(:quantity AS int)
+        ORDER BY random()
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    ), taken AS (
+        UPDATE stock_stripes s
+        SET stock = s.stock - CAST(:quantity AS int)
+        FROM pick
+        WHERE s.productid = :productid AND s.stripe = pick.stripe
+        RETURNING s.stripe
+    )
+    SELECT (SELECT SUM(stock) FROM stock_stripes WHERE productid = :productid) - CAST(:quantity AS int) AS stock
+    FROM taken
+"""
+
+# When no single free stripe has enough: waits for all the product's stripes, in stripe
+# order, and takes the quantity from as many of them as it needs
+_TAKE_ACROSS_STRIPES = """
+    WITH locked AS (
+        SELECT stripe, stock FROM stock_stripes
+        WHERE productid = :productid
+        ORDER BY stripe
+        FOR UPDATE
+    ), spread AS (
+        SELECT stripe, LEAST(stock, GREATEST(CAST(:quantity AS int) - (SUM(stock) OVER (ORDER BY stripe) - stock), 0)) AS take
+        FROM locked
+    ), taken AS (
+        UPDATE stock_stripes s
+        SET stock = s.stock - sp.take
+        FROM spread sp
+        WHERE s.productid = :productid AND s.stripe = sp.stripe AND sp.take > 0
+          AND (SELECT SUM(stock) FROM locked) >= CAST(:quantity AS int)
+        RETURNING s.stripe
+    )
+    SELECT (SELECT SUM(stock) FROM locked) - CAST(:quantity AS int) AS stock, EXISTS (SELECT 1 FROM taken) AS taken
+"""
+
+# Adds the quantity to a random free stripe, or waits for the first one if all are busy.
+# Returns no row for a product without stripes.
+_RESTORE = """
+    WITH pick AS (
+        SELECT COALESCE(
+            (SELECT stripe FROM stock_stripes WHERE productid = :productid ORDER BY random() LIMIT 1 FOR UPDATE SKIP LOCKED),
+            (SELECT MIN(stripe) FROM stock_stripes WHERE productid = :productid)
+        ) AS stripe
+    ), added AS (
+        UPDATE stock_stripes s
+        SET stock = s.stock + CAST(:quantity AS int)
+        FROM pick
+        WHERE s.productid = :productid AND s.stripe = pick.stripe
+        RETURNING s.stripe
+    )
+    SELECT (SELECT SUM(stock) FROM stock_stripes WHERE productid = :productid) + CAST(:quantity AS int) AS stock
+    FROM added
+"""
+
+# Spreads a new total evenly over the product's existing stripes
+_SET_STRIPES = """
+    WITH locked AS (
+        SELECT stripe FROM stock_stripes
+        WHERE productid = :productid
+        ORDER BY stripe
+        FOR UPDATE
+    ), counted AS (
+        SELECT stripe, count(*) OVER () AS stripes FROM locked
+    )
+    UPDATE stock_stripes s
+    SET stock = CAST(:stock AS int) / c.stripes + CASE WHEN s.stripe < CAST(:stock AS int) % c.stripes THEN 1 ELSE 0 END
+    FROM counted c
+    WHERE s.productid = :productid AND s.stripe = c.stripe
+    RETURNING s.stripe
+"""
+
+_INSERT_STRIPES = """
+    INSERT INTO stock_stripes (productid, stripe, stock)
+    SELECT :productid, i, CAST(:stock AS int) / CAST(:stripes AS int)
+        + CASE WHEN i < CAST(:stock AS int) % CAST(:stripes AS int) THEN 1 ELSE 0 END
+    FROM generate_series(0, CAST(:stripes AS int) - 1) AS i
+"""
+
+# Keeps products.stock, which listings and the catalog read, close to the stripe totals
+_ROLLUP = """
+    UPDATE products p
+    SET stock = s.total
+    FROM (SELECT productid, SUM(stock) AS total FROM stock_stripes GROUP BY productid) AS s
+    WHERE p.productid = s.productid AND p.stock <> s.total
+    RETURNING p.productid, p.stock
+"""
+
+
+class StockStripes:
+    """
+    Striped stock counters for hot products.
+
+    Every order of a product updates its products row, so buyers of a popular product
+    queue on that one row lock. A striped product keeps its stock in N stock_stripes rows
+    instead: checkout takes from a random stripe nobody else is using, refunds and
+    cancellations put stock back into one, and the stock is the sum of the stripes. Only
+    when no free stripe has enough does a checkout lock all of them and take from several.
+
+    products.stock of a striped product is a copy, refreshed from the sums every
+    STOCK_STRIPE_ROLLUP_INTERVAL seconds; stock notifications carry the sums right away.
+    """
+
+    def __init__(self, db: Database, enabled: bool = STOCK_STRIPES_ENABLED,
+                 rollup_interval: float = STOCK_STRIPE_ROLLUP_INTERVAL):
+        self.db = db
+        self.enabled = enabled
+        self.rollup_interval = rollup_interval
+        self._task: Optional[asyncio.Task] = None
+
+    #####################
+    #   LIFECYCLE
+    #####################
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._rollup_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _rollup_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.rollup_interval)
+            try:
+                await self.rollup()
+            except Exception as e:  # roll up again on the next tick
+                logger.warning(f"Stock stripe rollup failed: {e}")
+
+    async def rollup(self) -> int:
+        """
+        Copy the stripe totals into products.stock and publish the products that changed.
+        Returns the number of products changed.
+        """
+        async with self.db.transaction():
+            rows = await self.db.fetch_all(_ROLLUP)
+            await notify_stock_changes(self.db, {row["productid"]: row["stock"] for row in rows})
+        return len(rows)
+
+    #####################
+    #   READS
+    #####################
+
+    async def striped(self, productids: Iterable[int]) -> Set[int]:
+        """
+        The products among `productids` whose stock is striped.
+        """
+        if not self.enabled:
+            return set()
+        rows = await self.db.fetch_all(_STRIPED, {"productids": list(productids)})
+        return {row["productid"] for row in rows}
+
+    async def totals(self, productids: Iterable[int]) -> Dict[int, int]:
+        """
+        {productid: stock} for the striped products among `productids`.
+        """
+        if not self.enabled:
+            return {}
+        rows = await self.db.fetch_all(_TOTALS, {"productids": list(productids)})
+        return {row["productid"]: row["stock"] for row in rows}
+
+    #####################
+    #   CHANGES
+    #####################
+
+    async def take(self, quantities: Dict[int, int]) -> Dict[int, int]:
+        """
+        Take {productid: quantity} out of striped products, in productid order (negative
+        quantities are put back). Call it in the checkout transaction.
+
+        Returns:
+            Dict[int, int]: The new stock of each product.
+
+        Raises:
+            ValueError: If a product has too little stock.
+        """
+        totals = {}
+        for productid in sorted(quantities):
+            quantity = quantities[productid]
+            if quantity < 0:
+                totals[productid] = await self.restore(productid, -quantity)
+                continue
+            row = await self.db.fetch_one(_TAKE_FROM_STRIPE, {"productid": productid, "quantity": quantity})
+            if row is None:
+                row = await self.db.fetch_one(_TAKE_ACROSS_STRIPES, {"productid": productid, "quantity": quantity})
+                if not row["taken"]:
+                    raise ValueError(f"Insufficient stock for product ID {productid}")
+            totals[productid] = row["stock"]
+        return totals
+
+    async def restore(self, productid: int, quantity: int) -> Optional[int]:
+        """
+        Put `quantity` back into one of the product's stripes.
+
+        Returns:
+            Optional[int]: The new stock, or None if the product is not striped; its
+            products row is then the one to update.
+        """
+        if not self.enabled:
+            return None
+        row = await self.db.fetch_one(_RESTORE, {"productid": productid, "quantity": quantity})
+        return row["stock"] if row else None
+
+    async def set_stock(self, productid: int, stock: int) -> bool:
+        """
+        Spread a new stock level over the product's stripes. Returns False if the product
+        is not striped.
+        """
+        if not self.enabled:
+            return False
+        rows = await self.db.fetch_all(_SET_STRIPES, {"productid": productid, "stock": stock})
+        return bool(rows)
+
+    async def resize(self, productid: int, stripes: int) -> Optional[int]:
+        """
+        Split the product's stock across `stripes` stripes; 0 puts it back in products.stock.
+
+        Returns:
+            Optional[int]: The product's stock, or None if the product does not exist.
+        """
+        async with self.db.transaction():
+            # The product row lock keeps two resizes (and stock updates) from interleaving
+            product = await self.db.fetch_one(
+                "SELECT stock FROM products WHERE productid = :productid FOR UPDATE", {"productid": productid}
+            )
+            if product is None:
+                return None
+            removed = await self.db.fetch_all(
+                "DELETE FROM stock_stripes WHERE productid = :productid RETURNING stock", {"productid": productid}
+            )
+            stock = sum(row["stock"] for row in removed) if removed else product["stock"]
+            if stripes > 0:
+                await self.db.execute(_INSERT_STRIPES, {"productid": productid, "stock": stock, "stripes": stripes})
+            await self.db.execute(
+                "UPDATE products SET stock = :stock WHERE productid = :productid", {"stock": stock, "productid": productid}
+            )
+        return stock
+
+
+# Shared stripes, used by checkout, refunds, cancellations and stock reads; rolled up in
+# the background (started in the lifespan hook in main.py)
+stock_stripes = StockStripes(database)
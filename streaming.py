@@ -0,0 +1,66 @@
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, Optional
+
+from databases import Database
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from fast_json import dumps
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Rows per chunk after the first. The first row is sent on its own so the client gets
+# bytes as soon as Postgres returns anything; later rows are grouped to keep the number
+# of socket writes (and compressor flushes) down.
+NDJSON_CHUNK_ROWS = 500
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def _ndjson_lines(rows: AsyncIterable[Any], transform: Optional[Callable[[Any], Any]]):
+    chunk = []
+    first = True
+    async for row in rows:
+        chunk.append(dumps(transform(row) if transform else row))
+        if first or len(chunk) >= NDJSON_CHUNK_ROWS:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+            first = False
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+
+async def _iterate_list(rows: Iterable[Any]):
+    for row in rows:
+        yield row
+
+
+def stream_query(
+    db: Database,
+    query: str,
+    values: Optional[Dict[str, Any]] = None,
+    transform: Optional[Callable[[Any], Any]] = None,
+) -> StreamingResponse:
+    """
+    Stream the rows of `query` as newline-delimited JSON.
+
+    Rows are read with database.iterate(), which uses a server-side cursor on Postgres,
+    so memory use does not grow with the size of the result.
+    """
+    return StreamingResponse(
+        _ndjson_lines(db.iterate(query=query, values=values), transform),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
+
+
+def stream_rows(
+    rows: Iterable[Any],
+    transform: Optional[Callable[[Any], Any]] = None,
+) -> StreamingResponse:
+    """
+    Stream rows that are already in memory (e.g. the catalog snapshot) as newline-delimited JSON.
+    """
+    return StreamingResponse(
+        _ndjson_lines(_iterate_list(rows), transform),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
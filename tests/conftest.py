@@ -1,12 +1,38 @@
 import pytest
+from decimal import Decimal
 from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
 import sys
 import os
+import asyncio
+from datetime import datetime, timezone
+from functools import partial
 
 root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(root_path)
 from main import app
 from db import database  # your Database(...) instance
+from catalog_cache import CatalogCache
+from cart_store import MemoryCartStore
+from cart_pricing import CartPricing
+from idempotency import IdempotencyStore
+from order_service import OrderService
+
+# Rows the mocked catalog snapshot (make_catalog) is loaded with
+CATALOG_PRODUCTS = [
+    {"productid": 1, "productname": "Mouse", "price": Decimal("25.00"), "soldamount": 5, "stock": 10, "categoryid": 1},
+    {"productid": 2, "productname": "Keyboard", "price": Decimal("40.00"), "soldamount": 9, "stock": 0, "categoryid": 1},
+    {"productid": 3, "productname": "Monitor", "price": Decimal("150.00"), "soldamount": 2, "stock": 4, "categoryid": 2},
+]
+CATALOG_CATEGORIES = [{"categoryid": 1, "name": "Peripherals"}, {"categoryid": 2, "name": "Displays"}]
+
+# Rows the mocked pricing query (make_pricing) returns: 2 mice and 1 monitor
+PRICED_ROWS = [
+    {"productid": 1, "productname": "Mouse", "quantity": 2, "stock": 10, "price": 25.0, "discountprice": None,
+     "image": "m.png", "unit_price": 25.0, "total_price": 50.0, "total_cart_price": 200.0},
+    {"productid": 3, "productname": "Monitor", "quantity": 1, "stock": 4, "price": 150.0, "discountprice": None,
+     "image": "u.png", "unit_price": 150.0, "total_price": 150.0, "total_cart_price": 200.0},
+]
 
 @pytest.fixture(scope="session", autouse=True)
 def setup_database():
@@ -31,3 +57,151 @@ def client():
     """
     with TestClient(app) as c:
         yield c
+
+
+@pytest.fixture
+def make_catalog():
+    """
+    Factory for a loaded CatalogCache over CATALOG_PRODUCTS and CATALOG_CATEGORIES.
+    """
+    def factory(max_staleness: float = 60) -> CatalogCache:
+        db = MagicMock()
+        db.fetch_all = AsyncMock(side_effect=lambda query, *args, **kwargs: CATALOG_CATEGORIES if "categories" in query else CATALOG_PRODUCTS)
+        cache = CatalogCache(db, max_staleness=max_staleness, enabled=True)
+        asyncio.run(cache.load())
+        return cache
+    return factory
+
+
+@pytest.fixture
+def catalog_snapshot(make_catalog):
+    """
+    Serves the product read endpoints from a loaded catalog snapshot. Yields the cache.
+    """
+    cache = make_catalog()
+    with patch("product_endpoints.catalog", cache), patch("product_sort_endpoints.catalog", cache):
+        yield cache
+
+
+@pytest.fixture
+def server_prices():
+    """
+    Prices order lines ({productid: quantity}) from CATALOG_PRODUCTS instead of the
+    database, the way CartPricing.price_lines does. Yields the mock.
+    """
+    products = {product["productid"]: product for product in CATALOG_PRODUCTS}
+
+    async def price_lines(lines):
+        items = [
+            {"productid": productid, "productname": products[productid]["productname"], "quantity": quantity,
+             "unit_price": products[productid]["price"], "total_price": quantity * products[productid]["price"]}
+            for productid, quantity in sorted(lines.items()) if productid in products
+        ]
+        return {"items": items, "total_cart_price": sum(item["total_price"] for item in items)}
+
+    with patch("cart_pricing.CartPricing.price_lines", new_callable=AsyncMock, side_effect=price_lines) as mock:
+        yield mock
+
+
+@pytest.fixture
+def make_transaction():
+    """
+    Factory for a stand-in for `database.transaction()` used as `async with`.
+    """
+    def factory():
+        return MagicMock(__aenter__=AsyncMock(), __aexit__=AsyncMock(return_value=False))
+    return factory
+
+
+@pytest.fixture
+def make_db(make_transaction):
+    """
+    Factory for a mocked Database: async fetch_one/fetch_all/execute, a working
+    transaction() and a non-Postgres dialect (so stock notifications are skipped).
+    """
+    def factory(fetch_one=None, fetch_all=None):
+        db = AsyncMock()
+        db.transaction = MagicMock(return_value=make_transaction())
+        db.fetch_one.return_value = fetch_one
+        db.fetch_all.return_value = fetch_all if fetch_all is not None else []
+        db.url.dialect = "sqlite"
+        return db
+    return factory
+
+
+@pytest.fixture
+def make_cart_store(make_db, make_catalog):
+    """
+    Factory for a MemoryCartStore over the mocked catalog. `cart_rows` are the cart
+    table rows it loads. Returns (store, db).
+    """
+    def factory(cart_rows=None):
+        db = make_db(fetch_all=cart_rows or [])
+        return MemoryCartStore(db, catalog=make_catalog()), db
+    return factory
+
+
+@pytest.fixture
+def make_pricing(make_db, make_cart_store):
+    """
+    Factory for a CartPricing over a memory cart store whose pricing query returns
+    `rows`. Returns (pricing, store, db).
+    """
+    def factory(rows=PRICED_ROWS):
+        store, _ = make_cart_store()
+        db = make_db(fetch_all=rows)
+        return CartPricing(db, store=store, catalog=store.catalog), store, db
+    return factory
+
+
+@pytest.fixture
+def make_holds():
+    """
+    Factory for a stand-in for Reservations. hold() returns `results` in turn and
+    consume() returns `consumed`.
+    """
+    def factory(*results, consumed=None):
+        holds = MagicMock(enabled=True)
+        holds.hold = AsyncMock(side_effect=list(results))
+        holds.release = AsyncMock()
+        holds.consume = AsyncMock(return_value=consumed or {})
+        return holds
+    return factory
+
+
+@pytest.fixture
+def make_idempotency(make_db):
+    """
+    Factory for an IdempotencyStore over a mocked database. A key lookup returns
+    `lookup_row`. Saving a key succeeds unless `saved` is False, meaning another request
+    committed the key first. Returns (store, db).
+    """
+    def factory(lookup_row=None, saved=True, ttl_hours=24):
+        db = make_db()
+
+        async def fetch_one(query, values):
+            if "INSERT INTO idempotency_keys" in query:
+                return {"created_at": datetime.now(timezone.utc)} if saved else None
+            return lookup_row
+
+        db.fetch_one.side_effect = fetch_one
+        return IdempotencyStore(db, ttl_hours=ttl_hours), db
+    return factory
+
+
+@pytest.fixture
+def place_order(make_db, server_prices):
+    """
+    POST /create_order/ for user 7 through the real OrderService, over a mocked database
+    (see make_db) and server prices from CATALOG_PRODUCTS. `holds` and `stripes` replace
+    the shared reservations and stock stripes, which are off by default.
+    Returns (response, db).
+    """
+    def factory(items, db=None, holds=None, stripes=None, idempotency=None, headers=None):
+        db = db or make_db({"orderid": 9}, [{"productid": item["productid"], "stock": 0} for item in items])
+        service = partial(OrderService, holds=holds or MagicMock(enabled=False), stripes=stripes or MagicMock(enabled=False))
+        with patch("order_endpoints.database", db), patch("order_endpoints.OrderService", service), \
+             patch("order_endpoints.idempotency", idempotency or IdempotencyStore(db)):
+            response = TestClient(app).post("/create_order/", json={"userid": 7, "items": items}, headers=headers or {})
+        return response, db
+    return factory
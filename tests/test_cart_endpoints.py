@@ -9,19 +9,14 @@ client = TestClient(app)
 
 
 @patch("cart_endpoints.database.fetch_one", new_callable=AsyncMock)
-@patch("cart_endpoints.database.execute", new_callable=AsyncMock)
-def test_add_to_cart(mock_execute, mock_fetch_one):
+def test_add_to_cart(mock_fetch_one):
     """
     Test adding a product to the cart when:
      - The product exists and has stock > 0.
-     - The cart does not already contain the product.
+     - The upsert succeeds (new cart quantity returned).
     """
-    # Mock DB call #1 (check product)
-    # Mock DB call #2 (check existing cart item -> None)
-    mock_fetch_one.side_effect = [
-        {"productid": 1, "stock": 10},  # Product found with stock
-        None  # No existing cart item
-    ]
+    # Single upsert statement -> product stock and the new cart quantity
+    mock_fetch_one.return_value = {"stock": 10, "quantity": 2}
 
     # POST request body
     request_body = {
@@ -33,6 +28,7 @@ def test_add_to_cart(mock_execute, mock_fetch_one):
     response = client.post("/cart/add", json=request_body)
     assert response.status_code == 200
     assert response.json() == {"message": "Item added to cart successfully."}
+    mock_fetch_one.assert_called_once()
 
 
 @patch("cart_endpoints.database.fetch_one", new_callable=AsyncMock)
@@ -40,7 +36,7 @@ def test_add_to_cart_product_not_found(mock_fetch_one):
     """
     Test adding to cart with non-existing product -> 404
     """
-    mock_fetch_one.return_value = None  # No product found
+    mock_fetch_one.return_value = {"stock": None, "quantity": None}  # No product found
 
     request_body = {
         "userid": 1,
@@ -58,8 +54,8 @@ def test_add_to_cart_out_of_stock(mock_fetch_one):
     """
     Test adding a product that has stock=0 -> 400
     """
-    # The first fetch_one() is the product query
-    mock_fetch_one.return_value = {"productid": 1, "stock": 0}
+    # The upsert finds the product but inserts nothing
+    mock_fetch_one.return_value = {"stock": 0, "quantity": None}
 
     request_body = {
         "userid": 2,
@@ -73,20 +69,15 @@ def test_add_to_cart_out_of_stock(mock_fetch_one):
 
 
 @patch("cart_endpoints.database.fetch_one", new_callable=AsyncMock)
-@patch("cart_endpoints.database.execute", new_callable=AsyncMock)
-def test_increase_cart(mock_execute, mock_fetch_one):
+def test_increase_cart(mock_fetch_one):
     """
     Test increasing cart quantity by 1 when:
      - Product exists
      - Cart item exists
      - New quantity is within stock
     """
-    # DB call #1 -> product stock
-    # DB call #2 -> cart item
-    mock_fetch_one.side_effect = [
-        {"stock": 10},  # product with enough stock
-        {"productid": 1, "quantity": 5}  # cart item
-    ]
+    # Single conditional update -> stock, previous and new quantity
+    mock_fetch_one.return_value = {"stock": 10, "quantity": 5, "new_quantity": 6}
 
     response = client.post("/cart/increase", params={"userid": 1, "productid": 1})
     assert response.status_code == 200
@@ -98,10 +89,8 @@ def test_increase_cart_insufficient_stock(mock_fetch_one):
     """
     Test increasing cart quantity beyond available stock -> 400
     """
-    mock_fetch_one.side_effect = [
-        {"stock": 5},  # product stock
-        {"productid": 1, "quantity": 5}  # cart item with quantity=5
-    ]
+    # quantity + 1 > stock, so the update matched no row
+    mock_fetch_one.return_value = {"stock": 5, "quantity": 5, "new_quantity": None}
 
     response = client.post("/cart/increase", params={"userid": 1, "productid": 1})
     assert response.status_code == 400
@@ -113,12 +102,7 @@ def test_increase_cart_item_not_found(mock_fetch_one):
     """
     Test increasing cart when no cart item -> 404
     """
-    # DB call #1 -> product stock
-    # DB call #2 -> cart item (None)
-    mock_fetch_one.side_effect = [
-        {"stock": 10},
-        None  # cart item not found
-    ]
+    mock_fetch_one.return_value = {"stock": 10, "quantity": None, "new_quantity": None}  # cart item not found
 
     response = client.post("/cart/increase", params={"userid": 1, "productid": 1})
     assert response.status_code == 404
@@ -126,14 +110,13 @@ def test_increase_cart_item_not_found(mock_fetch_one):
 
 
 @patch("cart_endpoints.database.fetch_one", new_callable=AsyncMock)
-@patch("cart_endpoints.database.execute", new_callable=AsyncMock)
-def test_decrease_cart(mock_execute, mock_fetch_one):
+def test_decrease_cart(mock_fetch_one):
     """
     Test decreasing cart quantity by 1 when:
      - Cart item exists
      - quantity - 1 >= 1
     """
-    mock_fetch_one.return_value = {"productid": 1, "quantity": 2}
+    mock_fetch_one.return_value = {"quantity": 2, "new_quantity": 1}
 
     response = client.post("/cart/decrease", params={"userid": 1, "productid": 1})
     assert response.status_code == 200
@@ -145,7 +128,7 @@ def test_decrease_cart_below_minimum(mock_fetch_one):
     """
     Test decreasing cart item below quantity=1 -> 400
     """
-    mock_fetch_one.return_value = {"productid": 1, "quantity": 1}
+    mock_fetch_one.return_value = {"quantity": 1, "new_quantity": None}
 
     response = client.post("/cart/decrease", params={"userid": 1, "productid": 1})
     assert response.status_code == 400
@@ -157,7 +140,7 @@ def test_decrease_cart_item_not_found(mock_fetch_one):
     """
     Test decreasing cart item that doesn't exist -> 404
     """
-    mock_fetch_one.return_value = None  # no cart item
+    mock_fetch_one.return_value = {"quantity": None, "new_quantity": None}  # no cart item
 
     response = client.post("/cart/decrease", params={"userid": 1, "productid": 1})
     assert response.status_code == 404
@@ -165,12 +148,11 @@ def test_decrease_cart_item_not_found(mock_fetch_one):
 
 
 @patch("cart_endpoints.database.fetch_one", new_callable=AsyncMock)
-@patch("cart_endpoints.database.execute", new_callable=AsyncMock)
-def test_remove_cart_item(mock_execute, mock_fetch_one):
+def test_remove_cart_item(mock_fetch_one):
     """
     Test removing item from cart when it exists
     """
-    mock_fetch_one.return_value = {"productid": 1, "quantity": 3}  # cart item found
+    mock_fetch_one.return_value = {"productid": 1}  # DELETE ... RETURNING found the row
 
     response = client.delete("/cart/remove", params={"userid": 1, "productid": 1})
     assert response.status_code == 200
@@ -202,7 +184,10 @@ def test_get_cart(mock_fetch_all):
             "stock": 10,
             "price": 50.00,
             "discountprice": 30.00,
-            "image": "https://example.com/a.jpg"
+            "image": "https://example.com/a.jpg",
+            "unit_price": 30.00,
+            "total_price": 60.00,
+            "total_cart_price": 85.00
         },
         {
             "productid": 2,
@@ -211,13 +196,17 @@ def test_get_cart(mock_fetch_all):
             "stock": 5,
             "price": 25.00,
             "discountprice": None,
-            "image": "https://example.com/b.jpg"
+            "image": "https://example.com/b.jpg",
+            "unit_price": 25.00,
+            "total_price": 25.00,
+            "total_cart_price": 85.00
         },
     ]
 
     response = client.get("/cart", params={"userid": 3})
     assert response.status_code == 200
 
+    # Totals are computed in SQL:
     # First item uses discountprice=30.00
     # => total_price for item 1 = 2 * 30 = 60
     # Second item uses price=25.00 because discountprice=None
@@ -298,3 +287,46 @@ def test_empty_cart_not_found(mock_fetch_all):
     response = client.delete("/cart/empty", params={"userid": 5})
     assert response.status_code == 404
     assert response.json() == {"detail": "Cart is already empty or user does not exist"}
+
+
+@patch("cart_endpoints.database.fetch_one", new_callable=AsyncMock)
+def test_add_to_cart_insufficient_stock(mock_fetch_one):
+    """
+    Test adding more than the remaining stock -> 400, nothing written
+    """
+    mock_fetch_one.return_value = {"stock": 3, "quantity": None}
+
+    response = client.post("/cart/add", json={"userid": 1, "productid": 1, "quantity": 4})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Insufficient stock for this operation"}
+
+
+@patch("cart_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_set_cart_quantities(mock_fetch_all):
+    """
+    Test setting many quantities in one statement, with a status per item
+    """
+    mock_fetch_all.return_value = [
+        {"productid": 1, "quantity": 3, "stock": 10, "updated": True, "removed": False},
+        {"productid": 2, "quantity": 0, "stock": 5, "updated": False, "removed": True},
+        {"productid": 3, "quantity": 9, "stock": 4, "updated": False, "removed": False},
+        {"productid": 4, "quantity": 1, "stock": None, "updated": False, "removed": False},
+    ]
+
+    request_body = {
+        "userid": 1,
+        "items": [
+            {"productid": 1, "quantity": 1},
+            {"productid": 2, "quantity": 0},
+            {"productid": 3, "quantity": 9},
+            {"productid": 4, "quantity": 1},
+            {"productid": 1, "quantity": 3},
+        ],
+    }
+    response = client.post("/cart/set", json=request_body)
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json()["items"]] == ["updated", "removed", "insufficient_stock", "not_found"]
+
+    # Duplicates collapse to the last quantity before reaching the database
+    values = mock_fetch_all.call_args.kwargs["values"]
+    assert values == {"userid": 1, "productids": [1, 2, 3, 4], "quantities": [3, 0, 9, 1], "allowances": [0, 0, 0, 0]}
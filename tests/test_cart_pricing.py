@@ -0,0 +1,89 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from main import app
+
+client = TestClient(app)
+
+CART = [(1, 10, 50.0), (3, 4, 150.0)]
+
+
+def cart_lines(response):
+    return [(line["productid"], line["stock"], line["total_price"]) for line in response.json()["cart"]]
+
+
+# 1) Test: A priced cart is reused until the cart or a price changes
+def test_cart_pricing_cache(make_pricing):
+    pricing, store, db = make_pricing()
+
+    with patch("cart_endpoints.cart_store", store), patch("cart_endpoints.cart_pricing", pricing):
+        client.post("/cart/add", json={"userid": 7, "productid": 1, "quantity": 2})
+        client.post("/cart/add", json={"userid": 7, "productid": 3, "quantity": 1})
+        first = client.get("/cart", params={"userid": 7})
+        assert client.get("/cart", params={"userid": 7}).json() == first.json()
+        assert db.fetch_all.call_count == 1
+
+        client.post("/cart/increase", params={"userid": 7, "productid": 3})
+        client.get("/cart", params={"userid": 7})
+        assert db.fetch_all.call_count == 2
+
+        # Stock changes from other orders keep the priced cart
+        pricing.catalog.patch(1, stock=3)
+        client.get("/cart", params={"userid": 7})
+        assert db.fetch_all.call_count == 2
+
+        pricing.catalog.patch(1, price=20)
+        client.get("/cart", params={"userid": 7})
+        assert db.fetch_all.call_count == 3
+
+    assert first.status_code == 200
+    assert cart_lines(first) == CART
+    assert first.json()["total_cart_price"] == 200.0
+    assert db.fetch_all.call_args.args[1] == {"productids": [1, 3], "quantities": [2, 2]}
+
+
+# 2) Test: An empty cart cannot be checked out
+def test_cart_pricing_empty_cart(make_pricing):
+    pricing, store, db = make_pricing()
+
+    with patch("order_endpoints.cart_store", store), patch("order_endpoints.cart_pricing", pricing):
+        response = client.post("/create_order/", json={"userid": 7})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Cart is empty"}
+    db.fetch_all.assert_not_called()
+
+
+# 3) Test: /create_order without items orders the server-priced cart
+@patch("order_service.OrderService.create_order", new_callable=AsyncMock)
+def test_create_order_from_priced_cart(mock_create_order, make_pricing):
+    mock_create_order.return_value = {"orderid": 5, "message": "Order created successfully"}
+    pricing, store, _ = make_pricing()
+    asyncio.run(store.add(7, 1, 2))
+
+    with patch("order_endpoints.cart_pricing", pricing), patch("order_endpoints.cart_store", store):
+        response = client.post("/create_order/", json={"userid": 7})
+
+    assert response.status_code == 200
+    assert response.json() == {"orderid": 5, "message": "Order created successfully"}
+    order = mock_create_order.call_args.args[0]
+    assert order["totalamount"] == 200.0
+    assert order["items"][1] == {"productid": 3, "productname": "Monitor", "quantity": 1, "price": 150.0}
+
+
+# 4) Test: GET /cart shows current stock even when the priced cart comes from the cache
+def test_get_cart_stock_is_current(make_pricing):
+    pricing, store, db = make_pricing()
+    asyncio.run(store.add(7, 1, 2))
+    asyncio.run(store.add(7, 3, 1))
+
+    with patch("cart_endpoints.cart_pricing", pricing):
+        first = client.get("/cart", params={"userid": 7})
+        # Another user's order takes Monitor stock
+        pricing.catalog.patch(3, stock=1)
+        second = client.get("/cart", params={"userid": 7})
+
+    assert first.status_code == second.status_code == 200
+    assert cart_lines(first) == CART
+    assert cart_lines(second) == [(1, 10, 50.0), (3, 1, 150.0)]
+    assert db.fetch_all.call_count == 1
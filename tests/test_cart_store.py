@@ -0,0 +1,73 @@
+import asyncio
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock, patch
+from main import app
+from cart_store import MemoryCartStore, create_cart_store, PostgresCartStore
+
+client = TestClient(app)
+
+
+# 1) Test: Clicks only change memory; the cart is loaded once and written back in one batch
+def test_memory_cart_write_behind(make_cart_store):
+    store, db = make_cart_store([{"productid": 1, "quantity": 2}])
+
+    with patch("cart_endpoints.cart_store", store):
+        assert client.post("/cart/increase", params={"userid": 7, "productid": 1}).json() == {"message": "Quantity increased by 1."}
+        assert client.post("/cart/increase", params={"userid": 7, "productid": 1}).status_code == 200
+        assert client.post("/cart/decrease", params={"userid": 7, "productid": 1}).json() == {"message": "Quantity decreased by 1."}
+        response = client.post("/cart/add", json={"userid": 7, "productid": 3, "quantity": 1})
+        assert response.json() == {"message": "Item added to cart successfully."}
+    db.execute.assert_not_called()
+
+    asyncio.run(store.flush())
+
+    assert db.fetch_all.call_count == 1
+    delete, insert = db.execute.call_args_list
+    assert delete.args[1] == {"userids": [7]}
+    assert insert.args[1] == {"userids": [7, 7], "productids": [1, 3], "quantities": [3, 1]}
+
+
+# 2) Test: Stock limits come from the catalog snapshot
+def test_memory_cart_stock_checks(make_cart_store):
+    store, _ = make_cart_store()
+
+    with patch("cart_endpoints.cart_store", store):
+        keyboard = client.post("/cart/add", json={"userid": 7, "productid": 2, "quantity": 1})
+        monitors = client.post("/cart/add", json={"userid": 7, "productid": 3, "quantity": 5})
+        unknown = client.post("/cart/add", json={"userid": 7, "productid": 99, "quantity": 1})
+        cart = client.post("/cart/set", json={"userid": 7, "items": [
+            {"productid": 1, "quantity": 10}, {"productid": 3, "quantity": 0}, {"productid": 2, "quantity": 1},
+        ]})
+
+    assert (keyboard.status_code, keyboard.json()) == (400, {"detail": "Product is out of stock"})
+    assert (monitors.status_code, monitors.json()) == (400, {"detail": "Insufficient stock for this operation"})
+    assert (unknown.status_code, unknown.json()) == (404, {"detail": "Product not found"})
+    assert cart.json()["items"] == [
+        {"productid": 1, "quantity": 10, "status": "updated"},
+        {"productid": 3, "quantity": 0, "status": "not_found"},
+        {"productid": 2, "quantity": 1, "status": "insufficient_stock"},
+    ]
+    assert asyncio.run(store.lines(7)) == {1: 10}
+
+
+# 3) Test: A failed write keeps the carts dirty for the next flush
+def test_memory_cart_flush_retry(make_cart_store):
+    store, db = make_cart_store()
+    db.execute.side_effect = [RuntimeError("connection lost"), None, None]
+
+    async def scenario():
+        await store.add(7, 1, 1)
+        try:
+            await store.flush()
+        except RuntimeError:
+            pass
+        await store.flush([7])
+
+    asyncio.run(scenario())
+    assert db.execute.call_args.args[1] == {"userids": [7], "productids": [1], "quantities": [1]}
+
+
+# 4) Test: The backend is selected by name
+def test_create_cart_store():
+    assert isinstance(create_cart_store("postgres", MagicMock()), PostgresCartStore)
+    assert isinstance(create_cart_store("memory", MagicMock()), MemoryCartStore)
@@ -0,0 +1,104 @@
+import asyncio
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock
+from main import app
+
+client = TestClient(app)
+
+# 1) Test: Writes bump the version, a reload without changes does not
+def test_catalog_versioning(make_catalog):
+    cache = make_catalog()
+    version = cache.version
+
+    asyncio.run(cache.load())
+    assert cache.version == version
+
+    cache.patch(1, stock=3)
+    assert cache.version == version + 1
+    assert cache.get(1)["stock"] == 3
+
+    cache.remove(2)
+    assert cache.get(2) is None
+    assert [p["productid"] for p in cache.by_category(1)] == [1]
+
+
+# 2) Test: A stale snapshot is reloaded before it is served
+def test_catalog_staleness_bound(make_catalog):
+    cache = make_catalog(max_staleness=60)
+    cache.patch(1, stock=0)
+
+    cache.invalidate()
+    assert asyncio.run(cache.ready())
+    assert cache.get(1)["stock"] == 10
+
+
+# 3) Test: Product by ID is served from the snapshot without touching the database
+@patch("product_endpoints.database.fetch_one", new_callable=AsyncMock)
+def test_get_product_by_id_from_catalog(mock_fetch_one, catalog_snapshot):
+    response = client.get("/products/3/")
+
+    assert response.status_code == 200
+    assert response.json()["productname"] == "Monitor"
+    mock_fetch_one.assert_not_called()
+
+
+# 4) Test: Sorted listing is served from the snapshot
+@patch("product_sort_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_sort_by_popularity_from_catalog(mock_fetch_all, catalog_snapshot):
+    response = client.get("/products/sort/popularity/desc/")
+
+    assert response.status_code == 200
+    assert [p["productid"] for p in response.json()] == [2, 1, 3]
+    mock_fetch_all.assert_not_called()
+
+
+# 5) Test: Catalog reads carry an ETag and revalidate with 304 until a write
+@patch("product_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_get_all_products_etag(mock_fetch_all, catalog_snapshot):
+    response = client.get("/products/")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get("/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    # The tag of the gzip representation revalidates too, and is echoed back
+    gzip_etag = etag[:-1] + '-gzip"'
+    response = client.get("/products/", headers={"If-None-Match": gzip_etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == gzip_etag
+
+    # Any product write bumps the version and therefore the ETag
+    catalog_snapshot.patch(1, stock=9)
+    response = client.get("/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    mock_fetch_all.assert_not_called()
+
+
+# 6) Test: Rows read straight from Postgres are not tagged
+@patch("product_sort_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_no_etag_without_catalog(mock_fetch_all):
+    mock_fetch_all.return_value = []
+    response = client.get("/products/sort/price/asc/", headers={"If-None-Match": "*"})
+
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+
+
+# 7) Test: Stock patches leave the name and price versions alone
+def test_catalog_column_versions(make_catalog):
+    cache = make_catalog()
+    versions = dict(cache.column_versions)
+
+    cache.patch(1, stock=3)
+    assert cache.column_versions == versions
+
+    cache.patch(1, productname="Wireless Mouse")
+    assert cache.column_versions["text"] == versions["text"] + 1
+    assert cache.column_versions["price"] == versions["price"]
+
+    cache.remove(2)
+    assert all(cache.column_versions[group] > versions[group] for group in versions)
@@ -0,0 +1,77 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock
+from main import app
+from fast_json import dumps
+from compression import choose_encoding
+
+client = TestClient(app)
+
+PRODUCTS = [
+    {"productid": i, "productname": f"Product {i}", "price": Decimal("25.50"), "stock": 10, "discountprice": None}
+    for i in range(1, 101)
+]
+
+
+# 1) Test: orjson output matches FastAPI's default encoder for Decimal and datetime
+def test_dumps_matches_default_encoder():
+    content = [{"price": Decimal("25.50"), "quantity": Decimal("3"), "orderdate": datetime(2024, 5, 1, 10, 30, 15, 250)}]
+
+    assert json.loads(dumps(content)) == jsonable_encoder(content)
+
+
+# 2) Test: Accept-Encoding negotiation honours q-values and falls back to identity
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("") is None
+    assert choose_encoding("*") in ("br", "gzip")
+
+
+# 3) Test: Large product lists are gzipped when the client asks for it
+@patch("product_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_get_all_products_gzip(mock_fetch_all):
+    mock_fetch_all.return_value = PRODUCTS
+    response = client.get("/products/", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.json()[0] == {"productid": 1, "productname": "Product 1", "price": 25.5, "stock": 10, "discountprice": None}
+
+
+# 4) Test: Clients that do not accept compression get the plain body
+@patch("product_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_get_all_products_identity(mock_fetch_all):
+    mock_fetch_all.return_value = PRODUCTS
+    response = client.get("/products/", headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    assert len(response.json()) == 100
+
+
+# 5) Test: A compressed body gets its own strong ETag, which still revalidates
+def test_compressed_etag():
+    from fastapi import FastAPI
+    from fastapi.responses import PlainTextResponse
+    from compression import CompressionMiddleware
+    from etags import etag_matches
+
+    tagged = FastAPI()
+    tagged.add_middleware(CompressionMiddleware)
+
+    @tagged.get("/tagged")
+    def tagged_body():
+        return PlainTextResponse("x" * 4096, headers={"ETag": '"catalog-abc-7"'})
+
+    tagged_client = TestClient(tagged)
+    assert tagged_client.get("/tagged", headers={"Accept-Encoding": "gzip"}).headers["ETag"] == '"catalog-abc-7-gzip"'
+    assert tagged_client.get("/tagged", headers={"Accept-Encoding": "identity"}).headers["ETag"] == '"catalog-abc-7"'
+
+    assert etag_matches('"catalog-abc-7-gzip"', '"catalog-abc-7"')
+    assert etag_matches('W/"catalog-abc-7"', '"catalog-abc-7"')
+    assert not etag_matches('"catalog-abc-8-gzip"', '"catalog-abc-7"')
@@ -0,0 +1,139 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock
+from main import app
+from idempotency import IdempotencyStore, IDEMPOTENCY_SWEEP_BATCH, fingerprint
+from order_endpoints import OrderRequest
+
+client = TestClient(app)
+
+MOUSE = [{"productid": 1, "quantity": 1}]
+KEY = {"Idempotency-Key": "key-1"}
+
+
+def orders_db(make_db, *orderids):
+    # Each order inserted gets the next of `orderids`
+    db = make_db(fetch_all=[{"productid": 1, "stock": 5}, {"productid": 3, "stock": 3}])
+    db.fetch_one.side_effect = [{"orderid": orderid} for orderid in orderids]
+    return db
+
+
+# 1) Test: Without a key every request places an order
+def test_no_key_runs_every_time(place_order, make_db):
+    db = orders_db(make_db, 1, 2)
+
+    first, _ = place_order(MOUSE, db=db)
+    second, _ = place_order(MOUSE, db=db)
+
+    assert [first.json()["orderid"], second.json()["orderid"]] == [1, 2]
+    assert "Idempotent-Replayed" not in second.headers
+
+
+# 2) Test: A retry replays the first response from memory, a different body is rejected
+def test_retry_is_replayed(place_order, make_db, make_idempotency):
+    store, store_db = make_idempotency()
+    db = orders_db(make_db, 1, 2)
+
+    first, _ = place_order(MOUSE, db=db, idempotency=store, headers=KEY)
+    lookups = store_db.fetch_one.call_count
+    second, _ = place_order(MOUSE, db=db, idempotency=store, headers=KEY)
+    other, _ = place_order([{"productid": 3, "quantity": 1}], db=db, idempotency=store, headers=KEY)
+
+    assert first.json() == second.json() == {"orderid": 1, "message": "Order created successfully"}
+    assert "Idempotent-Replayed" not in first.headers
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert store_db.fetch_one.call_count == lookups
+    assert (other.status_code, other.json()) == (422, {"detail": "Idempotency-Key was already used for a different request"})
+
+
+# 3) Test: A duplicate that loses the race rolls back and replays the winner's response
+def test_concurrent_duplicate_rolls_back(place_order, make_db, make_idempotency):
+    body = OrderRequest(userid=7, items=MOUSE).model_dump()
+    winner = {"fingerprint": fingerprint(body), "response": '{"orderid": 7, "message": "Order created successfully"}',
+              "created_at": datetime.now(timezone.utc)}
+    store, store_db = make_idempotency(saved=False)
+    # The key is not there when the request starts, but is by the time it commits
+    store_db.fetch_one.side_effect = [None, None, winner]
+
+    response, _ = place_order(MOUSE, db=orders_db(make_db, 8), idempotency=store, headers=KEY)
+
+    assert response.status_code == 200
+    assert response.json() == {"orderid": 7, "message": "Order created successfully"}
+    assert response.headers["Idempotent-Replayed"] == "true"
+    exit_args = store_db.transaction.return_value.__aexit__.call_args.args
+    assert exit_args[0] is not None  # order 8 was rolled back
+
+
+# 4) Test: /create_order places one order for two requests with the same key
+@patch("order_service.OrderService.create_order", new_callable=AsyncMock)
+def test_create_order_idempotency_key(mock_create_order, make_idempotency, server_prices):
+    mock_create_order.return_value = {"orderid": 123, "message": "Order created successfully"}
+    store, _ = make_idempotency()
+    order = {"userid": 1, "totalamount": 50.0, "items": [{"productid": 1, "quantity": 1, "price": 50.0}]}
+
+    with patch("order_endpoints.idempotency", store):
+        first = client.post("/create_order/", json=order, headers={"Idempotency-Key": "abc"})
+        second = client.post("/create_order/", json=order, headers={"Idempotency-Key": "abc"})
+
+    assert first.json() == second.json() == {"orderid": 123, "message": "Order created successfully"}
+    assert mock_create_order.call_count == 1
+    assert "Idempotent-Replayed" not in first.headers
+    assert second.headers["Idempotent-Replayed"] == "true"
+
+
+# 5) Test: A key past its TTL is new again, even when its response is still in memory
+def test_expired_key_runs_again(place_order, make_db, make_idempotency):
+    store, store_db = make_idempotency()
+    db = orders_db(make_db, 1, 2)
+
+    place_order(MOUSE, db=db, idempotency=store, headers=KEY)
+    fingerprint_, response, created_at = store._cache[("create_order", "key-1")]
+    store._cache[("create_order", "key-1")] = (fingerprint_, response, created_at - timedelta(hours=25))
+    # A different body is accepted too: the old use of the key no longer counts
+    again, _ = place_order([{"productid": 3, "quantity": 1}], db=db, idempotency=store, headers=KEY)
+
+    assert again.status_code == 200
+    assert again.json() == {"orderid": 2, "message": "Order created successfully"}
+    assert "Idempotent-Replayed" not in again.headers
+    # The expired row is taken over rather than left to block the key
+    assert "WHERE idempotency_keys.created_at <=" in store_db.fetch_one.call_args.args[0]
+
+
+# 6) Test: The sweep deletes expired keys in batches until a batch comes back short
+def test_sweep_deletes_in_batches(make_db):
+    db = make_db()
+    db.fetch_one.side_effect = [{"swept": IDEMPOTENCY_SWEEP_BATCH}, {"swept": 3}]
+    store = IdempotencyStore(db, ttl_hours=24)
+
+    assert asyncio.run(store.sweep()) == IDEMPOTENCY_SWEEP_BATCH + 3
+
+
+# 7) Test: A replay read back from the table has the same JSON as the first response
+@patch("order_service.OrderService.create_order", new_callable=AsyncMock)
+def test_replay_from_table_matches_first_response(mock_create_order, make_db, server_prices):
+    mock_create_order.return_value = {"orderid": 123, "totalamount": Decimal("25.00"), "orderdate": datetime(2024, 12, 1, 10, 30)}
+    order = {"userid": 1, "items": [{"productid": 1, "quantity": 1}]}
+    saved = {}
+
+    async def save(query, values):
+        if "INSERT INTO idempotency_keys" in query:
+            saved.update(values)
+            return {"created_at": datetime.now(timezone.utc)}
+        return None
+
+    first_db = make_db()
+    first_db.fetch_one.side_effect = save
+    with patch("order_endpoints.idempotency", IdempotencyStore(first_db)):
+        first = client.post("/create_order/", json=order, headers={"Idempotency-Key": "abc"})
+
+    # Another worker, with nothing in memory, finds the key in the table
+    second_db = make_db({"fingerprint": saved["fingerprint"], "response": saved["response"], "created_at": datetime.now(timezone.utc)})
+    with patch("order_endpoints.idempotency", IdempotencyStore(second_db)):
+        second = client.post("/create_order/", json=order, headers={"Idempotency-Key": "abc"})
+
+    assert first.status_code == second.status_code == 200
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json() == first.json() == {"orderid": 123, "totalamount": 25, "orderdate": "2024-12-01T10:30:00"}
+    assert mock_create_order.call_count == 1
@@ -1,9 +1,11 @@
 # tests/test_invoice_endpoints.py
 
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from main import app  # or wherever your FastAPI `app` is defined
+from background_jobs import invoice_status
 
 client = TestClient(app)
 
@@ -76,3 +78,68 @@ def test_generate_invoice_failure():
         # Check calls
         mock_html.assert_called_once()
         mock_gen.assert_called_once()
+
+
+
+def test_create_order_with_invoice_returns_before_rendering(make_transaction, server_prices):
+    """
+    Test checkout returns after the order commits and queues the PDF and email in the
+    same transaction.
+    """
+    order = {"userid": 1, "items": [{"productid": 1, "productname": "Mouse", "quantity": 2, "price": 25.0}]}
+    user = {"name": "John Doe", "email": "john.doe@example.com", "homeaddress": "Istanbul"}
+    transaction = make_transaction()
+
+    with patch("order_service.OrderService.create_order", new_callable=AsyncMock) as mock_order, \
+         patch("combined_invoice_endpoints.database.fetch_one", new_callable=AsyncMock) as mock_user, \
+         patch("combined_invoice_endpoints.database.transaction", return_value=transaction), \
+         patch("combined_invoice_endpoints.enqueue_invoice", new_callable=AsyncMock) as mock_enqueue, \
+         patch("services.invoice_service.InvoiceService.generate_invoice") as mock_gen:
+        mock_order.return_value = {"orderid": 7, "message": "Order created successfully"}
+        mock_user.return_value = user
+
+        response = client.post("/create_order_with_invoice", json=order)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["orderid"] == 7
+    assert data["invoice_status"] == "pending"
+    assert "INV-7" in data["invoice_html"]
+    mock_gen.assert_not_called()
+    assert mock_enqueue.call_args.args[0] == 7
+    assert mock_enqueue.call_args.args[3] == "john.doe@example.com"
+    # The job is queued before the transaction commits
+    transaction.__aexit__.assert_called_once()
+
+
+def invoice_status_for(rows):
+    db = MagicMock()
+    db.fetch_all = AsyncMock(return_value=rows)
+    return asyncio.run(invoice_status(db, 99999))
+
+
+def test_invoice_status_from_jobs():
+    """
+    Test the invoice status is derived from the render and email jobs.
+    """
+    assert invoice_status_for([]) is None
+    assert invoice_status_for([{"kind": "render_invoice", "status": "queued", "last_error": None}])["status"] == "pending"
+    assert invoice_status_for([{"kind": "render_invoice", "status": "running", "last_error": None}])["status"] == "rendering"
+
+    rendered = {"kind": "render_invoice", "status": "done", "last_error": None}
+    assert invoice_status_for([rendered, {"kind": "email_invoice", "status": "queued", "last_error": None}])["status"] == "sending"
+    assert invoice_status_for([rendered, {"kind": "email_invoice", "status": "done", "last_error": None}])["status"] == "sent"
+
+    failed = invoice_status_for([rendered, {"kind": "email_invoice", "status": "failed", "last_error": "SMTP timeout"}])
+    assert (failed["status"], failed["error"]) == ("failed", "SMTP timeout")
+
+
+def test_invoice_status_endpoint():
+    """
+    Test the status endpoint reports known invoices and 404s for unknown orders.
+    """
+    with patch("invoice_endpoints.invoice_status", new_callable=AsyncMock) as mock_status:
+        mock_status.side_effect = lambda db, orderid: {"orderid": 7, "status": "sending", "invoice_file": "invoices/INV-7.pdf", "error": None} if orderid == 7 else None
+
+        assert client.get("/invoices/7/status").json()["status"] == "sending"
+        assert client.get("/invoices/8/status").status_code == 404
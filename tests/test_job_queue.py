@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from job_queue import JobWorker, backoff_seconds, parse_concurrency
+
+
+def make_worker(handler, due=(), concurrency=None):
+    due = list(due)
+
+    async def claim(kind, limit, worker):
+        claimed = due[:limit]
+        del due[:limit]
+        return claimed
+
+    queue = MagicMock()
+    queue.claim = AsyncMock(side_effect=claim)
+    queue.complete = AsyncMock()
+    queue.retry = AsyncMock(return_value="queued")
+    queue.release = AsyncMock()
+    worker = JobWorker(queue, poll_interval=0.01, concurrency=concurrency or {})
+    return worker, queue, patch.dict("job_queue.HANDLERS", {"test": handler}, clear=True)
+
+
+def make_job(job_id, attempts=1):
+    return {"id": job_id, "kind": "test", "ref": None, "payload": {"n": job_id}, "attempts": attempts, "max_attempts": 5}
+
+
+# 1) Test: A successful job is completed with the handler's result
+def test_run_job_success():
+    worker, queue, handlers = make_worker(AsyncMock(return_value={"ok": True}))
+    with handlers:
+        asyncio.run(worker.run_job(make_job(1)))
+
+    queue.complete.assert_called_once_with(1, {"ok": True})
+    queue.retry.assert_not_called()
+
+
+# 2) Test: A failing job is handed back for a retry with the error
+def test_run_job_failure():
+    worker, queue, handlers = make_worker(AsyncMock(side_effect=RuntimeError("SMTP down")))
+    with handlers:
+        asyncio.run(worker.run_job(make_job(1)))
+
+    queue.retry.assert_called_once()
+    assert queue.retry.call_args.args[1] == "SMTP down"
+    queue.complete.assert_not_called()
+
+
+# 3) Test: The claim loop never runs more jobs of a kind than its concurrency
+def test_claim_loop_concurrency():
+    running, peak = 0, 0
+
+    async def handler(payload):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    worker, queue, handlers = make_worker(handler, [make_job(n) for n in range(1, 6)], concurrency={"test": 2})
+
+    async def scenario():
+        with patch("job_queue.uses_postgres", return_value=True):
+            await worker.start()
+        await asyncio.sleep(0.2)
+        await worker.stop()
+
+    with handlers:
+        asyncio.run(scenario())
+
+    assert peak == 2
+    assert queue.complete.call_count == 5
+    assert all(call.args[1] <= 2 for call in queue.claim.call_args_list)
+    queue.release.assert_called_once_with(worker.name)
+
+
+# 4) Test: Settings and backoff
+def test_job_settings():
+    assert parse_concurrency("render_invoice=2, send_email=8,") == {"render_invoice": 2, "send_email": 8}
+    with pytest.raises(ValueError):
+        parse_concurrency("send_email=lots")
+    assert [backoff_seconds(attempt) for attempt in (1, 2, 3)] == [5, 10, 20]
+    assert backoff_seconds(20) == 600
@@ -1,4 +1,5 @@
 import pytest
+from datetime import date, datetime
 from unittest.mock import AsyncMock, patch
 from fastapi.testclient import TestClient
 from main import app  # Assuming the app is created in `main.py`
@@ -19,7 +20,7 @@ order_data = {
 
 # Test for successful order creation
 @patch("order_service.OrderService.create_order", new_callable=AsyncMock)
-def test_create_order_success(mock_create_order):
+def test_create_order_success(mock_create_order, server_prices):
     # Mock response from the service
     mock_create_order.return_value = {"orderid": 123, "message": "Order created successfully"}
 
@@ -30,9 +31,42 @@ def test_create_order_success(mock_create_order):
     assert response.json() == {"orderid": 123, "message": "Order created successfully"}
 
 
+# Test that item prices and the total sent by the client are replaced with server prices
+@patch("order_service.OrderService.create_order", new_callable=AsyncMock)
+def test_create_order_ignores_client_prices(mock_create_order, server_prices):
+    mock_create_order.return_value = {"orderid": 124, "message": "Order created successfully"}
+    cheap = {
+        "userid": 1,
+        "totalamount": 0.01,
+        "items": [
+            {"productid": 1, "quantity": 1, "price": 0.01},
+            {"productid": 3, "quantity": 1, "price": 0.01},
+            {"productid": 1, "quantity": 1, "price": 0.01},
+        ],
+    }
+
+    response = client.post("/create_order/", json=cheap)
+
+    assert response.status_code == 200
+    server_prices.assert_called_once_with({1: 2, 3: 1})
+    data = mock_create_order.call_args.args[0]
+    assert data["totalamount"] == 200
+    assert [(item["productid"], item["quantity"], item["price"]) for item in data["items"]] == [(1, 2, 25), (3, 1, 150)]
+
+
+# Test that ordering a product that does not exist is rejected
+@patch("order_service.OrderService.create_order", new_callable=AsyncMock)
+def test_create_order_unknown_product(mock_create_order, server_prices):
+    response = client.post("/create_order/", json={"userid": 1, "items": [{"productid": 99, "quantity": 1}]})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Product ID 99 not found"}
+    mock_create_order.assert_not_called()
+
+
 # Test for order creation with insufficient stock
 @patch("order_service.OrderService.create_order", new_callable=AsyncMock)
-def test_create_order_insufficient_stock(mock_create_order):
+def test_create_order_insufficient_stock(mock_create_order, server_prices):
     # Mock insufficient stock exception
     mock_create_order.side_effect = ValueError("Insufficient stock for product ID 1")
 
@@ -45,7 +79,7 @@ def test_create_order_insufficient_stock(mock_create_order):
 
 # Test for database error during order creation
 @patch("order_service.OrderService.create_order", new_callable=AsyncMock)
-def test_create_order_database_error(mock_create_order):
+def test_create_order_database_error(mock_create_order, server_prices):
     # Mock database error
     mock_create_order.side_effect = Exception("Database error: Database query failed")
 
@@ -54,3 +88,83 @@ def test_create_order_database_error(mock_create_order):
     # Assertions
     assert response.status_code == 500
     assert response.json() == {"detail": "Database error: Database query failed"}
+
+
+# Test that an order takes a fixed number of statements, whatever the number of lines
+def test_create_order_set_based(place_order):
+    response, db = place_order([{"productid": 2, "quantity": 1}, {"productid": 1, "quantity": 2}, {"productid": 1, "quantity": 1}])
+
+    assert response.status_code == 200
+    assert response.json() == {"orderid": 9, "message": "Order created successfully"}
+    # One stock UPDATE: duplicate lines are summed, products come in productid order
+    assert db.fetch_all.call_count == 1
+    assert db.fetch_all.call_args.args[1] == {"productids": [1, 2], "quantities": [3, 1]}
+    # One order_items INSERT, at server prices
+    assert db.execute.call_count == 1
+    assert db.execute.call_args.args[1]["prices"] == [25, 40]
+
+
+# Test that a product left out of the stock UPDATE fails the order
+def test_create_order_stock_update_short(place_order, make_db):
+    db = make_db({"orderid": 9}, [{"productid": 1, "stock": 0}])
+
+    response, _ = place_order([{"productid": 1, "quantity": 2}, {"productid": 2, "quantity": 1}], db=db)
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Insufficient stock for product ID 2"}
+    db.execute.assert_not_called()
+
+
+# Test that the order history comes one row per order, with the items as JSON
+@patch("order_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_get_orders_for_user(mock_fetch_all):
+    mock_fetch_all.return_value = [{
+        "orderid": 5,
+        "userid": 1,
+        "totalamount": 50.0,
+        "status": "processing",
+        "orderdate": "2024-12-01T10:00:00",
+        "items": '[{"productid": 1, "productname": "Phone", "image": "p.png", "quantity": 2, "price": 25.0}]',
+    }]
+
+    response = client.get("/orders/1?status=processing")
+
+    assert response.status_code == 200
+    assert response.json()[0]["items"][0]["productname"] == "Phone"
+    assert mock_fetch_all.call_args.args[1] == {"status": "processing", "userid": 1}
+
+
+# Test that a page of the order history links to the next one through a cursor
+@patch("order_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_get_orders_page(mock_fetch_all):
+    mock_fetch_all.return_value = [
+        {"orderid": orderid, "userid": 1, "totalamount": 10.0, "status": "delivered",
+         "orderdate": datetime(2024, 12, orderid), "items": []}
+        for orderid in (3, 2, 1)
+    ]
+
+    first = client.get("/orders/1?limit=2").json()
+    assert [order["orderid"] for order in first["orders"]] == [3, 2]
+    assert mock_fetch_all.call_args.args[1]["limit"] == 3
+
+    client.get(f"/orders/1?limit=2&cursor={first['next_cursor']}")
+    values = mock_fetch_all.call_args.args[1]
+    assert (values["cursor_value"], values["cursor_id"]) == (datetime(2024, 12, 2), 2)
+
+
+# Test that order history pages also work where orderdate is a DATE column
+@patch("order_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_get_orders_page_by_date(mock_fetch_all):
+    mock_fetch_all.return_value = [
+        {"orderid": orderid, "userid": 1, "totalamount": 10.0, "status": "delivered",
+         "orderdate": date(2024, 12, orderid), "items": []}
+        for orderid in (3, 2, 1)
+    ]
+
+    first = client.get("/orders/1?limit=2")
+    assert first.status_code == 200
+
+    client.get(f"/orders/1?limit=2&cursor={first.json()['next_cursor']}")
+    values = mock_fetch_all.call_args.args[1]
+    assert (values["cursor_value"], values["cursor_id"]) == (date(2024, 12, 2), 2)
+    assert type(values["cursor_value"]) is date
@@ -317,3 +317,102 @@ def test_remove_discount_not_found(mock_fetch_one):
     response = client.put("/products/9999/discount/remove/")
     assert response.status_code == 404
     assert response.json() == {"detail": "Product not found"}
+
+
+# 9) Test: Combined full-text search
+@patch("product_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_search_products(mock_fetch_all):
+    mock_fetch_all.return_value = [
+        {"productid": 1, "productname": "Samsung Galaxy S23", "rank": 0.6},
+        {"productid": 2, "productname": "Samsung Galaxy Tab", "rank": 0.4},
+    ]
+
+    response = client.get("/products/search/?q=Sams gal&limit=5&offset=10")
+    assert response.status_code == 200
+    assert [p["productid"] for p in response.json()] == [1, 2]
+
+    # Every word becomes a prefix match
+    assert mock_fetch_all.call_args.kwargs["values"] == {"tsquery": "sams:* & gal:*", "limit": 5, "offset": 10}
+
+
+@patch("product_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_search_products_name_uses_name_weight(mock_fetch_all):
+    mock_fetch_all.return_value = [{"productid": 1, "productname": "Mouse", "rank": 0.5}]
+
+    response = client.get("/products/search/name/?productName=mou")
+    assert response.status_code == 200
+    assert response.json() == [{"productid": 1, "productname": "Mouse"}]
+    assert mock_fetch_all.call_args.kwargs["values"]["tsquery"] == "mou:*A"
+
+
+@patch("product_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_search_products_without_words(mock_fetch_all):
+    response = client.get("/products/search/?q=%25%25")
+    assert response.status_code == 200
+    assert response.json() == []
+    mock_fetch_all.assert_not_called()
+
+
+# 10) Test: Fuzzy name search through pg_trgm
+@patch("product_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_search_products_by_name_fuzzy(mock_fetch_all):
+    mock_fetch_all.return_value = [
+        {"productid": 7, "productname": "Samsung Galaxy S23", "similarity": 0.42},
+    ]
+
+    response = client.get("/products/search/name/?productName=Samsng Galxy&mode=fuzzy&limit=3")
+    assert response.status_code == 200
+    assert response.json() == [{"productid": 7, "productname": "Samsung Galaxy S23"}]
+    assert mock_fetch_all.call_args.kwargs["values"] == {"q": "Samsng Galxy", "limit": 3}
+
+
+# 11) Test: In-memory trigram index finds misspelled names
+def test_trigram_index_typo_tolerance():
+    from product_search import TrigramIndex
+
+    index = TrigramIndex()
+    index.build([
+        {"productid": 1, "productname": "Samsung Galaxy S23", "productmodel": "SM-S911"},
+        {"productid": 2, "productname": "Apple iPhone 15", "productmodel": "A3090"},
+        {"productid": 3, "productname": "Samsung Galaxy Tab", "productmodel": "SM-X710"},
+    ])
+
+    results = index.search("Samsng Galxy", limit=2)
+    assert [productid for _, productid in results] == [1, 3]
+    assert index.search("zzzz", limit=2) == []
+
+
+# 12) Test: Batch lookup returns products in the requested order with one query
+@patch("product_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_get_products_batch(mock_fetch_all):
+    mock_fetch_all.return_value = [
+        {"productid": 2, "productname": "Keyboard"},
+        {"productid": 5, "productname": "Mouse"},
+    ]
+
+    response = client.post("/products/batch", json={"productids": [5, 9, 2, 5]})
+    assert response.status_code == 200
+    assert [p["productid"] for p in response.json()] == [5, 2]
+    mock_fetch_all.assert_called_once()
+    assert mock_fetch_all.call_args.kwargs["values"] == {"ids": [5, 9, 2]}
+
+
+# 13) Test: Batch lookup serves snapshot hits from memory and only queries the misses
+@patch("product_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_get_products_batch_from_catalog(mock_fetch_all, catalog_snapshot):
+    mock_fetch_all.return_value = [{"productid": 42, "productname": "New product"}]
+    response = client.post("/products/batch?fields=productname", json={"productids": [3, 42, 1]})
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {"productid": 3, "productname": "Monitor"},
+        {"productid": 42, "productname": "New product"},
+        {"productid": 1, "productname": "Mouse"},
+    ]
+    assert mock_fetch_all.call_args.kwargs["values"] == {"ids": [42]}
+
+
+# 14) Test: Oversized batches are rejected
+def test_get_products_batch_too_large():
+    response = client.post("/products/batch", json={"productids": list(range(501))})
+    assert response.status_code == 422
@@ -0,0 +1,57 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock
+from main import app
+from product_fields import parse_fields, product_statement
+
+client = TestClient(app)
+
+
+# 1) Test: fields= is validated, canonicalised and always includes productid
+def test_parse_fields():
+    assert parse_fields(None) is None
+    assert parse_fields("price, productname") == ("productid", "productname", "price")
+    assert parse_fields("PRODUCTNAME,price") == parse_fields("price,productname")
+
+    with pytest.raises(HTTPException) as error:
+        parse_fields("productname,password")
+    assert error.value.status_code == 400
+
+
+# 2) Test: Statement variants replace SELECT * with the column list and are cached
+def test_product_statement_variants():
+    fields = parse_fields("productname,price")
+    query = product_statement("search_products", fields)
+
+    assert query.startswith("SELECT p.productid, p.productname, p.price,")
+    assert "ts_rank" in query
+    assert product_statement("search_products", fields) is query
+    assert product_statement("get_all_products", fields).startswith("SELECT productid, productname, price")
+
+
+# 3) Test: The narrowed column list is sent to Postgres
+@patch("product_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_get_all_products_fields_from_database(mock_fetch_all):
+    mock_fetch_all.return_value = [{"productid": 1, "productname": "Mouse", "price": 25}]
+    response = client.get("/products/?fields=productname,price")
+
+    assert response.status_code == 200
+    assert response.json() == [{"productid": 1, "productname": "Mouse", "price": 25}]
+    assert "SELECT productid, productname, price" in mock_fetch_all.call_args.kwargs["query"]
+
+
+# 4) Test: Snapshot rows are narrowed to the requested fields
+def test_get_all_products_fields_from_catalog(catalog_snapshot):
+    response = client.get("/products/?fields=productname,stock")
+
+    assert response.status_code == 200
+    assert response.json()[0] == {"productid": 1, "productname": "Mouse", "stock": 10}
+
+
+# 5) Test: Unknown fields are rejected
+def test_get_all_products_unknown_field():
+    response = client.get("/products/?fields=productname,cost_secret")
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown fields: cost_secret"
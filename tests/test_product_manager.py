@@ -0,0 +1,99 @@
+from datetime import date, datetime
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from main import app
+
+client = TestClient(app)
+
+
+def processing_order(orderid):
+    return {
+        "orderid": orderid,
+        "userid": 4,
+        "totalamount": 30.0,
+        "orderdate": datetime(2024, 12, orderid),
+        "status": "processing",
+        "items": '[{"productid": 1, "quantity": 3}]',
+    }
+
+
+# 1) Test: Processing orders and their items come from one query
+@patch("product_manager_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_get_processing_orders(mock_fetch_all):
+    mock_fetch_all.return_value = [processing_order(1), processing_order(2)]
+
+    response = client.get("/productmanagerpanel/orders/processing?userid=4&from_date=2024-12-01&to_date=2024-12-31")
+
+    assert response.status_code == 200
+    assert response.json()[0]["items"] == [{"productid": 1, "quantity": 3}]
+    mock_fetch_all.assert_called_once()
+    # to_date includes the whole day
+    assert mock_fetch_all.call_args.args[1] == {"userid": 4, "from_date": date(2024, 12, 1), "to_date": date(2025, 1, 1)}
+
+
+# 2) Test: A page of processing orders links to the next one through a cursor
+@patch("product_manager_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_get_processing_orders_page(mock_fetch_all):
+    mock_fetch_all.return_value = [processing_order(1), processing_order(2)]
+
+    page = client.get("/productmanagerpanel/orders/processing?limit=1").json()
+
+    assert [order["orderid"] for order in page["orders"]] == [1]
+    client.get(f"/productmanagerpanel/orders/processing?limit=1&cursor={page['next_cursor']}")
+    values = mock_fetch_all.call_args.args[1]
+    assert (values["cursor_value"], values["cursor_id"], values["limit"]) == (datetime(2024, 12, 1), 1, 2)
+
+
+# 3) Test: A bulk status update moves the valid orders in two ANY(:ids) updates and reports the rest
+@patch("product_manager_endpoints.database.execute", new_callable=AsyncMock)
+@patch("product_manager_endpoints.database.fetch_all", new_callable=AsyncMock)
+@patch("product_manager_endpoints.database.transaction")
+def test_bulk_order_status(mock_transaction, mock_fetch_all, mock_execute, make_transaction):
+    mock_transaction.return_value = make_transaction()
+    mock_fetch_all.return_value = [
+        {"orderid": 1, "status": "processing"},
+        {"orderid": 2, "status": "delivered"},
+        {"orderid": 3, "status": "in-transit"},
+        {"orderid": 4, "status": "processing"},
+    ]
+
+    response = client.patch("/productmanagerpanel/orders/status", json={"orderids": [1, 2, 3, 4, 5], "status": "in-transit"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["updated"] == 2
+    assert [result["outcome"] for result in body["results"]] == [
+        "updated", "invalid_transition", "unchanged", "updated", "not_found",
+    ]
+    assert mock_execute.call_count == 2
+    for call in mock_execute.call_args_list:
+        assert call.args[1] == {"orderids": [1, 4], "status": "in-transit"}
+
+
+# 4) Test: Restriping a product publishes its stock like any other stock update
+@patch("product_manager_endpoints.notify_stock_changes", new_callable=AsyncMock)
+@patch("product_manager_endpoints.stock_stripes")
+def test_update_product_stock_stripes_notifies(mock_stripes, mock_notify):
+    mock_stripes.enabled = True
+    mock_stripes.resize = AsyncMock(return_value=40)
+
+    response = client.patch("/productmanagerpanel/products/1/stock/stripes", params={"stripes": 8})
+
+    assert response.status_code == 200
+    assert response.json()["stock"] == 40
+    mock_stripes.resize.assert_called_once_with(1, 8)
+    assert mock_notify.call_args.args[1] == {1: 40}
+
+
+# 5) Test: Processing order pages also work where orderdate is a DATE column
+@patch("product_manager_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_get_processing_orders_page_by_date(mock_fetch_all):
+    mock_fetch_all.return_value = [{**processing_order(orderid), "orderdate": date(2024, 12, orderid)} for orderid in (1, 2)]
+
+    page = client.get("/productmanagerpanel/orders/processing?limit=1")
+    assert page.status_code == 200
+
+    client.get(f"/productmanagerpanel/orders/processing?limit=1&cursor={page.json()['next_cursor']}")
+    values = mock_fetch_all.call_args.args[1]
+    assert (values["cursor_value"], values["cursor_id"]) == (date(2024, 12, 1), 1)
+    assert type(values["cursor_value"]) is date
@@ -0,0 +1,131 @@
+import asyncio
+import json
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock
+from main import app
+
+client = TestClient(app)
+
+
+# 1) Test: Filters, keyset page and facets come back from one query
+@patch("product_query_endpoints.database.fetch_one", new_callable=AsyncMock)
+def test_query_products(mock_fetch_one):
+    mock_fetch_one.return_value = {
+        "products": json.dumps([
+            {"productid": 4, "productname": "Mouse", "price": 20.5, "discountprice": None, "categoryid": 2},
+            {"productid": 9, "productname": "Pad", "price": 22.0, "discountprice": 18.0, "categoryid": 2},
+            {"productid": 3, "productname": "Cable", "price": 25.0, "discountprice": None, "categoryid": 2},
+        ]),
+        "facets": json.dumps([
+            {"categoryid": 1, "name": "Laptops", "count": 4},
+            {"categoryid": 2, "name": "Peripherals", "count": 12},
+        ]),
+    }
+
+    response = client.get("/products/query", params={
+        "category": 2, "min_price": 10, "max_price": 30, "min_rating": 4,
+        "in_stock": True, "sort": "price_asc", "limit": 2,
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [p["productid"] for p in body["products"]] == [4, 9]
+    assert body["next_cursor"] is not None
+    assert body["facets"][1] == {"categoryid": 2, "name": "Peripherals", "count": 12}
+
+    query = mock_fetch_one.call_args.kwargs["query"]
+    values = mock_fetch_one.call_args.kwargs["values"]
+    assert "COALESCE(p.discountprice, p.price) >= :min_price" in query
+    assert "p.stock > 0" in query
+    assert values == {"min_price": 10.0, "max_price": 30.0, "min_rating": 4.0, "category": 2, "limit": 3}
+
+
+# 2) Test: The returned cursor seeks past the last product of the page
+@patch("product_query_endpoints.database.fetch_one", new_callable=AsyncMock)
+def test_query_products_with_cursor(mock_fetch_one):
+    mock_fetch_one.return_value = {
+        "products": json.dumps([
+            {"productid": 4, "price": 20.5},
+            {"productid": 9, "price": 22.0},
+        ]),
+        "facets": "[]",
+    }
+    first = client.get("/products/query", params={"sort": "price_asc", "limit": 1}).json()
+
+    client.get("/products/query", params={"sort": "price_asc", "limit": 1, "cursor": first["next_cursor"]})
+    values = mock_fetch_one.call_args.kwargs["values"]
+    assert values["cursor_id"] == 4
+    assert str(values["cursor_value"]) == "20.5"
+
+
+# 3) Test: Invalid parameters are rejected before querying
+@patch("product_query_endpoints.database.fetch_one", new_callable=AsyncMock)
+def test_query_products_invalid(mock_fetch_one):
+    response = client.get("/products/query", params={"sort": "name"})
+    assert response.status_code == 400
+
+    response = client.get("/products/query", params={"min_price": 50, "max_price": 10})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "min_price cannot be greater than max_price"}
+
+    mock_fetch_one.assert_not_called()
+
+
+# 4) Test: Autocomplete suggestions come from the prefix index, best-selling first
+def test_autocomplete_products():
+    from product_autocomplete import PrefixIndex
+
+    index = PrefixIndex()
+    index.build([
+        {"productid": 1, "productname": "Samsung Galaxy S23", "productmodel": "SM-S911", "soldamount": 40},
+        {"productid": 2, "productname": "Samsung Galaxy Tab", "productmodel": "SM-X710", "soldamount": 90},
+        {"productid": 3, "productname": "Apple iPhone 15", "productmodel": "A3090", "soldamount": 70},
+    ])
+
+    with patch("product_query_endpoints.autocomplete_index", index):
+        response = client.get("/products/autocomplete", params={"q": "gal"})
+        assert response.status_code == 200
+        assert [s["productid"] for s in response.json()] == [2, 1]
+
+        # Model numbers are indexed too
+        response = client.get("/products/autocomplete", params={"q": "a30"})
+        assert [s["productid"] for s in response.json()] == [3]
+
+        index.remove(2)
+        index.add({"productid": 4, "productname": "Galaxy Buds", "productmodel": "SM-R400", "soldamount": 5})
+        response = client.get("/products/autocomplete", params={"q": "galaxy", "limit": 5})
+        assert [s["productid"] for s in response.json()] == [1, 4]
+
+
+# 5) Test: The best-selling order follows soldamount changes once the background refresh runs
+def test_autocomplete_ranking_follows_catalog(make_catalog, make_db):
+    from product_autocomplete import PrefixIndex
+
+    cache = make_catalog()
+    db = make_db()
+    index = PrefixIndex()
+    index.build([
+        {"productid": 1, "productname": "Mouse", "productmodel": "M1", "soldamount": 0},
+        {"productid": 3, "productname": "Monitor", "productmodel": "U27", "soldamount": 0},
+    ])
+
+    def suggested():
+        return [s["productid"] for s in client.get("/products/autocomplete", params={"q": "mo"}).json()]
+
+    with patch("product_query_endpoints.autocomplete_index", index):
+        asyncio.run(index.refresh_ranking(db, cache))
+        # Mouse (5 sold) before Monitor (2 sold)
+        assert suggested() == [1, 3]
+
+        cache.patch(3, soldamount=50)
+        # Requests only read the index
+        assert suggested() == [1, 3]
+        asyncio.run(index.refresh_ranking(db, cache))
+        assert suggested() == [3, 1]
+
+    # Without a catalog snapshot the refresh reads soldamount from the products table
+    cache.loaded_at = None
+    db.fetch_all.return_value = [{"productid": 1, "soldamount": 80}]
+    asyncio.run(index.refresh_ranking(db, cache))
+    with patch("product_query_endpoints.autocomplete_index", index):
+        assert suggested() == [1, 3]
@@ -76,3 +76,47 @@ def test_sort_products_by_popularity_desc(mock_fetch_all):
         {"productid": 1, "productname": "Product A", "price": 10.0, "soldamount": 50},
         {"productid": 2, "productname": "Product B", "price": 20.0, "soldamount": 30},
     ]
+
+# Test keyset pagination: an extra row means another page exists
+@patch("product_sort_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_sort_products_by_price_asc_paginated(mock_fetch_all):
+    mock_fetch_all.return_value = [
+        {"productid": 1, "productname": "Product A", "price": 10.0, "soldamount": 50},
+        {"productid": 2, "productname": "Product B", "price": 20.0, "soldamount": 30},
+        {"productid": 3, "productname": "Product C", "price": 30.0, "soldamount": 10},
+    ]
+
+    response = client.get("/products/sort/price/asc/", params={"limit": 2})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [p["productid"] for p in body["products"]] == [1, 2]
+    assert body["next_cursor"] is not None
+
+    # The query asks for limit + 1 rows
+    assert mock_fetch_all.call_args.kwargs["values"] == {"limit": 3}
+
+    # Following the cursor seeks past (price=20.0, productid=2)
+    mock_fetch_all.return_value = [
+        {"productid": 3, "productname": "Product C", "price": 30.0, "soldamount": 10},
+    ]
+    response = client.get("/products/sort/price/asc/", params={"limit": 2, "cursor": body["next_cursor"]})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "products": [{"productid": 3, "productname": "Product C", "price": 30.0, "soldamount": 10}],
+        "next_cursor": None,
+    }
+    values = mock_fetch_all.call_args.kwargs["values"]
+    assert values["cursor_id"] == 2
+    assert float(values["cursor_value"]) == 20.0
+
+
+# Test that a malformed cursor is rejected
+@patch("product_sort_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_sort_products_invalid_cursor(mock_fetch_all):
+    response = client.get("/products/sort/popularity/desc/", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+    mock_fetch_all.assert_not_called()
@@ -0,0 +1,86 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi.testclient import TestClient
+from main import app
+from cart_store import CartUpdate, ReservingCartStore
+from reservations import Hold, Reservations
+
+client = TestClient(app)
+
+
+def make_inner(result, quantity=0):
+    inner = MagicMock()
+    inner.add = AsyncMock(return_value=result)
+    inner.quantity = AsyncMock(return_value=quantity)
+    return inner
+
+
+def add_to_cart(store, quantity=2):
+    with patch("cart_endpoints.cart_store", store):
+        return client.post("/cart/add", json={"userid": 7, "productid": 1, "quantity": quantity})
+
+
+# 1) Test: Adding holds the stock first and lets the cart count the hold as available
+def test_add_holds_stock(make_holds):
+    holds = make_holds(Hold(stock=0, previous=1, quantity=3))
+    inner = make_inner(CartUpdate(stock=0, previous=1, quantity=3), quantity=1)
+
+    response = add_to_cart(ReservingCartStore(inner, holds))
+
+    # The last units are this user's, so the add succeeds with no unheld stock left
+    assert response.status_code == 200
+    assert response.json() == {"message": "Item added to cart successfully."}
+    # The hold is set to the resulting cart quantity, not moved by the change
+    holds.hold.assert_called_once_with(7, 1, quantity=3)
+    assert inner.add.call_args.kwargs["allowance"] == 3
+
+
+# 2) Test: A rejected hold never reaches the cart, a rejected cart change hands the hold back
+def test_add_rejected(make_holds):
+    holds = make_holds(Hold(stock=1, previous=0, quantity=None))
+    inner = make_inner(None)
+    response = add_to_cart(ReservingCartStore(inner, holds))
+    assert (response.status_code, response.json()) == (400, {"detail": "Insufficient stock for this operation"})
+    inner.add.assert_not_called()
+
+    holds = make_holds(Hold(stock=3, previous=1, quantity=3), Hold(stock=5, previous=3, quantity=1))
+    inner = make_inner(CartUpdate(stock=3, previous=None, quantity=None), quantity=1)
+    response = add_to_cart(ReservingCartStore(inner, holds))
+    assert (response.status_code, response.json()) == (400, {"detail": "Insufficient stock for this operation"})
+    assert holds.hold.call_args_list[1].kwargs == {"quantity": 1}
+
+
+ITEMS = [{"productid": 1, "quantity": 3}, {"productid": 2, "quantity": 1}]
+
+
+# 3) Test: Checkout uses up the holds and only takes the rest from products
+def test_checkout_consumes_holds(place_order, make_holds, make_db):
+    holds = make_holds(consumed={1: 2, 2: 1})
+
+    response, db = place_order(ITEMS, db=make_db({"orderid": 9}, [{"productid": 1, "stock": 4}]), holds=holds)
+
+    assert response.status_code == 200
+    assert response.json() == {"orderid": 9, "message": "Order created successfully"}
+    holds.consume.assert_called_once_with(7, [1, 2])
+    assert db.fetch_all.call_args.args[1] == {"productids": [1], "quantities": [1]}
+
+
+# 4) Test: An order of exactly what was held does not touch products
+def test_checkout_fully_held(place_order, make_holds):
+    response, db = place_order(ITEMS, holds=make_holds(consumed={1: 3, 2: 1}))
+
+    assert response.status_code == 200
+    assert response.json()["orderid"] == 9
+    db.fetch_all.assert_not_called()
+
+
+# 5) Test: Expired holds are swept in batches until a batch comes back short
+def test_sweep_batches(make_db):
+    db = make_db()
+    db.fetch_all.side_effect = [
+        [{"productid": 1, "stock": 5, "swept": 1000}],
+        [{"productid": None, "stock": None, "swept": 12}],
+    ]
+    reservations = Reservations(db, enabled=True)
+
+    assert asyncio.run(reservations.sweep()) == 1012
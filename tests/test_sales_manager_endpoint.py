@@ -82,3 +82,26 @@ def test_set_cost_invalid_data(mock_execute):
 
     # Assertions
     assert response.status_code == 422  # Validation error for negative cost
+
+# Test that the refund email is queued in the refund's transaction
+def test_manager_decision_queues_email_with_refund(make_transaction):
+    transaction = make_transaction()
+    events = []
+    transaction.__aexit__.side_effect = lambda *args: events.append("commit") or False
+
+    with patch("sales_manager_endpoints.database.fetch_all", new_callable=AsyncMock) as mock_requests, \
+         patch("sales_manager_endpoints.database.fetch_one", new_callable=AsyncMock) as mock_user, \
+         patch("sales_manager_endpoints.database.transaction", return_value=transaction), \
+         patch("sales_manager_endpoints.refund_service.process_refund", new_callable=AsyncMock) as mock_refund, \
+         patch("sales_manager_endpoints.enqueue_email", new_callable=AsyncMock) as mock_enqueue:
+        mock_requests.return_value = [{"productid": 1, "quantity": 2}]
+        mock_user.return_value = {"name": "John Doe", "email": "john.doe@example.com"}
+        mock_refund.side_effect = lambda *args: events.append("refund") or 50.0
+        mock_enqueue.side_effect = lambda *args: events.append("email")
+
+        response = client.post("/refund/decision", json={"orderid": 1, "approved": True})
+
+    assert response.status_code == 200
+    assert response.json() == {"orderid": 1, "refunded_amount": 50.0, "status": "Refunded"}
+    assert mock_enqueue.call_args.args[0] == "john.doe@example.com"
+    assert events == ["refund", "email", "commit"]
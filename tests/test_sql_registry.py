@@ -0,0 +1,43 @@
+import pytest
+from sql_registry import SqlRegistry, SqlStatement
+
+
+# 1) Test: All SQL files load and expose their bind parameters
+def test_load_sql_files():
+    registry = SqlRegistry("sql")
+    registry.load()
+
+    statement = registry["get_product_by_id"]
+    assert isinstance(statement, SqlStatement)
+    assert statement.params == frozenset({"productID"})
+    assert statement.is_dml
+
+    # Lookup with the file suffix returns the same object
+    assert registry.get("get_product_by_id.sql") is statement
+    assert not registry["create_products_table"].is_dml
+
+
+# 2) Test: Statements are immutable
+def test_statement_is_immutable():
+    registry = SqlRegistry("sql")
+    statement = registry["find_product"]
+
+    with pytest.raises(Exception):
+        statement.text = "DROP TABLE products"
+
+
+# 3) Test: Unknown statement names raise KeyError
+def test_unknown_statement():
+    registry = SqlRegistry("sql")
+
+    with pytest.raises(KeyError):
+        registry["does_not_exist"]
+
+
+# 4) Test: Empty SQL files are rejected at load time
+def test_empty_sql_file_rejected(tmp_path):
+    (tmp_path / "empty.sql").write_text("   \n")
+    registry = SqlRegistry(str(tmp_path))
+
+    with pytest.raises(ValueError):
+        registry.load()
@@ -66,3 +66,79 @@ def test_get_stock_database_error(mock_fetch_one):
     response = client.get("/products/1")  # Call the endpoint
     assert response.status_code == 500
     assert response.json() == {"detail": "Internal Server Error"}
+
+
+# 5) Test: Bulk availability answers many products with one query
+@patch("stock_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_get_stock_levels(mock_fetch_all):
+    mock_fetch_all.return_value = [{"productid": 1, "stock": 0}, {"productid": 3, "stock": 7}]
+
+    response = client.get("/stock?productids=3&productids=1&productids=99")
+    assert response.status_code == 200
+    assert response.json() == [
+        {"productid": 3, "stock": 7, "available": True},
+        {"productid": 1, "stock": 0, "available": False},
+    ]
+    mock_fetch_all.assert_called_once()
+
+
+# 6) Test: The live stream needs the Postgres listener
+def test_stock_stream_unavailable_without_listener():
+    response = client.get("/stock/stream?productids=1")
+    assert response.status_code == 503
+
+
+# 7) Test: Notifications reach subscribers of the changed products and patch the catalog
+def test_stock_listener_fan_out(make_catalog):
+    import asyncio
+    from stock_events import StockListener
+
+    async def scenario():
+        listener = StockListener(None, catalog_cache)
+        mouse = listener.subscribe([1])
+        monitor = listener.subscribe([3])
+
+        listener._on_notify(None, 0, "stock_changed", '{"1": 4, "2": 0}')
+        listener._on_notify(None, 0, "stock_changed", '{"1": 3}')
+        assert await mouse.next(timeout=1) == {1: 3}
+        assert await monitor.next(timeout=0.01) == {}
+
+        listener.unsubscribe(mouse)
+        assert listener._subscriptions.keys() == {3}
+
+    catalog_cache = make_catalog()
+    asyncio.run(scenario())
+    assert catalog_cache.get(1)["stock"] == 3
+    assert catalog_cache.get(2)["stock"] == 0
+
+
+# 8) Test: Stock changes are published with pg_notify only on Postgres
+def test_notify_stock_changes():
+    import asyncio
+    from unittest.mock import MagicMock
+    from stock_events import notify_stock_changes, NOTIFY_BATCH
+
+    db = MagicMock()
+    db.execute = AsyncMock()
+    db.url.dialect = "sqlite"
+    asyncio.run(notify_stock_changes(db, {1: 5}))
+    db.execute.assert_not_called()
+
+    db.url.dialect = "postgresql"
+    asyncio.run(notify_stock_changes(db, {productid: 1 for productid in range(NOTIFY_BATCH + 1)}))
+    assert db.execute.call_count == 2
+    assert db.execute.call_args.args[1] == {"channel": "stock_changed", "payload": '{"200":1}'}
+
+
+# 9) Test: A stream that fails before it starts does not leave its subscription behind
+def test_stock_stream_failed_read_unsubscribes():
+    from stock_events import StockListener
+
+    listener = StockListener(None, None)
+    with patch("stock_endpoints.stock_listener", listener), \
+         patch.object(StockListener, "running", True), \
+         patch("stock_endpoints.stock_levels", new_callable=AsyncMock, side_effect=Exception("Database error")):
+        response = TestClient(app, raise_server_exceptions=False).get("/stock/stream?productids=1&productids=2")
+
+    assert response.status_code == 500
+    assert listener._subscriptions == {}
@@ -0,0 +1,70 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+from stock_stripes import StockStripes
+
+
+# 1) Test: A take comes out of one free stripe when one has enough
+def test_take_from_one_stripe(make_db):
+    db = make_db({"stock": 17})
+
+    assert asyncio.run(StockStripes(db, enabled=True).take({1: 3})) == {1: 17}
+    db.fetch_one.assert_called_once()
+    assert db.fetch_one.call_args.args[1] == {"productid": 1, "quantity": 3}
+
+
+# 2) Test: Without a free stripe the take spreads over all of them
+def test_take_across_stripes(make_db):
+    db = make_db()
+    db.fetch_one.side_effect = [None, {"stock": 0, "taken": True}]
+    assert asyncio.run(StockStripes(db, enabled=True).take({1: 5})) == {1: 0}
+
+
+# 3) Test: Checkout takes striped products from their stripes and the rest from products
+def test_checkout_with_striped_product(place_order, make_db):
+    stripes = MagicMock(enabled=True)
+    stripes.striped = AsyncMock(return_value={1})
+    stripes.take = AsyncMock(return_value={1: 40})
+    items = [{"productid": 1, "quantity": 3}, {"productid": 2, "quantity": 1}]
+
+    response, db = place_order(items, db=make_db({"orderid": 9}, [{"productid": 2, "stock": 4}]), stripes=stripes)
+
+    assert response.status_code == 200
+    assert response.json() == {"orderid": 9, "message": "Order created successfully"}
+    stripes.take.assert_called_once_with({1: 3})
+    assert db.fetch_all.call_args.args[1] == {"productids": [2], "quantities": [1]}
+
+
+# 4) Test: Checkout of a striped product fails with 400 when its stripes are short
+def test_checkout_striped_insufficient(place_order, make_db):
+    db = make_db({"orderid": 9})
+    stripes = StockStripes(db, enabled=True)
+    # The product is striped, no single stripe has enough and all of them together are short
+    db.fetch_all.side_effect = [[{"productid": 1}]]
+    db.fetch_one.side_effect = [{"orderid": 9}, None, {"stock": -2, "taken": False}]
+
+    response, _ = place_order([{"productid": 1, "quantity": 5}], db=db, stripes=stripes)
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Insufficient stock for product ID 1"}
+    db.execute.assert_not_called()
+
+
+# 5) Test: Stock goes back to products when the product is not striped, or striping is off
+def test_restore_unstriped(make_db):
+    db = make_db()
+    assert asyncio.run(StockStripes(db, enabled=True).restore(1, 2)) is None
+
+    db = make_db()
+    assert asyncio.run(StockStripes(db, enabled=False).restore(1, 2)) is None
+    db.fetch_one.assert_not_called()
+
+
+# 6) Test: The rollup publishes the products whose stock it copied, in its transaction
+def test_rollup_notifies(make_db):
+    db = make_db(fetch_all=[{"productid": 1, "stock": 40}, {"productid": 3, "stock": 0}])
+
+    with patch("stock_stripes.notify_stock_changes", new_callable=AsyncMock) as mock_notify:
+        assert asyncio.run(StockStripes(db, enabled=True).rollup()) == 2
+
+    mock_notify.assert_called_once_with(db, {1: 40, 3: 0})
+    db.transaction.return_value.__aexit__.assert_called_once()
@@ -0,0 +1,56 @@
+import asyncio
+import json
+from decimal import Decimal
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock
+from main import app
+from streaming import _ndjson_lines, _iterate_list
+
+client = TestClient(app)
+
+NDJSON = {"Accept": "application/x-ndjson"}
+
+
+def rows_of(rows):
+    async def iterate(query, values=None):
+        for row in rows:
+            yield row
+    return iterate
+
+
+# 1) Test: Products are streamed one per line with database.iterate instead of fetch_all
+@patch("product_endpoints.database.fetch_all", new_callable=AsyncMock)
+def test_get_all_products_ndjson(mock_fetch_all):
+    products = [{"productid": i, "productname": f"Product {i}", "price": Decimal("9.99")} for i in range(1, 4)]
+    with patch("product_endpoints.database.iterate", side_effect=rows_of(products)):
+        response = client.get("/products/", headers=NDJSON)
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert [json.loads(line)["productid"] for line in lines] == [1, 2, 3]
+    assert json.loads(lines[0])["price"] == 9.99
+    mock_fetch_all.assert_not_called()
+
+
+# 2) Test: Sales manager reports stream as NDJSON too
+def test_profit_loss_report_ndjson():
+    rows = [{"productid": 1, "profit_loss": Decimal("12.50")}, {"productid": 2, "profit_loss": Decimal("-3.25")}]
+    with patch("sales_manager_endpoints.database.iterate", side_effect=rows_of(rows)):
+        response = client.get("/profit_loss_report", headers=NDJSON)
+
+    assert response.status_code == 200
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {"productid": 1, "profit_loss": 12.5},
+        {"productid": 2, "profit_loss": -3.25},
+    ]
+
+
+# 3) Test: The first row is flushed on its own, the rest in fixed-size chunks
+def test_ndjson_chunking():
+    async def collect():
+        with patch("streaming.NDJSON_CHUNK_ROWS", 2):
+            return [chunk async for chunk in _ndjson_lines(_iterate_list([{"n": n} for n in range(5)]), None)]
+
+    chunks = asyncio.run(collect())
+    assert [chunk.count(b"\n") for chunk in chunks] == [1, 2, 2]
@@ -11,10 +11,9 @@ class TestUserEndpoints:
     logger = logging.getLogger(__name__)
 
     @patch("user_endpoints.hash_password", return_value="hashedpassword123")
-    @patch("user_endpoints.load_sql_file", return_value="DUMMY SQL QUERY")
     @patch("user_endpoints.database.fetch_one", new_callable=AsyncMock)
     @patch("user_endpoints.database.execute", new_callable=AsyncMock)
-    def test_create_user_success(self, mock_execute, mock_fetch_one, mock_load_sql_file, mock_hash_password):
+    def test_create_user_success(self, mock_execute, mock_fetch_one, mock_hash_password):
         self.logger.info("Testing create user success")
 
         # First call: check if user exists (None => no user found)
@@ -39,9 +38,8 @@ class TestUserEndpoints:
         assert response.json()["message"] == "Signup successful"
         assert response.json()["user"]["userid"] == 1
 
-    @patch("user_endpoints.load_sql_file", return_value="DUMMY SQL QUERY")
     @patch("user_endpoints.database.fetch_one", new_callable=AsyncMock)
-    def test_create_user_existing_username(self, mock_fetch_one, mock_load_sql_file):
+    def test_create_user_existing_username(self, mock_fetch_one):
         self.logger.info("Testing create user existing username")
 
         # Mock that user already exists
@@ -66,9 +64,8 @@ class TestUserEndpoints:
         assert response.json()["detail"] == "Username or email already exists"
 
     @patch("user_endpoints.verify_password", return_value=True)
-    @patch("user_endpoints.load_sql_file", return_value="DUMMY SQL QUERY")
     @patch("user_endpoints.database.fetch_one", new_callable=AsyncMock)
-    def test_login_success(self, mock_fetch_one, mock_load_sql_file, mock_verify_password):
+    def test_login_success(self, mock_fetch_one, mock_verify_password):
         self.logger.info("Testing login success")
 
         # Mock DB user row includes "role" to avoid KeyError
@@ -92,9 +89,8 @@ class TestUserEndpoints:
         assert json_resp["user"]["email"] == "testuser"
         assert json_resp["user"]["role"] == "customer"
 
-    @patch("user_endpoints.load_sql_file", return_value="DUMMY SQL QUERY")
     @patch("user_endpoints.database.fetch_one", new_callable=AsyncMock)
-    def test_login_invalid_credentials(self, mock_fetch_one, mock_load_sql_file):
+    def test_login_invalid_credentials(self, mock_fetch_one):
         self.logger.info("Testing login invalid credentials")
 
         # Mock no matching user in DB
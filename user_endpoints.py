@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from databases import Database
 from passlib.context import CryptContext
 from db import database
+from sql_registry import statements
 
 # Password hashing configuration
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -24,10 +25,6 @@ class UserLogin(BaseModel):
     username: str
     password: str
 
-# Load SQL from file function
-def load_sql_file(filename: str) -> str:
-    with open(filename, 'r') as file:
-        return file.read()
 
 # Helper functions for password handling
 def hash_password(password: str) -> str:
@@ -40,7 +37,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 @router.post("/users/register/")
 async def create_user(user: UserCreate):
     # Load the SQL query from the file
-    sql_query = load_sql_file('sql/create_user.sql')
+    sql_query = statements["create_user"].text
 
     # Check if the username or email already exists
     find_user_query = "SELECT * FROM users WHERE username = :username OR email = :email"
@@ -76,7 +73,7 @@ async def create_user(user: UserCreate):
 @router.post("/users/login/")
 async def login(user: UserLogin):
     # Load the SQL query from the file
-    sql_query = load_sql_file('sql/find_user_by_username.sql')
+    sql_query = statements["find_user_by_username"].text
 
     # Fetch the user by username
     db_user = await database.fetch_one(query=sql_query, values={"username": user.username})
@@ -99,7 +96,7 @@ async def login(user: UserLogin):
 @router.get("/users/{userid}")
 async def get_user_info(userid: int):
     # Load the SQL query to fetch user information by userid
-    sql_query = load_sql_file('sql/get_user_info_by_userid.sql')
+    sql_query = statements["get_user_info_by_userid"].text
 
     # Fetch the user information
     user_info = await database.fetch_one(query=sql_query, values={"userid": userid})
@@ -1,14 +1,11 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from db import database
+from sql_registry import statements
 
 # Create APIRouter instance for wishlist-related endpoints
 router = APIRouter()
 
-# Load SQL from file function
-def load_sql_file(filename: str) -> str:
-    with open(filename, 'r') as file:
-        return file.read()
 
 # Wishlist item model
 class WishlistItem(BaseModel):
@@ -18,7 +15,7 @@ class WishlistItem(BaseModel):
 # Add to wishlist endpoint
 @router.post("/wishlist/add")
 async def add_to_wishlist(item: WishlistItem):
-    sql_query = load_sql_file("sql/add_to_wishlist.sql")
+    sql_query = statements["add_to_wishlist"].text
     try:
         await database.execute(query=sql_query, values={"userid": item.userid, "productid": item.productid})
         return {"message": "Item added to wishlist"}
@@ -28,7 +25,7 @@ async def add_to_wishlist(item: WishlistItem):
 # Remove from wishlist endpoint
 @router.delete("/wishlist/remove")
 async def remove_from_wishlist(item: WishlistItem):
-    sql_query = load_sql_file("sql/remove_from_wishlist.sql")
+    sql_query = statements["remove_from_wishlist"].text
     try:
         result = await database.execute(query=sql_query, values={"userid": item.userid, "productid": item.productid})
         if result == 0:
@@ -39,7 +36,7 @@ async def remove_from_wishlist(item: WishlistItem):
 
 @router.get("/wishlist/{userid}")
 async def get_wishlist(userid: int):
-    sql_query = load_sql_file("sql/fetch_wishlist.sql")
+    sql_query = statements["fetch_wishlist"].text
     try:
         items = await database.fetch_all(query=sql_query, values={"userid": userid})
         return [dict(item) for item in items]  # Convert results to a list of dictionaries
@@ -0,0 +1,40 @@
+"""
+Standalone job worker: runs the background job handlers outside the API process.
+
+Usage: python -m worker
+
+Set JOB_WORKER=external for the API processes so they only enqueue; any number of
+workers can run against the same database. Stops on SIGINT/SIGTERM, handing jobs that
+do not finish within the grace period back to the queue.
+"""
+import signal
+import asyncio
+import logging
+
+from db import database
+from job_queue import job_worker
+import background_jobs  # Registers the job handlers
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await database.connect()
+    try:
+        await job_worker.start()
+        if not job_worker.running:
+            return
+        await stop.wait()
+        logger.info("Stopping job worker")
+        await job_worker.stop()
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())